@@ -0,0 +1,57 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+#Import-time benchmark for harboropt modules.
+#Each import runs in a fresh interpreter, as it would in a new process-pool worker or CLI invocation.
+#Reports the median and minimum wall time and whether heavy plotting modules were pulled in.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['matplotlib', 'matplotlib.pyplot']
+
+CHECK = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(elapsed, ','.join(heavy))
+"""
+
+
+def time_import(module, repeat):
+
+    timings = []
+    heavy = ''
+    for i in range(repeat):
+        code = CHECK.format(module = module, heavy = HEAVY_MODULES)
+        output = subprocess.run([sys.executable, '-c', code], cwd = ROOT, capture_output = True, text = True, check = True).stdout.split()
+        timings.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ''
+    timings.sort()
+
+    return timings[len(timings)//2], timings[0], heavy
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Time importing harboropt modules in fresh interpreters.')
+    parser.add_argument('modules', nargs = '*', default = ['harboropt_lp_storage_buildyear_emissions', 'harboropt_plotting'])
+    parser.add_argument('--repeat', type = int, default = 5)
+    args = parser.parse_args()
+
+    #Time interpreter startup alone so it can be subtracted by eye.
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check = True)
+    print('interpreter startup: %.3f s' % (time.perf_counter() - start))
+
+    for module in args.modules:
+        median, best, heavy = time_import(module, args.repeat)
+        print('%s: median %.3f s, min %.3f s, heavy modules: %s' % (module, median, best, heavy or 'none'))
+
+
+if __name__ == '__main__':
+    main()
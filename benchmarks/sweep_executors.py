@@ -0,0 +1,64 @@
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+#Sweep benchmark comparing the process pool and thread pool executors of harboropt_sweep.
+#Each executor runs the same carbon price sweep in a fresh interpreter, so memory is measured from a clean start.
+#Reports the wall time and peak resident memory of the run (the parent, and the largest worker process for the process pool).
+#Run it on a machine with as many cores as workers (ex. 16), since threads only solve in parallel on separate cores.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUN = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+import harboropt_sweep
+scenarios = harboropt_sweep.sweep_scenarios({parameters!r}, {{'carbon_cost_per_ton': {carbon_prices!r}}})
+start = time.perf_counter()
+harboropt_sweep.run_sweep(scenarios, output_dir = {output_dir!r}, workers = {workers}, screen = False, template = {template}, executor = {executor!r})
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def run_executor(executor, parameters, carbon_prices, workers, template):
+
+    output_dir = tempfile.mkdtemp(prefix = 'sweep_%s_' % executor)
+    try:
+        code = RUN.format(root = ROOT, parameters = parameters, carbon_prices = carbon_prices, output_dir = output_dir, workers = workers, template = template, executor = executor)
+        output = subprocess.run([sys.executable, '-c', code], cwd = ROOT, capture_output = True, text = True, check = True).stdout.split('\n')
+    finally:
+        shutil.rmtree(output_dir)
+    elapsed, parent_kb, worker_kb = output[-2].split()
+
+    return float(elapsed), int(parent_kb) / 1024, int(worker_kb) / 1024
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Time a harboropt sweep with the process pool and thread pool executors.')
+    parser.add_argument('--workers', type = int, default = os.cpu_count())
+    parser.add_argument('--points', type = int, default = 32, help = 'number of carbon prices in the sweep')
+    parser.add_argument('--timestep-hours', type = int, default = 1, help = 'length of the model timesteps, ex. 24 for a quick run on daily timesteps')
+    parser.add_argument('--template', action = 'store_true', help = 'build the model once and update its prices (see harboropt_sweep)')
+    args = parser.parse_args()
+
+    #Finite prices for every pollutant, with the resilience incentive off, so that every point has a bounded optimum.
+    parameters = {'pm25_cost_per_ton': 1, 'nox_cost_per_ton': 1, 'so2_cost_per_ton': 1, 'pm10_cost_per_ton': 1, 'storage_resilience_incentive_per_kwh': 0}
+    if args.timestep_hours > 1:
+        parameters['timesteps'] = [args.timestep_hours] * (8760 // args.timestep_hours) + ([8760 % args.timestep_hours] if 8760 % args.timestep_hours else [])
+    carbon_prices = [10 * i for i in range(args.points)]
+
+    print('%d scenarios, %d workers, %d cores, %d hour timesteps%s' % (args.points, args.workers, os.cpu_count(), args.timestep_hours, ', template' if args.template else ''))
+    for executor in ['process', 'thread']:
+        elapsed, parent_mb, worker_mb = run_executor(executor, parameters, carbon_prices, args.workers, args.template)
+        print('%-8s %8.1f s  %6.2f s/scenario  peak memory: parent %.0f MB, largest worker %.0f MB' % (executor, elapsed, elapsed / args.points, parent_mb, worker_mb))
+
+
+if __name__ == '__main__':
+    main()
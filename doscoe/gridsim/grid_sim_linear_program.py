@@ -48,12 +48,43 @@ purposes of documentation, the units chosen are:
 
 """
 
+import collections
 import logging
+import threading
+import time
+
 import numpy as np
 
+from ortools.linear_solver import linear_solver_pb2
 from ortools.linear_solver import pywraplp
 
 
+# Result of LinearProgramContainer.screen().
+#   status: 'ok' or 'infeasible'.
+#   reason: String explaining why the LP is infeasible, '' if status is 'ok'.
+#   cost_lower_bound: Float lower bound on the objective, -inf if none
+#     could be found and inf if the LP is infeasible.
+ScreeningResult = collections.namedtuple(
+    'ScreeningResult', ['status', 'reason', 'cost_lower_bound'])
+
+# Number of variables, rows and coefficients which a grid element adds
+# to the LP.  See lp_size() of the grid elements.
+LpSize = collections.namedtuple('LpSize', ['variables', 'rows', 'nonzeros'])
+
+# Approximate peak memory in bytes per variable, row and coefficient of
+# building and solving a LinearProgramContainer, used by estimate_size().
+# Includes the python Constraint wrappers, which keep every coefficient
+# by variable name.  Fitted to CLP solves of two grid_regions with
+# sources, storage and transmission over 730 to 8760 timeslices, with
+# and without an rps (within 5% above 2000 timeslices, e.g. 470 MB for
+# 8760 timeslices with an rps).
+MEMORY_BYTES = {'variable': 550, 'row': 550, 'nonzero': 200}
+
+# What LinearProgramContainer.solve() does when the LP is estimated to
+# exceed memory_budget_mb.
+MEMORY_POLICIES = ['refuse', 'warn']
+
+
 class GridSimError(RuntimeError):
   pass
 
@@ -78,6 +109,10 @@ class RpsPercentNotMetError(GridSimError):
   pass
 
 
+class ModelTooLargeError(GridSimError):
+  pass
+
+
 class Constraint(object):
   """Holds an LP Constraint object with extra debugging information.
 
@@ -323,6 +358,10 @@ class GridSource(object):
     """
     self.solver.configure_lp_variables_and_constraints(lp)
 
+  def lp_size(self, lp):
+    """LpSize this source adds to lp.  Defers to self.solver."""
+    return self.solver.lp_size(lp)
+
   def post_process(self, lp):
     """Update lp post_processing result variables.
 
@@ -443,8 +482,6 @@ class _GridSourceDispatchableSolver(object):
         source.name,
         source.grid_region_id)
 
-    solver = lp.solver
-
     # Configure maximum energy if it is >= 0.  Otherwise do not
     # create a constraint.
     max_energy_constraint = (lp.constraint(0.0, source.max_energy)
@@ -479,7 +516,7 @@ class _GridSourceDispatchableSolver(object):
           var, source.power_coefficient)
 
       # Constrain rps_credit if needed.
-      if source.is_rps_source:
+      if lp.rps_percent > 0.0 and source.is_rps_source:
         lp.rps_source_constraints[source.grid_region_id][t].set_coefficient(
             var, source.power_coefficient)
 
@@ -495,7 +532,7 @@ class _GridSourceDispatchableSolver(object):
       # If nameplate_unit_cost > 0, Cost Optimization will push
       # Nameplate near max(timeslice_variables).
 
-      nameplate_constraint = lp.constraint(0.0, solver.infinity())
+      nameplate_constraint = lp.constraint(0.0, lp.solver.infinity())
       nameplate_constraint.set_coefficient(var, -1.0)
       nameplate_constraint.set_coefficient(source.nameplate_variable, 1.0)
 
@@ -505,6 +542,26 @@ class _GridSourceDispatchableSolver(object):
           source.nameplate_variable,
           1.0)
 
+  def lp_size(self, lp):
+    """LpSize of what configure_lp_variables_and_constraints builds.
+
+    Args:
+      lp: The LinearProgramContainer, which need not be initialized.
+
+    Returns:
+      LpSize of the timeslice and nameplate variables, the nameplate
+      rows, the optional max_energy and max_power rows, and the conserve
+      power (and rps) coefficients.
+    """
+    source = self.source
+    t = lp.number_of_timeslices
+    rps = lp.rps_percent > 0.0 and source.is_rps_source
+    has_max_energy = source.max_energy >= 0
+    has_max_power = source.max_power >= 0
+    return LpSize(t + 1,
+                  t + has_max_energy + has_max_power * (t + 2),
+                  (3 + rps + has_max_energy) * t + has_max_power * (t + 2))
+
   def get_solution_values(self):
     """Gets the linear program solver results.
 
@@ -635,10 +692,25 @@ class _GridSourceNonDispatchableSolver(object):
       constraint[t].set_coefficient(source.nameplate_variable, profile_t)
 
       # Constrain rps_credit if needed.
-      if source.is_rps_source:
+      if lp.rps_percent > 0.0 and source.is_rps_source:
         lp.rps_source_constraints[source.grid_region_id][t].set_coefficient(
             source.nameplate_variable, profile_t)
 
+  def lp_size(self, lp):
+    """LpSize of what configure_lp_variables_and_constraints builds.
+
+    Args:
+      lp: The LinearProgramContainer, which need not be initialized.
+
+    Returns:
+      LpSize of the nameplate variable, the optional max_energy and
+      max_power rows, and the conserve power (and rps) coefficients.
+    """
+    source = self.source
+    rps = lp.rps_percent > 0.0 and source.is_rps_source
+    limits = (source.max_energy >= 0) + (source.max_power >= 0)
+    return LpSize(1, limits, limits + (1 + rps) * lp.number_of_timeslices)
+
   def get_solution_values(self):
     """Gets the linear program solver results.
 
@@ -763,32 +835,9 @@ class GridStorage(object):
           self.grid_region_id
       )
 
-    # Set up source and configure LP variables.
-    self.source = GridSource(
-        name=self.name + ' source',
-        nameplate_unit_cost=self.discharge_nameplate_cost,
-        variable_unit_cost=0.0,
-        grid_region_id=self.grid_region_id,
-        max_power=self.max_discharge_power,
-        co2_per_electrical_energy=0.0,
-        power_coefficient=self.discharge_efficiency,
-        is_rps_source=self.is_rps
-    )
-    self.source.solver = _GridSourceDispatchableSolver(self.source)
+    # Set up source and sink and configure LP variables.
+    self.source, self.sink = self._source_and_sink()
     self.source.configure_lp_variables_and_constraints(lp)
-
-    # Set up sink and configure LP variables.
-    self.sink = GridSource(
-        name=self.name + ' sink',
-        nameplate_unit_cost=self.discharge_nameplate_cost,
-        variable_unit_cost=0.0,
-        grid_region_id=self.grid_region_id,
-        max_power=self.max_charge_power,
-        co2_per_electrical_energy=0.0,
-        power_coefficient=-1.0,
-        is_rps_source=self.is_rps
-    )
-    self.sink.solver = _GridSourceDispatchableSolver(self.sink)
     self.sink.configure_lp_variables_and_constraints(lp)
 
     # Add energy nameplate costs to the objective.  Other costs are
@@ -828,6 +877,54 @@ class GridStorage(object):
         max_storage_constraint = lp.constraint(0.0, self.max_storage)
         max_storage_constraint.set_coefficient(variables[t], 1.0)
 
+  def _source_and_sink(self):
+    """Builds the dispatchable GridSources which discharge and charge."""
+    source = GridSource(
+        name=self.name + ' source',
+        nameplate_unit_cost=self.discharge_nameplate_cost,
+        variable_unit_cost=0.0,
+        grid_region_id=self.grid_region_id,
+        max_power=self.max_discharge_power,
+        co2_per_electrical_energy=0.0,
+        power_coefficient=self.discharge_efficiency,
+        is_rps_source=self.is_rps
+    )
+    source.solver = _GridSourceDispatchableSolver(source)
+
+    sink = GridSource(
+        name=self.name + ' sink',
+        nameplate_unit_cost=self.discharge_nameplate_cost,
+        variable_unit_cost=0.0,
+        grid_region_id=self.grid_region_id,
+        max_power=self.max_charge_power,
+        co2_per_electrical_energy=0.0,
+        power_coefficient=-1.0,
+        is_rps_source=self.is_rps
+    )
+    sink.solver = _GridSourceDispatchableSolver(sink)
+
+    return source, sink
+
+  def lp_size(self, lp):
+    """LpSize of what configure_lp_variables_and_constraints builds.
+
+    Args:
+      lp: The LinearProgramContainer, which need not be initialized.
+
+    Returns:
+      LpSize of the energy variables and their balance rows, the
+      optional nameplate variable with its rows and max_storage rows,
+      and the source and sink.
+    """
+    t = lp.number_of_timeslices
+    has_nameplate = bool(self.storage_nameplate_cost)
+    has_max_storage = self.max_storage >= 0.0
+    size = LpSize(t + has_nameplate,
+                  (1 + has_nameplate + has_max_storage) * t,
+                  (4 + 2 * has_nameplate + has_max_storage) * t)
+    return _add_lp_sizes(
+        size, *[s.lp_size(lp) for s in self._source_and_sink()])
+
   def post_process(self, lp):
     """Update lp post_processing result variables.
 
@@ -936,7 +1033,8 @@ class GridRecStorage(object):
       that can be stored.  A value < 0 means there is no maximum
       storage limit.
 
-    rec_storage: GridStorage object which stores "clean" energy.
+    rec_storage: GridStorage object which stores "clean" energy.  None
+      unless the LinearProgramContainer has an rps.
     no_rec_storage: GridStorage object which stores "dirty" energy.
   """
 
@@ -979,30 +1077,9 @@ class GridRecStorage(object):
   def configure_lp_variables_and_constraints(self, lp):
     """Declare lp variables, and set constraints."""
 
-    # For rec_storage and no_rec_storage storage, set all costs to 0
-    # and with no limits.  Calculate costs and limits after
-    # declaration.
-
-    self.rec_storage = GridStorage(
-        name=self.name+' REC_STORAGE',
-        storage_nameplate_cost=0,
-        grid_region_id=self.grid_region_id,
-        charge_efficiency=self.charge_efficiency,
-        discharge_efficiency=self.discharge_efficiency,
-        storage_efficiency=self.storage_efficiency,
-        is_rps=True)
-
-    self.no_rec_storage = GridStorage(
-        name=self.name+' NO_REC_STORAGE',
-        storage_nameplate_cost=0,
-        grid_region_id=self.grid_region_id,
-        charge_efficiency=self.charge_efficiency,
-        discharge_efficiency=self.discharge_efficiency,
-        storage_efficiency=self.storage_efficiency,
-        is_rps=False)
-
-    self.rec_storage.configure_lp_variables_and_constraints(lp)
-    self.no_rec_storage.configure_lp_variables_and_constraints(lp)
+    self.rec_storage, self.no_rec_storage = self._new_storages(lp)
+    for storage in self._storages():
+      storage.configure_lp_variables_and_constraints(lp)
 
     # Calculate costs and limits based on the sum of both rec_storage
     # and no_rec_storage.
@@ -1049,58 +1126,99 @@ class GridRecStorage(object):
     lp.minimize_costs_objective.set_coefficient(self.discharge_nameplate,
                                                 self.discharge_nameplate_cost)
 
-    rec_storage_energy_variables = self.rec_storage.energy_variables
-    no_rec_storage_energy_variables = self.no_rec_storage.energy_variables
+    storages = self._storages()
 
     for t in lp.time_index_iterable:
       # Ensure nameplate is >= sum(stored_values)[t].
       nameplate_constraint = lp.constraint(0.0, lp.solver.infinity())
       nameplate_constraint.set_coefficient(self.energy_nameplate, 1.0)
-      nameplate_constraint.set_coefficient(rec_storage_energy_variables[t],
-                                           -1.0)
-      nameplate_constraint.set_coefficient(no_rec_storage_energy_variables[t],
-                                           -1.0)
-
-      rec_storage_charge_variables = (
-          self.rec_storage.sink.timeslice_variables)
-      no_rec_storage_charge_variables = (
-          self.no_rec_storage.sink.timeslice_variables)
-      rec_storage_discharge_variables = (
-          self.rec_storage.source.timeslice_variables)
-      no_rec_storage_discharge_variables = (
-          self.no_rec_storage.source.timeslice_variables)
 
       max_charge_constraint = lp.constraint(0.0, lp.solver.infinity())
       max_charge_constraint.set_coefficient(self.charge_nameplate, 1.0)
-      max_charge_constraint.set_coefficient(
-          rec_storage_charge_variables[t], -1.0)
-      max_charge_constraint.set_coefficient(
-          no_rec_storage_charge_variables[t], -1.0)
-      max_charge_constraint.set_coefficient(
-          rec_storage_discharge_variables[t], 1.0)
-      max_charge_constraint.set_coefficient(
-          no_rec_storage_discharge_variables[t], 1.0)
 
       max_discharge_constraint = lp.constraint(0.0, lp.solver.infinity())
       max_discharge_constraint.set_coefficient(self.discharge_nameplate, 1.0)
-      max_discharge_constraint.set_coefficient(
-          rec_storage_charge_variables[t], 1.0)
-      max_discharge_constraint.set_coefficient(
-          no_rec_storage_charge_variables[t], 1.0)
-      max_discharge_constraint.set_coefficient(
-          rec_storage_discharge_variables[t], -1.0)
-      max_discharge_constraint.set_coefficient(
-          no_rec_storage_discharge_variables[t], -1.0)
+
+      for storage in storages:
+        charge_variable = storage.sink.timeslice_variables[t]
+        discharge_variable = storage.source.timeslice_variables[t]
+
+        nameplate_constraint.set_coefficient(storage.energy_variables[t],
+                                             -1.0)
+
+        max_charge_constraint.set_coefficient(charge_variable, -1.0)
+        max_charge_constraint.set_coefficient(discharge_variable, 1.0)
+
+        max_discharge_constraint.set_coefficient(charge_variable, 1.0)
+        max_discharge_constraint.set_coefficient(discharge_variable, -1.0)
+
+  def _new_storages(self, lp):
+    """Builds the rec_storage and no_rec_storage GridStorages for lp.
+
+    For rec_storage and no_rec_storage storage, set all costs to 0
+    and with no limits.  Calculate costs and limits after
+    declaration.  Without an rps there is no clean energy to keep
+    apart, so only no_rec_storage is built and rec_storage is None.
+
+    Args:
+      lp: LinearProgramContainer, contains lp solver and constraints.
+
+    Returns:
+      Tuple of rec_storage and no_rec_storage.
+    """
+    rec_storage = None
+    if lp.rps_percent > 0.0:
+      rec_storage = GridStorage(
+          name=self.name+' REC_STORAGE',
+          storage_nameplate_cost=0,
+          grid_region_id=self.grid_region_id,
+          charge_efficiency=self.charge_efficiency,
+          discharge_efficiency=self.discharge_efficiency,
+          storage_efficiency=self.storage_efficiency,
+          is_rps=True)
+
+    no_rec_storage = GridStorage(
+        name=self.name+' NO_REC_STORAGE',
+        storage_nameplate_cost=0,
+        grid_region_id=self.grid_region_id,
+        charge_efficiency=self.charge_efficiency,
+        discharge_efficiency=self.discharge_efficiency,
+        storage_efficiency=self.storage_efficiency,
+        is_rps=False)
+
+    return rec_storage, no_rec_storage
+
+  def _storages(self):
+    """The GridStorage objects which were built, rec_storage first."""
+    return [storage for storage in (self.rec_storage, self.no_rec_storage)
+            if storage is not None]
+
+  def lp_size(self, lp):
+    """LpSize of what configure_lp_variables_and_constraints builds.
+
+    Args:
+      lp: The LinearProgramContainer, which need not be initialized.
+
+    Returns:
+      LpSize of the energy and nameplate variables, their optional limit
+      rows and the nameplate rows, which sum up every storage, and of
+      the storages themselves.
+    """
+    t = lp.number_of_timeslices
+    storages = [s for s in self._new_storages(lp) if s is not None]
+    limits = sum(limit >= 0 for limit in (self.max_storage,
+                                          self.max_charge_power,
+                                          self.max_discharge_power))
+    size = LpSize(t + 3, limits + 3 * t, limits + (3 + 5 * len(storages)) * t)
+    return _add_lp_sizes(size, *[s.lp_size(lp) for s in storages])
 
   def get_solution_values(self):
-    return (self.rec_storage.get_solution_values() +
-            self.no_rec_storage.get_solution_values())
+    return sum(storage.get_solution_values() for storage in self._storages())
 
   def get_source_solution_values(self):
-    return (self.rec_storage.source.get_solution_values() +
-            self.no_rec_storage.source.get_solution_values() -
-            self.rec_storage.sink.get_solution_values() -
-            self.no_rec_storage.sink.get_solution_values())
+    return sum(storage.source.get_solution_values() -
+               storage.sink.get_solution_values()
+               for storage in self._storages())
 
   def get_sink_solution_values(self):
     return -self.get_source_solution_values()
@@ -1130,8 +1248,8 @@ class GridRecStorage(object):
       return max(self.get_solution_values())
 
   def post_process(self, lp):
-    self.rec_storage.post_process(lp)
-    self.no_rec_storage.post_process(lp)
+    for storage in self._storages():
+      storage.post_process(lp)
 
 
 class _GridTransmission(GridSource):
@@ -1144,7 +1262,8 @@ class _GridTransmission(GridSource):
       source_grid_region_id=0,
       sink_grid_region_id=1,
       max_power=-1.0,
-      efficiency=1.0):
+      efficiency=1.0,
+      is_rps=False):
     """Init function.
 
     Args:
@@ -1160,6 +1279,8 @@ class _GridTransmission(GridSource):
       efficiency: (float) ratio of how much power gets moved one
         grid_region to the other grid_region. Acceptable values are
         0. < efficiency < 1.
+      is_rps: Boolean; if true, the transmitted power is clean power
+        which moves rps credit from source to sink grid_region.
     """
 
     super(_GridTransmission, self).__init__(
@@ -1170,7 +1291,8 @@ class _GridTransmission(GridSource):
         max_power=max_power,
         max_energy=-1,
         co2_per_electrical_energy=0,
-        power_coefficient=efficiency
+        power_coefficient=efficiency,
+        is_rps_source=is_rps
     )
 
     self.sink_grid_region_id = sink_grid_region_id
@@ -1195,9 +1317,16 @@ class _GridTransmission(GridSource):
       # Whatever the super-class is sourcing in source_grid_region_id,
       # sink it from sink_grid_region_id.
       lp.conserve_power_constraint[sink_id][t].set_coefficient(var, -1.0)
-      if self.is_rps_source:
+      if lp.rps_percent > 0.0 and self.is_rps_source:
         lp.rps_source_constraints[sink_id][t].set_coefficient(var, -1.0)
 
+  def lp_size(self, lp):
+    """LpSize of the source, plus the coefficients in the sink region."""
+    size = super(_GridTransmission, self).lp_size(lp)
+    rps = lp.rps_percent > 0.0 and self.is_rps_source
+    return size._replace(
+        nonzeros=size.nonzeros + (1 + rps) * lp.number_of_timeslices)
+
   def post_process(self, lp):
     """Update lp post_processing result variables.
 
@@ -1242,9 +1371,11 @@ class GridTransmission(object):
       b_to_a: _GridTransmission object which moves dirty power from
         grid_region_b to grid_region_a
       rec_a_to_b: _GridTransmission object which moves clean power
-        from grid_region_a to grid_region_b
+        from grid_region_a to grid_region_b.  None unless the
+        LinearProgramContainer has an rps.
       rec_b_to_a: _GridTransmission object which moves clean power
-        from grid_region_b to grid_region_a
+        from grid_region_b to grid_region_a.  None unless the
+        LinearProgramContainer has an rps.
   """
 
   def __init__(
@@ -1276,40 +1407,12 @@ class GridTransmission(object):
       lp: LinearProgramContainer, contains lp solver and constraints.
     """
 
-    self.a_to_b = _GridTransmission(self.name + ' a_to_b',
-                                    0,
-                                    self.grid_region_id_b,
-                                    self.grid_region_id_a,
-                                    self.max_power,
-                                    self.efficiency)
-
-    self.b_to_a = _GridTransmission(self.name + ' b_to_a',
-                                    0,
-                                    self.grid_region_id_a,
-                                    self.grid_region_id_b,
-                                    self.max_power,
-                                    self.efficiency)
-
-    self.rec_a_to_b = _GridTransmission(self.name + ' rec a_to_b',
-                                        0,
-                                        self.grid_region_id_b,
-                                        self.grid_region_id_a,
-                                        self.max_power,
-                                        self.efficiency,
-                                        is_rps=True)
-
-    self.rec_b_to_a = _GridTransmission(self.name + ' rec b_to_a',
-                                        0,
-                                        self.grid_region_id_a,
-                                        self.grid_region_id_b,
-                                        self.max_power,
-                                        self.efficiency,
-                                        is_rps=True)
-
-    self.a_to_b.configure_lp_variables_and_constraints(lp)
-    self.b_to_a.configure_lp_variables_and_constraints(lp)
-    self.rec_a_to_b.configure_lp_variables_and_constraints(lp)
-    self.rec_b_to_a.configure_lp_variables_and_constraints(lp)
+    (self.a_to_b, self.b_to_a,
+     self.rec_a_to_b, self.rec_b_to_a) = self._new_transmissions(lp)
+
+    a_to_b_transmissions, b_to_a_transmissions = self._transmissions()
+    for transmission in a_to_b_transmissions + b_to_a_transmissions:
+      transmission.configure_lp_variables_and_constraints(lp)
 
     # Make sure nameplate >= sum(a_to_b) and nameplate >= sum(b_to_a)
 
@@ -1324,26 +1427,91 @@ class GridTransmission(object):
       # nameplate >= a_to_b[t] + rec_a_to_b[t] - b_to_a[t] - rec_b_to_a[t]
       a_to_b_constraint = lp.constraint(0.0, lp.solver.infinity())
       a_to_b_constraint.set_coefficient(self.nameplate_variable, 1.0)
-      a_to_b_constraint.set_coefficient(
-          self.a_to_b.timeslice_variables[t], -1.0)
-      a_to_b_constraint.set_coefficient(
-          self.rec_a_to_b.timeslice_variables[t], -1.0)
-      a_to_b_constraint.set_coefficient(
-          self.b_to_a.timeslice_variables[t], 1.0)
-      a_to_b_constraint.set_coefficient(
-          self.rec_b_to_a.timeslice_variables[t], 1.0)
 
       # nameplate >= b_to_a[t] + rec_b_to_a[t] - a_to_b[t] - rec_a_to_b[t]
       b_to_a_constraint = lp.constraint(0.0, lp.solver.infinity())
       b_to_a_constraint.set_coefficient(self.nameplate_variable, 1.0)
-      b_to_a_constraint.set_coefficient(
-          self.b_to_a.timeslice_variables[t], -1.0)
-      b_to_a_constraint.set_coefficient(
-          self.rec_b_to_a.timeslice_variables[t], -1.0)
-      b_to_a_constraint.set_coefficient(
-          self.a_to_b.timeslice_variables[t], 1.0)
-      b_to_a_constraint.set_coefficient(
-          self.rec_a_to_b.timeslice_variables[t], 1.0)
+
+      for transmission in a_to_b_transmissions:
+        a_to_b_constraint.set_coefficient(
+            transmission.timeslice_variables[t], -1.0)
+        b_to_a_constraint.set_coefficient(
+            transmission.timeslice_variables[t], 1.0)
+
+      for transmission in b_to_a_transmissions:
+        b_to_a_constraint.set_coefficient(
+            transmission.timeslice_variables[t], -1.0)
+        a_to_b_constraint.set_coefficient(
+            transmission.timeslice_variables[t], 1.0)
+
+  def _new_transmissions(self, lp):
+    """Builds the _GridTransmissions of each direction for lp.
+
+    Clean power only needs its own path when there is an rps to credit
+    it to, so rec_a_to_b and rec_b_to_a are None without an rps.
+
+    Args:
+      lp: LinearProgramContainer, contains lp solver and constraints.
+
+    Returns:
+      Tuple of a_to_b, b_to_a, rec_a_to_b and rec_b_to_a.
+    """
+    a_to_b = _GridTransmission(self.name + ' a_to_b',
+                               0,
+                               self.grid_region_id_b,
+                               self.grid_region_id_a,
+                               self.max_power,
+                               self.efficiency)
+
+    b_to_a = _GridTransmission(self.name + ' b_to_a',
+                               0,
+                               self.grid_region_id_a,
+                               self.grid_region_id_b,
+                               self.max_power,
+                               self.efficiency)
+
+    rec_a_to_b = None
+    rec_b_to_a = None
+    if lp.rps_percent > 0.0:
+      rec_a_to_b = _GridTransmission(self.name + ' rec a_to_b',
+                                     0,
+                                     self.grid_region_id_b,
+                                     self.grid_region_id_a,
+                                     self.max_power,
+                                     self.efficiency,
+                                     is_rps=True)
+
+      rec_b_to_a = _GridTransmission(self.name + ' rec b_to_a',
+                                     0,
+                                     self.grid_region_id_a,
+                                     self.grid_region_id_b,
+                                     self.max_power,
+                                     self.efficiency,
+                                     is_rps=True)
+
+    return a_to_b, b_to_a, rec_a_to_b, rec_b_to_a
+
+  def _transmissions(self):
+    """Lists of the _GridTransmissions which were built in each direction."""
+    a_to_b = [t for t in (self.a_to_b, self.rec_a_to_b) if t is not None]
+    b_to_a = [t for t in (self.b_to_a, self.rec_b_to_a) if t is not None]
+    return a_to_b, b_to_a
+
+  def lp_size(self, lp):
+    """LpSize of what configure_lp_variables_and_constraints builds.
+
+    Args:
+      lp: The LinearProgramContainer, which need not be initialized.
+
+    Returns:
+      LpSize of the nameplate variable and the nameplate rows of both
+      directions, which sum up every transmission, and of the
+      transmissions themselves.
+    """
+    t = lp.number_of_timeslices
+    transmissions = [x for x in self._new_transmissions(lp) if x is not None]
+    size = LpSize(1, 2 * t, 2 * (1 + len(transmissions)) * t)
+    return _add_lp_sizes(size, *[x.lp_size(lp) for x in transmissions])
 
   def post_process(self, lp):
     """Update lp post_processing result variables.
@@ -1355,10 +1523,9 @@ class GridTransmission(object):
       lp: The LinearProgramContainer where the post processing variables reside.
     """
 
-    self.a_to_b.post_process(lp)
-    self.b_to_a.post_process(lp)
-    self.rec_a_to_b.post_process(lp)
-    self.rec_b_to_a.post_process(lp)
+    a_to_b_transmissions, b_to_a_transmissions = self._transmissions()
+    for transmission in a_to_b_transmissions + b_to_a_transmissions:
+      transmission.post_process(lp)
 
   def get_nameplate_solution_value(self):
     """Gets the linear program solver results for nameplate.
@@ -1392,6 +1559,13 @@ class LinearProgramContainer(object):
     lp.add_transmissions(<GridTransmission>)
     lp.solve()
 
+  Containers hold no shared state: each one has its own solver, and
+  pywraplp releases the GIL while it solves.  So several containers can
+  be built and solved concurrently from a thread pool, sharing read-only
+  profiles.  Each thread needs its own GridDemand, GridSource,
+  GridStorage and GridTransmission objects though, since they keep the
+  solver variables of the container they were added to.
+
   Attributes:
     carbon_tax: The amount to 
     tax 1 unit of co2 emissions.
@@ -1417,9 +1591,13 @@ class LinearProgramContainer(object):
         a list of LP Constraints which ensures that
         rps_credit[grid_region, t] <= demand[grid_region, t]
 
+      The rps constraints are only built if rps_percent > 0, otherwise
+      their dicts are empty.
+
     RPS Variables:
       rps_credit_variables: Dict object keyed by grid_region_id.  Value is a
         list of rps_credit[grid_region, t] variables for calculating rps.
+        Empty if rps_percent is 0.
 
     Post Processing Variables.  Computed after LP converges:
       rps_total: Dict object keyed by grid_region_id.  Value is sum
@@ -1441,7 +1619,26 @@ class LinearProgramContainer(object):
       transmission: A list of GridTransmission(s).
 
     solver: The wrapped pywraplp.Solver.
+    solver_type: pywraplp problem type of solver, CLP by default.  Set
+      to pywraplp.Solver.GLOP_LINEAR_PROGRAMMING before solve() to use
+      iteration limits, chunked progress reports and cancellation.
     solver_precision: A float representing estimated precision of the solver.
+    status: pywraplp result status of the last solve, None before solve().
+    stop_reason: Why the last solve stopped early ('time limit',
+      'iteration limit' or 'cancelled'), None if it finished.
+    warm_solver: The pywraplp.Solver which holds the simplex state of
+      the last solve.  Used to warm start the next solve.  Usually the
+      same as solver unless the solve was warm started or scaled.
+    warm_scaling: Scaling (see model_scaling) of the LP held by
+      warm_solver, None if it is not scaled.
+    memory_budget_mb: Optional float megabytes which solve() checks the
+      estimated peak memory of the LP against (see estimate_size) before
+      building it.  None, the default, sets no limit.
+    memory_policy: What solve() does when the estimate exceeds
+      memory_budget_mb: 'refuse' (the default) raises
+      ModelTooLargeError, 'warn' logs a warning and solves anyway.
+    memory_estimate: Dict returned by estimate_size() for the last
+      solve(), None before solve().
   """
 
   def __init__(self, profiles):
@@ -1487,7 +1684,15 @@ class LinearProgramContainer(object):
     self.transmission = []
 
     self.solver = None
+    self.solver_type = pywraplp.Solver.CLP_LINEAR_PROGRAMMING
     self.solver_precision = 1e-3
+    self.warm_solver = None
+    self.warm_scaling = None
+    self.status = None
+    self.stop_reason = None
+    self.memory_budget_mb = None
+    self.memory_policy = 'refuse'
+    self.memory_estimate = None
 
     # Validate profiles
     if profiles is None:
@@ -1574,10 +1779,319 @@ class LinearProgramContainer(object):
 
     self.transmission.extend(transmission)
 
+  def screen(self):
+    """Checks for infeasibility and bounds the cost before building the LP.
+
+    Uses only the profiles and the limits and costs of the grid
+    elements, so it takes milliseconds even for LPs which take minutes
+    to solve.  The checks are necessary conditions: an LP which passes
+    may still fail to converge, but an LP which fails never converges.
+
+    Infeasibility checks in each grid region (all regions are pooled
+    together if there is any transmission):
+      - Without storage, demand[t] must not exceed the maximum power
+        of all sources at t.  Non-dispatchable sources can only supply
+        power when their profile is > 0.
+      - Total demand must not exceed the maximum energy of all sources.
+      - The largest possible rps credit must meet rps_percent of total
+        demand.  Without storage, rps credit at t is limited to
+        min(demand[t], maximum power of rps sources at t).  E.g. a high
+        RPS with only solar and no storage fails at night.
+
+    The cost lower bound meets total demand with the cheapest energy
+    first, ignoring when each source can supply it.  Nameplate costs
+    of dispatchable sources, storage and transmission are ignored.
+
+    Returns:
+      A ScreeningResult.
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+      return self._screen()
+
+  def _screen(self):
+    """Implements screen()."""
+
+    number_of_timeslices = self.number_of_timeslices
+    # Transmission pools every region into pool 0.
+    pool_all = bool(self.transmission)
+
+    def pool(region_id):
+      return 0 if pool_all else region_id
+
+    demand = {}
+    for d in self.demands:
+      region = pool(d.grid_region_id)
+      demand[d.grid_region_id] = (region, np.array(self.profiles[d.name],
+                                                   dtype=float))
+    pools = set(region for region, _ in demand.values())
+    pool_demand = {g: np.zeros(number_of_timeslices) for g in pools}
+    for region, profile in demand.values():
+      pool_demand[region] += profile
+
+    has_storage = set(pool(s.grid_region_id) for s in self.storage)
+
+    # Power (timeslice x source) and energy limits, on the grid.
+    power = {g: [] for g in pools}
+    rps_power = {g: [] for g in pools}
+    energy = {g: [] for g in pools}
+    rps_energy = {g: [] for g in pools}
+    unit_costs = []
+    cost_of_money = self.cost_of_money
+    for source in self.sources:
+      g = pool(source.grid_region_id)
+      if g not in pools:
+        continue
+      variable_cost = (source.variable_unit_cost +
+                       source.co2_per_electrical_energy * self.carbon_tax)
+      if isinstance(source.solver, _GridSourceNonDispatchableSolver):
+        profile = np.array(source.solver.profile, dtype=float)
+        sum_profile = profile.sum()
+        max_nameplate = np.inf
+        if source.max_power >= 0:
+          max_nameplate = source.max_power
+        if source.max_energy >= 0:
+          max_nameplate = min(max_nameplate, source.max_energy / sum_profile)
+        source_power = np.where(profile > 0, profile * max_nameplate, 0.0)
+        source_energy = max_nameplate * sum_profile
+        unit_cost = (source.nameplate_unit_cost / sum_profile +
+                     cost_of_money * variable_cost)
+      else:
+        power_coefficient = source.power_coefficient
+        source_power = np.full(number_of_timeslices,
+                               source.max_power * power_coefficient
+                               if source.max_power >= 0 else np.inf)
+        source_energy = (source.max_energy * power_coefficient
+                         if source.max_energy >= 0 else np.inf)
+        unit_cost = cost_of_money * variable_cost / power_coefficient
+
+      source_energy = min(source_energy, source_power.sum())
+      power[g].append(source_power)
+      energy[g].append(source_energy)
+      if source.is_rps_source:
+        rps_power[g].append(source_power)
+        rps_energy[g].append(source_energy)
+      if source_energy > 0:
+        unit_costs.append((unit_cost, source_energy))
+
+    total_demand = 0.0
+    max_rps_credit = 0.0
+    for g in sorted(pools):
+      region_demand = pool_demand[g]
+      region_power = np.sum(power[g], axis=0) if power[g] else np.zeros(
+          number_of_timeslices)
+      region_energy = np.sum(energy[g])
+      total_demand += region_demand.sum()
+
+      if g not in has_storage:
+        short = region_demand > region_power
+        if short.any():
+          return ScreeningResult(
+              'infeasible',
+              'Demand exceeds maximum source power in grid region %d in %d '
+              'time-slices (first: %d).' % (g, short.sum(), np.argmax(short)),
+              np.inf)
+
+      if region_demand.sum() > region_energy:
+        return ScreeningResult(
+            'infeasible',
+            'Demand of %g exceeds maximum source energy %g in grid region %d.'
+            % (region_demand.sum(), region_energy, g), np.inf)
+
+      region_rps_energy = np.sum(rps_energy[g])
+      if g in has_storage:
+        max_rps_credit += min(region_demand.sum(), region_rps_energy)
+      elif rps_power[g]:
+        max_rps_credit += min(
+            np.minimum(region_demand, np.sum(rps_power[g], axis=0)).sum(),
+            region_rps_energy)
+
+    rps_demand = total_demand * self.rps_percent / 100.
+    if rps_demand > max_rps_credit * (1 + self.solver_precision):
+      return ScreeningResult(
+          'infeasible',
+          'RPS of %g%% needs %g of rps credit but at most %g is possible.' % (
+              self.rps_percent, rps_demand, max_rps_credit),
+          np.inf)
+
+    storage_costs = [getattr(s, name) for s in self.storage
+                     for name in ['storage_nameplate_cost',
+                                  'charge_nameplate_cost',
+                                  'discharge_nameplate_cost']]
+    if (any(cost < 0 for cost, _ in unit_costs) or
+        any(cost < 0 for cost in storage_costs)):
+      return ScreeningResult('ok', '', -np.inf)
+
+    # Fill total demand with the cheapest energy first.
+    cost_lower_bound = 0.0
+    remaining = total_demand
+    for unit_cost, source_energy in sorted(unit_costs):
+      used = min(remaining, source_energy)
+      cost_lower_bound += unit_cost * used
+      remaining -= used
+      if remaining <= 0:
+        break
+
+    return ScreeningResult('ok', '', cost_lower_bound)
+
+  def prune_dominated_sources(self):
+    """Removes sources which another source can always replace for less.
+
+    Compares the screening curves of sources: each source's cost per
+    unit of nameplate as a function of capacity factor.  Source B
+    dominates source A if, for any way A could be dispatched, enough
+    nameplate of B to supply the same power in every time-slice costs
+    no more.  Removing A then leaves the optimal cost unchanged, while
+    the LP has none of A's variables and constraints.
+
+    B can only replace A if both are in the same grid region, B has no
+    max_power or max_energy limit, and B is an rps source whenever A
+    is one (if there is an rps).  Storage and transmission are never
+    removed.
+
+    Call before solve().  Removed sources have no solution values.
+
+    Returns:
+      A dict keyed by the name of each removed source with the name of
+      a source which dominates it.
+    """
+
+    # Per source: power delivered per unit nameplate at each
+    # time-slice, cost per unit nameplate and variable cost per unit
+    # of delivered energy.
+    output = []
+    nameplate_cost = []
+    variable_cost = []
+    for source in self.sources:
+      unit_variable_cost = self.cost_of_money * (
+          source.variable_unit_cost +
+          source.co2_per_electrical_energy * self.carbon_tax)
+      if isinstance(source.solver, _GridSourceNonDispatchableSolver):
+        profile = np.array(source.solver.profile, dtype=float)
+        output.append(profile)
+        nameplate_cost.append(source.nameplate_unit_cost +
+                              unit_variable_cost * profile.sum())
+        variable_cost.append(0.0)
+      else:
+        output.append(np.full(self.number_of_timeslices,
+                              source.power_coefficient))
+        nameplate_cost.append(source.nameplate_unit_cost)
+        variable_cost.append(unit_variable_cost / source.power_coefficient)
+
+    output = np.array(output)
+    nameplate_cost = np.array(nameplate_cost)
+    variable_cost = np.array(variable_cost)
+    dispatchable = np.array(
+        [not isinstance(s.solver, _GridSourceNonDispatchableSolver)
+         for s in self.sources])
+    unlimited = np.array([s.max_power < 0 and s.max_energy < 0
+                          for s in self.sources])
+    region = np.array([s.grid_region_id for s in self.sources])
+    is_rps = np.array([s.is_rps_source for s in self.sources])
+
+    dominated = {}
+    for a, source in enumerate(self.sources):
+      # Nameplate of each source needed per unit nameplate of a.
+      with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(output[a] > 0, output[a] / output, 0.0)
+      scale = ratio.max(axis=1)
+
+      if dispatchable[a]:
+        variable_increase = (np.maximum(variable_cost - variable_cost[a], 0) *
+                             output[a].sum())
+      else:
+        variable_increase = variable_cost * output[a].sum()
+
+      dominates = (unlimited & (region == region[a]) &
+                   np.isfinite(scale) &
+                   (scale * nameplate_cost + variable_increase <=
+                    nameplate_cost[a]))
+      if self.rps_percent > 0 and is_rps[a]:
+        dominates &= is_rps
+      dominates[a] = False
+      # Sources with identical costs dominate each other, so only
+      # compare against sources which are kept.
+      dominates &= np.array([s.name not in dominated for s in self.sources])
+      if dominates.any():
+        dominated[source.name] = self.sources[np.argmax(dominates)].name
+
+    # Dominance is transitive, so point every removed source to one
+    # which is kept.
+    for name in dominated:
+      while dominated[name] in dominated:
+        dominated[name] = dominated[dominated[name]]
+
+    self.sources = [s for s in self.sources if s.name not in dominated]
+
+    return dominated
+
   def constraint(self, lower, upper, name=None, debug=False):
     """Build a new Constraint which with valid range between lower and upper."""
     return Constraint(self, lower, upper, name, debug)
 
+  def estimate_size(self):
+    """Estimates the size and peak memory of the LP before it is built.
+
+    Counts what _initialize_solver and the grid elements will build (see
+    lp_size() of the grid elements) without allocating any of it.
+    Nonzeros count every coefficient set, including the zeros of
+    nondispatchable profiles which the solver drops.
+
+    Returns:
+      Dict of the 'variables', 'rows' and 'nonzeros' of the LP and
+      'memory_mb', its approximate peak resident memory in megabytes
+      while it is built and solved (see MEMORY_BYTES).
+    """
+    t = self.number_of_timeslices
+    demands = len(self.demands)
+
+    # Conserve power rows, and with an rps the rps_credit variables, the
+    # total rps credit row and the rps rows of every grid_region.
+    sizes = [LpSize(0, demands * t, 0)]
+    if self.rps_percent > 0.0 and demands:
+      sizes.append(LpSize(demands * t, 1 + 2 * demands * t, 3 * demands * t))
+
+    sizes += [element.lp_size(self)
+              for element in self.sources + self.storage + self.transmission]
+    size = _add_lp_sizes(*sizes)
+
+    memory_bytes = (MEMORY_BYTES['variable'] * size.variables +
+                    MEMORY_BYTES['row'] * size.rows +
+                    MEMORY_BYTES['nonzero'] * size.nonzeros)
+    return {'variables': size.variables,
+            'rows': size.rows,
+            'nonzeros': size.nonzeros,
+            'memory_mb': memory_bytes / 2.0**20}
+
+  def _check_memory(self):
+    """Applies memory_policy if the LP exceeds memory_budget_mb.
+
+    Raises:
+      ValueError: If memory_policy is not one of MEMORY_POLICIES.
+      ModelTooLargeError: If the LP is estimated to exceed
+        memory_budget_mb and memory_policy is 'refuse'.
+    """
+    if self.memory_policy not in MEMORY_POLICIES:
+      raise ValueError('memory_policy must be one of %s, got %r.' %
+                       (MEMORY_POLICIES, self.memory_policy))
+
+    estimate = self.memory_estimate = self.estimate_size()
+    if (self.memory_budget_mb is None or
+        estimate['memory_mb'] <= self.memory_budget_mb):
+      return
+
+    message = ('LP needs about %.0f MB (%d variables, %d rows, %d nonzeros), '
+               'over the memory budget of %.0f MB.' % (
+                   estimate['memory_mb'], estimate['variables'],
+                   estimate['rows'], estimate['nonzeros'],
+                   self.memory_budget_mb))
+    if self.memory_policy == 'warn':
+      logging.warning(message)
+      return
+
+    raise ModelTooLargeError(
+        message + '  Solve fewer timeslices or grid_regions at a time.')
+
   def _initialize_solver(self):
     """Initializes solver, declares objective and set constraints.
 
@@ -1591,8 +2105,7 @@ class LinearProgramContainer(object):
     Also configures GridElements.
 
     """
-    self.solver = pywraplp.Solver('SolveEnergy',
-                                  pywraplp.Solver.CLP_LINEAR_PROGRAMMING)
+    self.solver = pywraplp.Solver('SolveEnergy', self.solver_type)
 
     self.minimize_costs_objective = Objective(self, minimize=True)
 
@@ -1650,28 +2163,31 @@ class LinearProgramContainer(object):
     # The constraint named rps_demand_constraints is:
     #   rps_credit[g][t] <= demand[g][t]
     #
+    # Without an rps none of this is needed: no credit variables or
+    # rps constraints are built, and sources, storage and transmission
+    # skip their rps bookkeeping.
 
     self.total_demand = demand_sum
     self.rps_demand = demand_sum * self.rps_percent / 100.
+    self.rps_source_constraints = {}
+    self.rps_demand_constraints = {}
+    self.rps_credit_variables = {}
+
     solver = self.solver
-    total_rps_credit_gt_rps_percent_constraint = self.constraint(
-        self.rps_demand,
-        solver.infinity()
-    )
+    demands = self.demands if self.rps_percent > 0.0 else []
+    if demands:
+      total_rps_credit_gt_rps_percent_constraint = self.constraint(
+          self.rps_demand,
+          solver.infinity()
+      )
 
-    for d in self.demands:
+    for d in demands:
       profiles = self.profiles[d.name]
 
-      if self.rps_percent > 0.0:
-        rps_credit_variables = self.declare_timeslice_variables(
-            '__rps_credit__',
-            d.grid_region_id
-        )
-      else:
-        rps_credit_variables = [solver.NumVar(0.0, 0.0,
-                                              '__bogus rps_credit__ %d %d' %(
-                                                  d.grid_region_id, t))
-                                for t in self.time_index_iterable]
+      rps_credit_variables = self.declare_timeslice_variables(
+          '__rps_credit__',
+          d.grid_region_id
+      )
 
       rps_demand_constraints = []
       rps_source_constraints = [self.constraint(0.0, solver.infinity())
@@ -1689,7 +2205,7 @@ class LinearProgramContainer(object):
 
         # Rps_credit[grid_region, t] <= demand[grid_region, t].
         rps_credit_less_than_demand = self.constraint(-solver.infinity(),
-                                                      profiles[t])
+                                                      float(profiles.iloc[t]))
         rps_credit_less_than_demand.set_coefficient(rps_credit_variables[t],
                                                     1.0)
         rps_demand_constraints.append(rps_credit_less_than_demand)
@@ -1706,20 +2222,113 @@ class LinearProgramContainer(object):
     for s in self.sources + self.storage + self.transmission:
       s.configure_lp_variables_and_constraints(self)
 
-  def solve(self):
+  def solve(self, warm_start=None, time_limit=None, iteration_limit=None,
+            progress=None, progress_interval=1000, cancel=None,
+            scaling=False):
     """Initializes and runs linear program.
 
     This is the main routine to call after __init__.
 
+    Args:
+      warm_start: Optional LinearProgramContainer which has already been
+        solved and has the same grid elements and number of timeslices,
+        and an rps exactly when this LP has one (rps_percent > 0),
+        e.g. the neighboring point of a carbon_tax sweep, or self after
+        changing costs.  Its solver is updated in place with the
+        coefficients of this LP and re-solved starting from its last
+        basis.  The solution is then loaded into self.solver.  The
+        solver is handed over, so warm_start may only be used once.
+      time_limit: Optional float seconds after which the solve stops.
+      iteration_limit: Optional int simplex iterations after which the
+        solve stops.  Requires GLOP as solver_type.
+      progress: Optional callable called with a progress report dict
+        (iterations, seconds, status, objective, primal_infeasibility,
+        dual_infeasibility).  With GLOP it is called every
+        progress_interval iterations, otherwise once at the end.
+      progress_interval: int simplex iterations between progress reports.
+      cancel: Optional threading.Event or multiprocessing.Event.  Setting
+        it from another thread or process stops the solve.  Requires
+        GLOP as solver_type.
+      scaling: If True, solve a copy of the LP with equilibrated rows and
+        columns and a normalized objective (see model_scaling) and load
+        its unscaled solution into self.solver.  Progress infeasibilities
+        are then in scaled units.  A warm start keeps the scaling of
+        warm_start instead.
+
     Returns:
       True if linear program gave an optimal result.  False otherwise.
+      If the solve was stopped by a limit or cancel, stop_reason says
+      why and the best feasible solution found, if any, is loaded into
+      self.solver with status FEASIBLE.
+
+    Raises:
+      ValueError: If warm_start has not been solved or has a different
+        set of variables and constraints, if iteration_limit or
+        cancel are given for a solver_type other than GLOP, or if
+        memory_policy is unknown.
+      ModelTooLargeError: If the LP is estimated to exceed
+        memory_budget_mb and memory_policy is 'refuse' (see
+        estimate_size).  Nothing is built then.
     """
+    if (self.solver_type != pywraplp.Solver.GLOP_LINEAR_PROGRAMMING and
+        (iteration_limit is not None or cancel is not None)):
+      raise ValueError('iteration_limit and cancel require GLOP solver_type.')
+    self._check_memory()
+
+    warm_solver = None
+    warm_scaling = None
+    if warm_start is not None:
+      warm_solver = warm_start.warm_solver
+      warm_scaling = warm_start.warm_scaling
+      if warm_solver is None:
+        raise ValueError('warm_start has not been solved.')
+      warm_start.warm_solver = None
+
     self._initialize_solver()
-    status = self.solver.Solve()
+
+    solver = warm_solver
+    self.warm_scaling = warm_scaling
+    if solver is None:
+      solver = self.solver
+      if scaling:
+        model = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(model)
+        self.warm_scaling = model_scaling(model)
+        solver = pywraplp.Solver('SolveEnergyScaled', self.solver_type)
+        solver.LoadModelFromProto(scale_model(model, self.warm_scaling))
+    else:
+      model = linear_solver_pb2.MPModelProto()
+      self.solver.ExportModelToProto(model)
+      if self.warm_scaling is not None:
+        model = scale_model(model, self.warm_scaling)
+      copy_model_changes(solver, model)
+
+    if progress is not None and self.warm_scaling is not None:
+      report_progress = progress
+      objective_scale = self.warm_scaling[2]
+      progress = lambda report: report_progress(
+          dict(report, objective=report['objective'] / objective_scale))
+    status, self.stop_reason = solve_with_limits(
+        solver, time_limit, iteration_limit, progress, progress_interval,
+        cancel)
+    self.warm_solver = solver
+
+    if (solver is not self.solver and
+        status in [solver.OPTIMAL, solver.FEASIBLE]):
+      solution = linear_solver_pb2.MPSolutionResponse()
+      solver.FillSolutionResponseProto(solution)
+      if self.warm_scaling is not None:
+        solution = unscale_solution(solution, self.warm_scaling)
+      self.solver.LoadSolutionFromProto(solution)
+
+    self.status = status
     converged = status == self.solver.OPTIMAL
 
     if converged:
       self._post_process()
+    elif self.stop_reason is not None:
+      logging.warning('Solve stopped (%s), status %d.', self.stop_reason,
+                      status)
 
     return converged
 
@@ -1754,8 +2363,11 @@ class LinearProgramContainer(object):
 
       lights_kept_on = (power_deficit < solver_precision).all()
 
-      rps_credits = np.array(
-          [rcv.solution_value() for rcv in self.rps_credit_variables[g_id]])
+      if g_id in self.rps_credit_variables:
+        rps_credits = np.array(
+            [rcv.solution_value() for rcv in self.rps_credit_variables[g_id]])
+      else:
+        rps_credits = np.zeros(self.number_of_timeslices)
       sum_rps_credits += sum(rps_credits)
       self.rps_credit_values[g_id] = rps_credits
 
@@ -1893,3 +2505,370 @@ def extrapolate_cost(cost, discount_rate, time_span_1, time_span_2):
     return cost * (1.0 - value_decay_1) / (1.0-value_decay_2)
   except ZeroDivisionError:
     return cost
+
+
+def _add_lp_sizes(*sizes):
+  """Sums LpSizes."""
+  return LpSize(*[sum(counts) for counts in zip(*sizes)])
+
+
+def copy_model_changes(solver, model):
+  """Copies coefficients and bounds of a model into an existing solver.
+
+  Only values which differ are set so the solver keeps its last basis
+  and can re-solve incrementally.
+
+  Args:
+    solver: pywraplp.Solver holding a model with the same variables and
+      constraints as model.
+    model: linear_solver_pb2.MPModelProto to copy into solver.
+
+  Raises:
+    ValueError: If solver and model do not have the same variables and
+      constraints.
+  """
+  current = linear_solver_pb2.MPModelProto()
+  solver.ExportModelToProto(current)
+
+  if (len(current.variable) != len(model.variable) or
+      len(current.constraint) != len(model.constraint)):
+    raise ValueError('Model does not have the same variables and constraints.')
+
+  variables = solver.variables()
+  objective = solver.Objective()
+  if current.maximize != model.maximize:
+    objective.SetOptimizationDirection(model.maximize)
+
+  for i, (old, new) in enumerate(zip(current.variable, model.variable)):
+    if old.objective_coefficient != new.objective_coefficient:
+      objective.SetCoefficient(variables[i], new.objective_coefficient)
+    if old.lower_bound != new.lower_bound or old.upper_bound != new.upper_bound:
+      variables[i].SetBounds(new.lower_bound, new.upper_bound)
+
+  constraints = solver.constraints()
+  for i, (old, new) in enumerate(zip(current.constraint, model.constraint)):
+    if old.var_index != new.var_index:
+      raise ValueError(
+          'Model does not have the same variables and constraints.')
+    if old.coefficient != new.coefficient:
+      for var_index, coefficient in zip(new.var_index, new.coefficient):
+        constraints[i].SetCoefficient(variables[var_index], coefficient)
+    if old.lower_bound != new.lower_bound or old.upper_bound != new.upper_bound:
+      constraints[i].SetBounds(new.lower_bound, new.upper_bound)
+
+
+def _progress_report(solver, status, iterations, seconds, bounds):
+  """Reports the progress of a solve from the solution solver holds.
+
+  Args:
+    solver: pywraplp.Solver after a call to Solve().
+    status: pywraplp result status of that call.
+    iterations: int total simplex iterations so far.
+    seconds: float seconds since the solve started.
+    bounds: ((variable lower, variable upper), (constraint lower,
+      constraint upper)) numpy arrays of the exported model.
+
+  Returns:
+    Dict with iterations, seconds, status, objective,
+    primal_infeasibility (largest violation of a variable or constraint
+    bound) and dual_infeasibility (largest reduced cost of the wrong
+    sign for a minimization).  Values are nan without a solution.
+  """
+  report = {'iterations': iterations, 'seconds': seconds, 'status': status,
+            'objective': np.nan, 'primal_infeasibility': np.nan,
+            'dual_infeasibility': np.nan}
+  response = linear_solver_pb2.MPSolutionResponse()
+  solver.FillSolutionResponseProto(response)
+  if len(response.variable_value) != solver.NumVariables():
+    return report
+
+  (variable_lb, variable_ub), (constraint_lb, constraint_ub) = bounds
+  values = np.array(response.variable_value)
+  activities = np.array(solver.ComputeConstraintActivities())
+  violations = [variable_lb - values, values - variable_ub,
+                constraint_lb - activities, activities - constraint_ub]
+  report['objective'] = response.objective_value
+  report['primal_infeasibility'] = max(
+      0, max(violation.max(initial=0) for violation in violations))
+  if len(response.reduced_cost) == len(values):
+    reduced_cost = np.array(response.reduced_cost)
+    tolerance = 1e-6 * np.maximum(1, np.abs(values))
+    can_increase = np.where(values < variable_ub - tolerance,
+                            np.maximum(-reduced_cost, 0), 0)
+    can_decrease = np.where(values > variable_lb + tolerance,
+                            np.maximum(reduced_cost, 0), 0)
+    report['dual_infeasibility'] = max(can_increase.max(initial=0),
+                                       can_decrease.max(initial=0))
+
+  return report
+
+
+def _interrupt_when_set(solver, cancel, solving):
+  """Interrupts the running solve of solver once cancel is set.
+
+  Args:
+    solver: pywraplp.Solver to interrupt.
+    cancel: threading.Event or multiprocessing.Event.
+    solving: threading.Event which is cleared when the solve is over.
+  """
+  while solving.is_set():
+    if cancel.wait(0.1):
+      solver.InterruptSolve()
+      return
+
+
+def solve_with_limits(solver, time_limit=None, iteration_limit=None,
+                      progress=None, progress_interval=1000, cancel=None):
+  """Solves with optional time and iteration limits and cancellation.
+
+  With progress, GLOP solves in chunks of progress_interval iterations,
+  each resuming from the basis of the last one.  Cancellation is watched
+  by a thread which interrupts the running solve, which GLOP supports.
+
+  Args:
+    solver: pywraplp.Solver to solve.
+    time_limit: Optional float seconds.
+    iteration_limit: Optional int simplex iterations (GLOP only).
+    progress: Optional callable called with a _progress_report dict after
+      every chunk.
+    progress_interval: int simplex iterations per chunk.
+    cancel: Optional threading.Event or multiprocessing.Event.
+
+  Returns:
+    Tuple of (status, stop_reason).  stop_reason is None if the solver
+    finished on its own, else 'time limit', 'iteration limit' or
+    'cancelled'.  A stopped solve is FEASIBLE with the best feasible
+    solution found loaded into solver, or NOT_SOLVED if none was found.
+  """
+  start = time.time()
+  chunk = progress_interval if progress is not None else iteration_limit
+  bounds = None
+  if progress is not None:
+    model = linear_solver_pb2.MPModelProto()
+    solver.ExportModelToProto(model)
+    bounds = [(np.array([row.lower_bound for row in rows]),
+               np.array([row.upper_bound for row in rows]))
+              for rows in [model.variable, model.constraint]]
+
+  solving = threading.Event()
+  solving.set()
+  watcher = None
+  iterations = 0
+  chunked = False
+  best = None
+  stop_reason = None
+  try:
+    if cancel is not None:
+      watcher = threading.Thread(target=_interrupt_when_set,
+                                 args=(solver, cancel, solving), daemon=True)
+      watcher.start()
+    while True:
+      if cancel is not None and cancel.is_set():
+        stop_reason = 'cancelled'
+        break
+      if time_limit is not None:
+        time_left = time_limit - (time.time() - start)
+        if time_left <= 0:
+          stop_reason = 'time limit'
+          break
+        # A time limit of 0 means no limit.
+        solver.SetTimeLimit(max(1, int(time_left * 1000)))
+      chunk_limit = chunk
+      if iteration_limit is not None:
+        chunk_limit = min(chunk_limit, iteration_limit - iterations)
+      if chunk_limit is not None and not (
+          solver.SetSolverSpecificParametersAsString(
+              'max_number_of_iterations: %d' % chunk_limit)):
+        # The solver has no iteration limit (e.g. CLP), so solve in one go.
+        chunk = chunk_limit = None
+      chunked = chunked or chunk_limit is not None
+
+      status = solver.Solve()
+      iterations += solver.iterations()
+      if (status in [solver.OPTIMAL, solver.FEASIBLE] and
+          solver.VerifySolution(1e-6, False)):
+        best = linear_solver_pb2.MPSolutionResponse()
+        solver.FillSolutionResponseProto(best)
+      if progress is not None:
+        progress(_progress_report(solver, status, iterations,
+                                  time.time() - start, bounds))
+
+      if status not in [solver.FEASIBLE, solver.NOT_SOLVED]:
+        # Optimal, or a definite outcome such as infeasible.
+        return status, None
+      if cancel is not None and cancel.is_set():
+        stop_reason = 'cancelled'
+      elif chunk_limit is not None and solver.iterations() >= chunk_limit:
+        if iteration_limit is not None and iterations >= iteration_limit:
+          stop_reason = 'iteration limit'
+        else:
+          continue
+      elif time_limit is not None and time.time() - start >= time_limit * 0.99:
+        stop_reason = 'time limit'
+      else:
+        return status, None
+      break
+  finally:
+    solving.clear()
+    if watcher is not None:
+      watcher.join()
+    solver.SetTimeLimit(0)
+    if chunked:
+      solver.SetSolverSpecificParametersAsString('')
+
+  if best is None:
+    return solver.NOT_SOLVED, stop_reason
+  solver.LoadSolutionFromProto(best)
+  return solver.FEASIBLE, stop_reason
+
+
+def _model_matrix(model):
+  """Returns the constraint matrix of an exported model as arrays.
+
+  Args:
+    model: linear_solver_pb2.MPModelProto.
+
+  Returns:
+    Tuple of (rows, columns, coefficients, lengths): row index, column
+    index and coefficient of every term, and the number of terms of
+    each row.
+  """
+  lengths = np.array([len(row.var_index) for row in model.constraint],
+                     dtype=int)
+  rows = np.repeat(np.arange(len(model.constraint)), lengths)
+  columns = np.fromiter((i for row in model.constraint for i in row.var_index),
+                        dtype=int, count=lengths.sum())
+  coefficients = np.fromiter(
+      (a for row in model.constraint for a in row.coefficient),
+      dtype=float, count=lengths.sum())
+
+  return rows, columns, coefficients, lengths
+
+
+def _geometric_scale(index, magnitudes, size):
+  """Returns 1 / sqrt(largest * smallest) magnitude of each row or column.
+
+  Args:
+    index: Row or column index of each magnitude.
+    magnitudes: Positive magnitudes of the matrix terms.
+    size: Number of rows or columns.
+
+  Returns:
+    Numpy array of size scale factors, 1 where there are no terms.
+  """
+  largest = np.zeros(size)
+  smallest = np.full(size, np.inf)
+  np.maximum.at(largest, index, magnitudes)
+  np.minimum.at(smallest, index, magnitudes)
+  scale = np.ones(size)
+  present = largest > 0
+  scale[present] = 1 / np.sqrt(largest[present] * smallest[present])
+
+  return scale
+
+
+def model_scaling(model, passes=4):
+  """Computes scale factors which equilibrate an exported model.
+
+  Geometric mean scaling: each pass divides every row, then every
+  column, by the geometric mean of its largest and smallest absolute
+  coefficient.  Column scales act as a choice of units per variable
+  (e.g. GW instead of MW) and the objective scale as a choice of
+  currency unit (e.g. $M).  Factors are powers of 2 so scaling and
+  unscaling add no rounding error.
+
+  Args:
+    model: linear_solver_pb2.MPModelProto.
+    passes: int number of row and column passes.
+
+  Returns:
+    Tuple of (row_scale, column_scale, objective_scale).  The scaled
+    model has coefficients row_scale[i] * a[i, j] * column_scale[j],
+    variables x[j] / column_scale[j] and its objective multiplied by
+    objective_scale.
+  """
+  rows, columns, coefficients, _ = _model_matrix(model)
+  magnitudes = np.abs(coefficients)
+  nonzero = magnitudes > 0
+  rows, columns, magnitudes = rows[nonzero], columns[nonzero], magnitudes[nonzero]
+  row_scale = np.ones(len(model.constraint))
+  column_scale = np.ones(len(model.variable))
+
+  for _ in range(passes):
+    row_scale *= _geometric_scale(
+        rows, magnitudes * row_scale[rows] * column_scale[columns],
+        len(row_scale))
+    column_scale *= _geometric_scale(
+        columns, magnitudes * row_scale[rows] * column_scale[columns],
+        len(column_scale))
+  row_scale = 2.0 ** np.round(np.log2(row_scale))
+  column_scale = 2.0 ** np.round(np.log2(column_scale))
+
+  costs = np.abs(np.array(
+      [var.objective_coefficient for var in model.variable])) * column_scale
+  objective_scale = 1.0
+  if costs.size and costs.max() > 0:
+    objective_scale = 2.0 ** -np.round(np.log2(costs.max()))
+
+  return row_scale, column_scale, objective_scale
+
+
+def scale_model(model, scaling):
+  """Returns a copy of an exported model with scaling applied.
+
+  Args:
+    model: linear_solver_pb2.MPModelProto.
+    scaling: Tuple returned by model_scaling.
+
+  Returns:
+    Scaled linear_solver_pb2.MPModelProto.
+  """
+  row_scale, column_scale, objective_scale = scaling
+  rows, columns, coefficients, lengths = _model_matrix(model)
+  scaled_coefficients = np.split(
+      coefficients * row_scale[rows] * column_scale[columns],
+      np.cumsum(lengths)[:-1])
+
+  scaled = linear_solver_pb2.MPModelProto()
+  scaled.CopyFrom(model)
+  scaled.objective_offset *= objective_scale
+  for var, scale in zip(scaled.variable, column_scale):
+    var.lower_bound /= scale
+    var.upper_bound /= scale
+    var.objective_coefficient *= scale * objective_scale
+  for row, scale, row_coefficients in zip(scaled.constraint, row_scale,
+                                          scaled_coefficients):
+    row.lower_bound *= scale
+    row.upper_bound *= scale
+    row.coefficient[:] = row_coefficients
+
+  return scaled
+
+
+def unscale_solution(response, scaling):
+  """Converts the solution of a scaled model back to original units.
+
+  Args:
+    response: linear_solver_pb2.MPSolutionResponse of the scaled model.
+    scaling: Tuple returned by model_scaling.
+
+  Returns:
+    linear_solver_pb2.MPSolutionResponse with unscaled variable values,
+    reduced costs, duals and objective.
+  """
+  row_scale, column_scale, objective_scale = scaling
+  unscaled = linear_solver_pb2.MPSolutionResponse()
+  unscaled.CopyFrom(response)
+  unscaled.objective_value /= objective_scale
+  unscaled.best_objective_bound /= objective_scale
+  if len(response.variable_value) == len(column_scale):
+    unscaled.variable_value[:] = (np.array(response.variable_value) *
+                                  column_scale)
+  if len(response.reduced_cost) == len(column_scale):
+    unscaled.reduced_cost[:] = (np.array(response.reduced_cost) /
+                                (column_scale * objective_scale))
+  if len(response.dual_value) == len(row_scale):
+    unscaled.dual_value[:] = (np.array(response.dual_value) * row_scale /
+                              objective_scale)
+
+  return unscaled
@@ -298,9 +298,40 @@ def configure_sources_and_storage(profile_directory,
   return lp
 
 
-def main():
+# Cost option index of each source.  See source_dict_index in
+# configure_sources_and_storage.
+DEFAULT_COST_SETTINGS = {
+    'COAL': 0,
+    'HYDROPOWER': 0,
+    'NGCC': 0,
+    'NGCT': 0,
+    'NGCC_CRYO': 0,
+    'WIND': 2,
+    'SOLAR': 2,
+    'NUCLEAR': 2
+}
+
+
+def build_region_lp(region,
+                    cost_settings=None,
+                    storage_names=('ELECTROCHEMICAL',),
+                    rps_names=('SOLAR', 'WIND'),
+                    profile_directory=None):
+  """Loads the packaged cost data and configures the LP for a region.
 
-  region = 'california'
+  Args:
+    region: String name of the region to generate simulation for.
+      Acceptable values are REGION_HUBS.keys().
+    cost_settings: A dict keyed by source name with cost option
+      indices.  Defaults to DEFAULT_COST_SETTINGS.
+    storage_names: Names of storage types to add to the LP.
+    rps_names: Names of sources in the Renewable Portfolio Standard.
+    profile_directory: String filepath of the directory holding
+      profiles_usa.csv.  Defaults to the packaged profiles.
+
+  Returns:
+    A Configured LinearProgramContainer suitable for simulating.
+  """
 
   data_dir = simple.get_data_directory()
   source_cost_path = data_dir + ['costs', 'source_costs.csv']
@@ -316,33 +347,104 @@ def main():
   storage_costs_dataframe = pd.read_csv(storage_costs_file, index_col=0)
   hydrolimits_dataframe = pd.read_csv(hydro_limits_file, index_col=0)
 
-  ng_cost_index = 0
-  cost_settings = {
-      'COAL': 0,
-      'HYDROPOWER': 0,
-      'NGCC': ng_cost_index,
-      'NGCT': ng_cost_index,
-      'NGCC_CRYO': ng_cost_index,
-      'WIND': 2,
-      'SOLAR': 2,
-      'NUCLEAR': 2
-  }
-
-  storage_names = ['ELECTROCHEMICAL']
-  rps_names = ['SOLAR', 'WIND']
+  if cost_settings is None:
+    cost_settings = DEFAULT_COST_SETTINGS
 
-  profile_directory = osp.join(*profile_path)
-  lp = configure_sources_and_storage(
+  if profile_directory is None:
+    profile_directory = osp.join(*profile_path)
+  return configure_sources_and_storage(
       region=region,
       profile_directory=profile_directory,
       source_dataframe=source_costs_dataframe,
       storage_dataframe=storage_costs_dataframe,
       source_dict_index=cost_settings,
-      storage_names=storage_names,
-      rps_names=rps_names,
+      storage_names=list(storage_names),
+      rps_names=list(rps_names),
       hydrolimits=hydrolimits_dataframe.loc[region]
   )
 
+
+def run_region(region,
+               carbon_tax=50,
+               renewable_portfolio_percentage=20,
+               annual_discount_rate=0.06,
+               lifetime_in_years=30,
+               cost_settings=None,
+               storage_names=('ELECTROCHEMICAL',),
+               rps_names=('SOLAR', 'WIND'),
+               prune_dominated_sources=False,
+               profile_directory=None):
+  """Configures, solves and summarizes the LP for one region.
+
+  Every argument and the return value are plain python values, so
+  regional runs can be written out as batch or work queue jobs.
+
+  Args:
+    region: String name of the region.  See build_region_lp.
+    carbon_tax: Float cost of emitting co2 in $ / Tonne-of-CO2.
+    renewable_portfolio_percentage: 0. <= Float <= 100.  See
+      grid_sim_simple_example.adjust_lp_policy.
+    annual_discount_rate: Float interest rate of future costs.
+    lifetime_in_years: Float Number of years over which fuel costs
+      are paid off.
+    cost_settings: See build_region_lp.
+    storage_names: See build_region_lp.
+    rps_names: See build_region_lp.
+    prune_dominated_sources: Boolean.  If True, sources which another
+      source can always replace for less are removed before solving.
+      See LinearProgramContainer.prune_dominated_sources.
+    profile_directory: See build_region_lp.
+
+  Returns:
+    A dict with the 'region', whether the LP 'converged', the
+    'objective' cost, per name 'sources' nameplate (MW) and
+    generation (MWh), 'storage' nameplate (MWh) and the 'pruned'
+    sources, each with the name of a source which dominates it.
+  """
+
+  lp = build_region_lp(region, cost_settings, storage_names, rps_names,
+                       profile_directory)
+  simple.adjust_lp_policy(
+      lp,
+      carbon_tax=carbon_tax,
+      renewable_portfolio_percentage=renewable_portfolio_percentage,
+      annual_discount_rate=annual_discount_rate,
+      lifetime_in_years=lifetime_in_years)
+
+  pruned = {}
+  if prune_dominated_sources:
+    pruned = lp.prune_dominated_sources()
+
+  converged = bool(lp.solve())
+  summary = {'region': region,
+             'converged': converged,
+             'objective': None,
+             'sources': {},
+             'storage': {},
+             'pruned': pruned}
+  if converged:
+    summary['objective'] = lp.solver.Objective().Value()
+    for source in lp.sources:
+      summary['sources'][source.name] = {
+          'nameplate': source.get_nameplate_solution_value(),
+          'generation': float(sum(source.get_solution_values()))}
+    for storage in lp.storage:
+      summary['storage'][storage.name] = {
+          'nameplate': storage.get_nameplate_solution_value()}
+
+  return summary
+
+
+def main():
+
+  region = 'california'
+
+  storage_names = ['ELECTROCHEMICAL']
+  rps_names = ['SOLAR', 'WIND']
+
+  lp = build_region_lp(region, DEFAULT_COST_SETTINGS, storage_names,
+                       rps_names)
+
   simple.adjust_lp_policy(
       lp,
       carbon_tax=50,  # $50 per tonne
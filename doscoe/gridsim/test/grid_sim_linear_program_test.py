@@ -14,7 +14,9 @@
 
 """Tests for grid_sim_linear_program."""
 
+import concurrent.futures
 import math
+import threading
 
 import unittest
 
@@ -25,6 +27,7 @@ from gridsim.grid_sim_linear_program import GridDemand
 from gridsim.grid_sim_linear_program import GridRecStorage
 from gridsim.grid_sim_linear_program import GridSource
 from gridsim.grid_sim_linear_program import GridStorage
+from gridsim.grid_sim_linear_program import GridTransmission
 from gridsim.grid_sim_linear_program import LinearProgramContainer
 from gridsim.grid_sim_linear_program import RpsExceedsDemandError
 from gridsim.grid_sim_linear_program import RpsPercentNotMetError
@@ -33,8 +36,12 @@ import numpy as np
 import numpy.testing as npt
 import pandas as pd
 
+from ortools.linear_solver import linear_solver_pb2
+from ortools.linear_solver import pywraplp
+
 
 DEMAND = 'DEMAND'
+DEMAND2 = 'DEMAND2'
 NG = 'NG'
 NG2 = 'NG2'
 TIME = 'TIME'
@@ -310,6 +317,114 @@ class FourTimeSliceLpResults(FourTimeSliceTest):
     self.assertFalse(lp.solve())
 
 
+class ScreenTest(FourTimeSliceTest):
+  """Test LinearProgramContainer.screen() against solved LPs."""
+
+  def testFeasibleLowerBound(self):
+    """Lower bound of a feasible LP doesn't exceed its solved cost."""
+
+    lp = self.lp
+    ng1 = GridSource(NG, 1e6, 1e6, max_energy=1.0)
+    ng2 = GridSource(NG2, 2e6, 2e6)
+    lp.add_dispatchable_sources(ng1, ng2)
+    lp.add_nondispatchable_sources(self.solar)
+    result = lp.screen()
+    self.assertEqual(result.status, 'ok')
+    self.assertTrue(lp.solve())
+    self.assertLessEqual(result.cost_lower_bound,
+                         lp.solver.Objective().Value())
+
+  def testMaxPowerInfeasible(self):
+    """Demand above the max_power of all sources without storage."""
+
+    lp = self.lp
+    lp.add_dispatchable_sources(GridSource(NG, 1e6, 1e6, max_power=2.0))
+    result = lp.screen()
+    self.assertEqual(result.status, 'infeasible')
+    self.assertEqual(result.cost_lower_bound, np.inf)
+    self.assertFalse(lp.solve())
+
+  def testMaxEnergyInfeasible(self):
+    """Demand above max_energy can't be met even with storage."""
+
+    lp = self.lp
+    lp.add_dispatchable_sources(GridSource(NG, 1e6, 1e6, max_energy=5.0))
+    lp.add_storage(GridStorage(STORAGE, 0))
+    self.assertEqual(lp.screen().status, 'infeasible')
+    self.assertFalse(lp.solve())
+
+  def testRpsInfeasibleWithoutStorage(self):
+    """Solar can only earn rps credit in time-slices with sun."""
+
+    self.profiles[DEMAND] = 1.0
+    lp = LinearProgramContainer(self.profiles)
+    lp.add_demands(GridDemand(DEMAND))
+    lp.rps_percent = 100
+    lp.add_nondispatchable_sources(
+        GridSource(SOLAR, 1e6, 1e6, is_rps_source=True))
+    lp.add_dispatchable_sources(self.ng)
+    result = lp.screen()
+    self.assertEqual(result.status, 'infeasible')
+    self.assertIn('RPS', result.reason)
+
+    lp.add_storage(GridStorage(STORAGE, 0))
+    self.assertEqual(lp.screen().status, 'ok')
+
+  def testTransmissionPoolsRegions(self):
+    """Demand in a region without sources is met over transmission."""
+
+    profiles = self.profiles.assign(DEMAND2=self.demand_profile)
+    lp = LinearProgramContainer(profiles)
+    lp.add_demands(GridDemand(DEMAND), GridDemand(DEMAND2, 1))
+    lp.add_dispatchable_sources(self.ng)
+    lp.add_transmissions(GridTransmission('LINE', 1e6, 0, 1))
+    result = lp.screen()
+    self.assertEqual(result.status, 'ok')
+    self.assertTrue(lp.solve())
+    self.assertLessEqual(result.cost_lower_bound,
+                         lp.solver.Objective().Value())
+
+
+class PruneDominatedSourcesTest(FourTimeSliceTest):
+  """Test LinearProgramContainer.prune_dominated_sources()."""
+
+  def testMoreExpensiveDispatchablePruned(self):
+    """NG2 costs more than NG at every capacity factor."""
+
+    lp = self.lp
+    lp.add_dispatchable_sources(GridSource(NG2, 2e6, 2e6), self.ng)
+    self.assertEqual(lp.prune_dominated_sources(), {NG2: NG})
+    self.assertEqual([s.name for s in lp.sources], [NG])
+    self.assertTrue(lp.solve())
+
+  def testLimitedSourceKept(self):
+    """A source with max_power can't replace the other everywhere."""
+
+    lp = self.lp
+    lp.add_dispatchable_sources(GridSource(NG2, 2e6, 2e6),
+                                GridSource(NG, 1e6, 1e6, max_power=1))
+    self.assertEqual(lp.prune_dominated_sources(), {})
+    self.assertEqual(len(lp.sources), 2)
+
+  def testPrunedCostMatches(self):
+    """Pruning doesn't change the optimal cost."""
+
+    costs = []
+    for prune in [False, True]:
+      lp = LinearProgramContainer(self.profiles)
+      lp.add_demands(GridDemand(DEMAND))
+      lp.add_dispatchable_sources(GridSource(NG, 1e6, 2e6),
+                                  GridSource(NG2, 3e6, 2.5e6))
+      lp.add_nondispatchable_sources(GridSource(SOLAR, 1e6, 1e5),
+                                     GridSource(WIND, 5e6, 0))
+      if prune:
+        self.assertEqual(sorted(lp.prune_dominated_sources()), [NG2, WIND])
+      self.assertTrue(lp.solve())
+      costs.append(lp.solver.Objective().Value())
+
+    self.assertAlmostEqual(costs[0], costs[1])
+
+
 class SimpleStorageTest(FourTimeSliceTest):
   """Preliminary tests of Storage with power and energy limits."""
 
@@ -951,6 +1066,286 @@ class RecStorageCostsTest(TwoTimeSliceTest):
                             np.array([1.0, 1.0]))
 
 
+class WarmStartTest(TwoTimeSliceTest):
+  """Test warm starting solves from previously solved LPs."""
+
+  def testWarmStartMatchesColdSolve(self):
+    """Sweep storage costs, warm starting each point from the last."""
+    wind = GridSource(WIND, 1.0e6, 0)
+    storage = GridStorage(STORAGE, 0)
+    ng = GridSource(NG, 4.6e6, 0)
+    lp = self.lp
+    lp.add_nondispatchable_sources(wind)
+    lp.add_dispatchable_sources(ng)
+    lp.add_storage(storage)
+
+    self.assertTrue(lp.solve())
+    cold_cost = lp.minimize_costs_objective.value()
+
+    # Warm start from self.  Nothing changed so costs are identical.
+    self.assertTrue(lp.solve(warm_start=lp))
+    self.assertAlmostEqual(lp.minimize_costs_objective.value(), cold_cost)
+
+    # Wind + storage now costs more than ng.
+    storage.discharge_nameplate_cost = 3.0e6
+    self.assertTrue(lp.solve(warm_start=lp))
+
+    npt.assert_almost_equal(wind.get_solution_values(),
+                            np.zeros(2))
+
+    npt.assert_almost_equal(ng.get_solution_values(),
+                            np.array([1.0, 1.0]))
+
+    self.assertAlmostEqual(ng.get_nameplate_solution_value(), 1.0)
+    self.assertAlmostEqual(lp.minimize_costs_objective.value(), 4.6e6)
+
+  def testWarmStartFromOtherLp(self):
+    """Warm start a new LP from a neighboring solved LP."""
+    lps = []
+    solars = []
+    for solar_cost in [2.0e6, 5.0e6]:
+      lp = LinearProgramContainer(self.profiles)
+      lp.add_demands(GridDemand(DEMAND))
+      solar = GridSource(SOLAR, solar_cost, 0)
+      lp.add_nondispatchable_sources(solar)
+      lp.add_dispatchable_sources(GridSource(NG, 4.6e6, 0))
+      lp.add_storage(GridStorage(STORAGE, 0))
+      lps.append(lp)
+      solars.append(solar)
+
+    self.assertTrue(lps[0].solve())
+    npt.assert_almost_equal(solars[0].get_solution_values(),
+                            np.array([0.0, 2.0]))
+
+    self.assertTrue(lps[1].solve(warm_start=lps[0]))
+    npt.assert_almost_equal(solars[1].get_solution_values(), np.zeros(2))
+
+    # The solver was handed over to lps[1].
+    self.assertIsNone(lps[0].warm_solver)
+    with self.assertRaises(ValueError):
+      lps[1].solve(warm_start=lps[0])
+
+  def testWarmStartDifferentStructure(self):
+    """Warm starting from a LP with different elements is rejected."""
+    lp = self.lp
+    lp.add_dispatchable_sources(GridSource(NG, 4.6e6, 0))
+    self.assertTrue(lp.solve())
+
+    other_lp = LinearProgramContainer(self.profiles)
+    other_lp.add_demands(GridDemand(DEMAND))
+    other_lp.add_dispatchable_sources(GridSource(NG, 4.6e6, 0))
+    other_lp.add_storage(GridStorage(STORAGE, 0))
+
+    with self.assertRaises(ValueError):
+      other_lp.solve(warm_start=lp)
+
+
+class SolveLimitsTest(TwoTimeSliceTest):
+  """Test time and iteration limits, progress and cancellation of solves."""
+
+  def setUp(self):
+    super(SolveLimitsTest, self).setUp()
+    self.lp.add_nondispatchable_sources(GridSource(WIND, 1.0e6, 0))
+    self.lp.add_dispatchable_sources(GridSource(NG, 4.6e6, 0))
+    self.lp.add_storage(GridStorage(STORAGE, 0))
+    self.lp.solver_type = pywraplp.Solver.GLOP_LINEAR_PROGRAMMING
+
+  def testIterationLimitKeepsBestSolution(self):
+    reports = []
+    self.assertFalse(self.lp.solve(iteration_limit=1, progress=reports.append,
+                                   progress_interval=1))
+    self.assertEqual(self.lp.status, pywraplp.Solver.FEASIBLE)
+    self.assertEqual(self.lp.stop_reason, 'iteration limit')
+    self.assertEqual(len(reports), 1)
+    self.assertEqual(reports[0]['iterations'], 1)
+    self.assertAlmostEqual(reports[0]['primal_infeasibility'], 0)
+    self.assertGreater(reports[0]['dual_infeasibility'], 0)
+    self.assertAlmostEqual(self.lp.solver.Objective().Value(),
+                           reports[0]['objective'])
+
+  def testProgressUntilOptimal(self):
+    reports = []
+    self.assertTrue(self.lp.solve(progress=reports.append, progress_interval=1))
+    self.assertIsNone(self.lp.stop_reason)
+    self.assertEqual(reports[-1]['status'], pywraplp.Solver.OPTIMAL)
+    self.assertAlmostEqual(reports[-1]['objective'], 2.0e6)
+    self.assertAlmostEqual(reports[-1]['dual_infeasibility'], 0)
+    self.assertAlmostEqual(self.lp.minimize_costs_objective.value(), 2.0e6)
+
+  def testCancel(self):
+    cancel = threading.Event()
+    cancel.set()
+    self.assertFalse(self.lp.solve(cancel=cancel))
+    self.assertEqual(self.lp.status, pywraplp.Solver.NOT_SOLVED)
+    self.assertEqual(self.lp.stop_reason, 'cancelled')
+
+  def testLimitsNeedGlop(self):
+    self.lp.solver_type = pywraplp.Solver.CLP_LINEAR_PROGRAMMING
+    with self.assertRaises(ValueError):
+      self.lp.solve(iteration_limit=1)
+    self.assertTrue(self.lp.solve(time_limit=60))
+    self.assertIsNone(self.lp.stop_reason)
+
+
+class ScalingTest(TwoTimeSliceTest):
+  """Test solving equilibrated copies of LPs."""
+
+  def setUp(self):
+    super(ScalingTest, self).setUp()
+    self.wind = GridSource(WIND, 1.0e6, 0)
+    self.ng = GridSource(NG, 4.6e6, 0)
+    self.storage = GridStorage(STORAGE, 0)
+    self.lp.add_nondispatchable_sources(self.wind)
+    self.lp.add_dispatchable_sources(self.ng)
+    self.lp.add_storage(self.storage)
+
+  def testScaledSolveMatchesUnscaled(self):
+    self.assertTrue(self.lp.solve())
+    cost = self.lp.minimize_costs_objective.value()
+    wind = self.wind.get_nameplate_solution_value()
+
+    self.assertTrue(self.lp.solve(scaling=True))
+    self.assertIsNotNone(self.lp.warm_scaling)
+    self.assertIsNot(self.lp.warm_solver, self.lp.solver)
+    self.assertAlmostEqual(self.lp.minimize_costs_objective.value(), cost)
+    self.assertAlmostEqual(self.wind.get_nameplate_solution_value(), wind)
+
+    # Warm starts keep the scaling.
+    self.storage.discharge_nameplate_cost = 3.0e6
+    self.assertTrue(self.lp.solve(warm_start=self.lp))
+    self.assertIsNotNone(self.lp.warm_scaling)
+    self.assertAlmostEqual(self.ng.get_nameplate_solution_value(), 1.0)
+    self.assertAlmostEqual(self.lp.minimize_costs_objective.value(), 4.6e6)
+
+  def testScaleFactors(self):
+    self.assertTrue(self.lp.solve())
+    model = linear_solver_pb2.MPModelProto()
+    self.lp.solver.ExportModelToProto(model)
+    row_scale, column_scale, objective_scale = gslp.model_scaling(model)
+
+    for scale in [row_scale, column_scale, np.array([objective_scale])]:
+      npt.assert_almost_equal(np.log2(scale), np.round(np.log2(scale)))
+
+    scaled = gslp.scale_model(model, (row_scale, column_scale,
+                                      objective_scale))
+    costs = np.abs([var.objective_coefficient for var in scaled.variable])
+    self.assertLessEqual(costs.max(), 2.0)
+    self.assertGreater(costs.max(), 0.5)
+
+    # Unscaling the solution of the scaled model recovers the original.
+    solution = linear_solver_pb2.MPSolutionResponse()
+    self.lp.solver.FillSolutionResponseProto(solution)
+    scaled_solution = linear_solver_pb2.MPSolutionResponse()
+    scaled_solution.CopyFrom(solution)
+    scaled_solution.objective_value *= objective_scale
+    scaled_solution.variable_value[:] = (np.array(solution.variable_value) /
+                                         column_scale)
+    unscaled = gslp.unscale_solution(
+        scaled_solution, (row_scale, column_scale, objective_scale))
+    npt.assert_almost_equal(np.array(unscaled.variable_value),
+                            np.array(solution.variable_value))
+    self.assertAlmostEqual(unscaled.objective_value, solution.objective_value)
+
+
+class ThreadedSolveTest(unittest.TestCase):
+  """Test building and solving containers concurrently from threads."""
+
+  def setUp(self):
+    hours = np.arange(96)
+    self.profiles = pd.DataFrame({
+        DEMAND: 2.0 + np.sin(2 * math.pi * hours / 24),
+        SOLAR: np.maximum(np.sin(2 * math.pi * (hours - 6) / 24), 0)})
+
+  def build_and_solve(self, carbon_tax):
+    lp = LinearProgramContainer(self.profiles)
+    lp.carbon_tax = carbon_tax
+    lp.add_demands(GridDemand(DEMAND))
+    sources = [GridSource(SOLAR, 1.0e6, 0),
+               GridSource(NG, 2.0e6, 1.0e5, co2_per_electrical_energy=0.5),
+               GridSource(NG2, 0.5e6, 3.0e5)]
+    lp.add_nondispatchable_sources(sources[0])
+    lp.add_dispatchable_sources(*sources[1:])
+    self.assertTrue(lp.solve())
+    return ([s.get_nameplate_solution_value() for s in sources],
+            lp.minimize_costs_objective.value())
+
+  def testSameAsSequential(self):
+    carbon_taxes = [0, 1.0e5, 2.0e5, 4.0e5, 8.0e5, 1.6e6]
+    sequential = [self.build_and_solve(tax) for tax in carbon_taxes]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+      threaded = list(executor.map(self.build_and_solve, carbon_taxes))
+
+    for (nameplates, cost), (threaded_nameplates, threaded_cost) in zip(
+        sequential, threaded):
+      npt.assert_almost_equal(threaded_nameplates, nameplates)
+      self.assertAlmostEqual(threaded_cost, cost, places=3)
+    # The tax shifts capacity, so each thread solved its own container.
+    self.assertNotAlmostEqual(sequential[0][1], sequential[-1][1])
+
+
+class MemoryEstimateTest(unittest.TestCase):
+  """Test estimating the size of the LP before building it."""
+
+  def setUp(self):
+    hours = np.arange(48)
+    self.profiles = pd.DataFrame({
+        DEMAND: 2.0 + np.sin(2 * math.pi * hours / 24),
+        DEMAND2: 1.5 + np.cos(2 * math.pi * hours / 24),
+        WIND: 1.0 + 0.5 * np.cos(2 * math.pi * hours / 37)})
+
+  def build(self, rps_percent=0):
+    lp = LinearProgramContainer(self.profiles)
+    lp.rps_percent = rps_percent
+    lp.add_demands(GridDemand(DEMAND, 0), GridDemand(DEMAND2, 1))
+    lp.add_nondispatchable_sources(
+        GridSource(WIND, 2.0e6, 0, grid_region_id=1, is_rps_source=True,
+                   max_energy=1.0e3))
+    lp.add_dispatchable_sources(
+        GridSource(NG, 1.0e6, 1.0e5, max_power=5.0),
+        GridSource(NG2, 1.0e6, 1.0e5, grid_region_id=1))
+    lp.add_storage(GridStorage(STORAGE, 1.0e3, max_storage=10.0),
+                   GridRecStorage('REC_STORAGE', 1.0e3, grid_region_id=1,
+                                  max_charge_power=2.0))
+    lp.add_transmissions(GridTransmission('LINE', 1.0e5, 0, 1, max_power=5.0))
+    return lp
+
+  def testMatchesSolver(self):
+    for rps_percent in [0, 20]:
+      lp = self.build(rps_percent)
+      estimate = lp.estimate_size()
+      self.assertTrue(lp.solve())
+
+      model = linear_solver_pb2.MPModelProto()
+      lp.solver.ExportModelToProto(model)
+      self.assertEqual(estimate['variables'], lp.solver.NumVariables())
+      self.assertEqual(estimate['rows'], lp.solver.NumConstraints())
+      self.assertEqual(estimate['nonzeros'],
+                       sum(len(c.var_index) for c in model.constraint))
+      self.assertGreater(estimate['memory_mb'], 0)
+      self.assertEqual(lp.memory_estimate, estimate)
+
+  def testRefuse(self):
+    lp = self.build()
+    lp.memory_budget_mb = lp.estimate_size()['memory_mb'] / 2
+    with self.assertRaises(gslp.ModelTooLargeError):
+      lp.solve()
+    # Nothing was built.
+    self.assertIsNone(lp.solver)
+
+  def testWarn(self):
+    lp = self.build()
+    lp.memory_budget_mb = lp.estimate_size()['memory_mb'] / 2
+    lp.memory_policy = 'warn'
+    with self.assertLogs(level='WARNING'):
+      self.assertTrue(lp.solve())
+
+  def testUnknownPolicy(self):
+    lp = self.build()
+    lp.memory_policy = 'reduce'
+    with self.assertRaises(ValueError):
+      lp.solve()
+
+
 class StorageStepTest(unittest.TestCase):
 
   def setUp(self):
@@ -1132,8 +1527,8 @@ class RpsTest(TwoTimeSliceTest):
     lp.add_dispatchable_sources(ng)
     lp.add_storage(storage)
 
-    demand_at_0 = self.profiles[DEMAND][0]
-    demand_at_1 = self.profiles[DEMAND][1]
+    demand_at_0 = self.profiles[DEMAND].iloc[0]
+    demand_at_1 = self.profiles[DEMAND].iloc[1]
 
     total = sum(self.profiles[DEMAND])
     for rps in range(0, 120, 10):
@@ -1173,6 +1568,66 @@ class RpsTest(TwoTimeSliceTest):
         # Verify no convergence because we asked for a ridiculous rps number.
         self.assertTrue(rps > 100)
 
+  def testNoRpsMachineryWithoutRps(self):
+    """Without an rps the model is smaller and solves the same."""
+
+    lp = self.lp
+    solar = GridSource(SOLAR, 0, 0, is_rps_source=True)
+    ng = GridSource(NG, 0, 1.0e6)
+    storage = GridRecStorage(STORAGE, 1, 1, 1)
+
+    lp.add_nondispatchable_sources(solar)
+    lp.add_dispatchable_sources(ng)
+    lp.add_storage(storage)
+
+    # Free solar makes half of demand clean, so a 10% rps doesn't bind.
+    sizes = {}
+    solutions = {}
+    for rps in [0, 10]:
+      lp.rps_percent = rps
+      self.assertTrue(lp.solve())
+      sizes[rps] = (lp.solver.NumVariables(), lp.solver.NumConstraints())
+      solutions[rps] = (lp.solver.Objective().Value(),
+                        solar.get_solution_values(),
+                        ng.get_solution_values(),
+                        storage.get_solution_values())
+
+      if rps == 0:
+        self.assertFalse(lp.rps_credit_variables)
+        self.assertFalse(lp.rps_source_constraints)
+        self.assertIsNone(storage.rec_storage)
+        npt.assert_almost_equal(lp.rps_credit_values[0], np.zeros(2))
+
+    self.assertLess(sizes[0][0], sizes[10][0])
+    self.assertLess(sizes[0][1], sizes[10][1])
+    for no_rps_value, rps_value in zip(solutions[0], solutions[10]):
+      npt.assert_almost_equal(no_rps_value, rps_value)
+
+  def testTransmissionRps(self):
+    """Clean power transmitted from another region counts toward rps."""
+
+    profiles = self.profiles.assign(DEMAND_B=np.zeros(2))
+    lp = LinearProgramContainer(profiles)
+    lp.add_demands(GridDemand(DEMAND), GridDemand('DEMAND_B', 1))
+
+    solar = GridSource(SOLAR, 0, 0, grid_region_id=1, is_rps_source=True)
+    ng = GridSource(NG, 0, 1.0e6)
+    transmission = GridTransmission('TRANSMISSION', 1, 0, 1)
+
+    lp.add_nondispatchable_sources(solar)
+    lp.add_dispatchable_sources(ng)
+    lp.add_transmissions(transmission)
+
+    for rps in [0, 50]:
+      lp.rps_percent = rps
+      self.assertTrue(lp.solve())
+
+      npt.assert_almost_equal(ng.get_solution_values(), np.array([1.0, 0.0]))
+      self.assertAlmostEqual(transmission.get_nameplate_solution_value(), 1.0)
+      self.assertEqual(transmission.rec_a_to_b is None, rps == 0)
+      self.assertGreaterEqual(sum(lp.rps_credit_values[0]),
+                              lp.rps_demand - 1e-6)
+
 
 class FourTimeSliceRpsTest(unittest.TestCase):
 
@@ -1216,16 +1671,19 @@ class FourTimeSliceRpsTest(unittest.TestCase):
                               self.profiles[WIND] *
                               (100 - rps) / storage.discharge_efficiency)
 
-      rps_credit = np.array([v.solution_value()
-                             for v in lp.rps_credit_variables[0]])
+      rps_credit = lp.rps_credit_values[0]
       self.assertAlmostEqual(sum(rps_credit), rps)
 
       rec_storage = storage.rec_storage
       no_rec_storage = storage.no_rec_storage
 
-      npt.assert_almost_equal(rps_credit,
-                              rec_storage.source.get_solution_values() *
-                              storage.discharge_efficiency)
+      # Without an rps there is no clean energy to store apart.
+      if rps == 0:
+        self.assertIsNone(rec_storage)
+      else:
+        npt.assert_almost_equal(rps_credit,
+                                rec_storage.source.get_solution_values() *
+                                storage.discharge_efficiency)
 
       npt.assert_almost_equal(self.profiles[DEMAND] - rps_credit,
                               no_rec_storage.source.get_solution_values() *
@@ -0,0 +1,57 @@
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+import harboropt_results
+
+#Cost vs emissions tradeoff of a harboropt LinearProgram by the epsilon-constraint method.
+#
+#Instead of re-solving cold at many carbon prices, emissions_frontier() adds one emissions cap constraint to the model (see LinearProgram.add_emissions_cap) and walks the cap down from the unconstrained emissions.
+#Every point only changes the cap's bound, so each solve starts from the optimal basis of the previous point.
+#The shadow price of the cap at each point is the implied abatement cost: the extra cost of the last ton avoided.
+#To get the frontier of pure costs rather than costs plus monetized damages, build the model with the price of the capped pollutant set to 0, ex.
+#
+#   lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(carbon_cost_per_ton = 0)
+#   frontier = harboropt_frontier.emissions_frontier(lp, points = 10, emissions = 'CO2')
+
+
+def emissions_frontier(lp, points = 10, emissions = 'CO2', min_fraction = 0, **solve_options):
+
+    #Solve lp at points emissions caps evenly spaced from its unconstrained annual emissions down to min_fraction of them. solve_options are passed to LinearProgram.solve (ex. time_limit).
+    #Emissions are the annual emissions of the last build year, in tons of a pollutant ('CO2', 'PM2.5', 'NOX', 'SO2', 'PM10') or $ of damages ('monetized').
+    #The walk stops at the first cap that cannot be met, since lower caps cannot be met either.
+    #Returns a table with one row per point:
+    # 'cap', 'emissions': cap and annual emissions of the solution.
+    # 'cost': objective value ($).
+    # 'status': pywraplp status of the solve.
+    # 'shadow_price': change of the objective per unit of cap ($ per ton, <= 0).
+    # 'abatement_cost_per_ton': implied cost of avoiding one more ton every year, the shadow price per year of the timespan ($ per ton-year).
+    # One column per resource and storage resource with its capacity built over all build years (MW).
+    cap_constraint = lp.add_emissions_cap(emissions)
+
+    rows = []
+    cap = np.inf
+    for point in range(points):
+        status = lp.solve(**solve_options)
+        row = {'cap': cap, 'status': status}
+        if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
+            rows.append(row)
+            break
+
+        row['emissions'] = lp.annual_emissions(emissions)
+        row['cost'] = lp.solver.Objective().Value()
+        row['shadow_price'] = cap_constraint.dual_value()
+        row['abatement_cost_per_ton'] = -row['shadow_price'] / lp.discounting_factor[-1]
+        record = harboropt_results.results_record(lp)
+        for names, capacity in [(record['resources'], record['capacity']), (record['storage_resources'], record['storage_capacity'])]:
+            row.update(zip(names, capacity.sum(axis = 1)))
+        rows.append(row)
+
+        if point == 0:
+            caps = row['emissions'] * np.linspace(1, min_fraction, points)
+        if point + 1 < points:
+            cap = caps[point + 1]
+            cap_constraint.SetUb(cap)
+
+    return pd.DataFrame(rows)
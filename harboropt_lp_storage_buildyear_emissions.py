@@ -1,11 +1,42 @@
+import collections.abc
+import os
+import threading
+import time
+
 import numpy as np # numerical library
-import matplotlib.pyplot as plt # plotting library
-import datetime as dt
 import pandas as pd
 
+from ortools.linear_solver import linear_solver_pb2
 from ortools.linear_solver import pywraplp
 
-import utils
+#LP solver backends that can be chosen with LinearProgram(solver_backend = ...).
+SOLVER_BACKENDS = {'GLOP': pywraplp.Solver.GLOP_LINEAR_PROGRAMMING,
+                   'CLP': pywraplp.Solver.CLP_LINEAR_PROGRAMMING}
+
+#Input csv files shipped next to this module, read by default whatever the current working directory is.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+#Parameters of LinearProgram that only change objective coefficients and demand bounds, so a built model can be updated in place (see LinearProgram.update_parameters) instead of built again.
+UPDATABLE_PARAMETERS = ['gas_fuel_cost', 'discount_rate', 'cost', 'timespan', 'transmission_cost_per_mwh', 'storage_resilience_incentive_per_kwh',
+                        'carbon_cost_per_ton', 'pm25_cost_per_ton', 'nox_cost_per_ton', 'so2_cost_per_ton', 'pm10_cost_per_ton',
+                        'diesel_genset_carbon_per_mw', 'diesel_genset_pm25_per_mw', 'diesel_genset_nox_per_mw', 'diesel_genset_so2_per_mw', 'diesel_genset_pm10_per_mw',
+                        'diesel_genset_fixed_cost_per_mw_year', 'diesel_genset_mmbtu_per_mwh', 'diesel_genset_cost_per_mmbtu', 'diesel_genset_hours_per_year', 'demand_scale']
+
+#Attributes of LinearProgram holding solver variables ({resource: [variable per build year]}) and constraints (lists), stored as indices when it is pickled.
+_VARIABLE_ATTRIBUTES = ['capacity_vars', 'storage_capacity_vars', 'installed_vars', 'installed_storage_vars']
+_CONSTRAINT_ATTRIBUTES = ['fulfill_demand_constraints', 'hydro_energy_constraints']
+
+#Approximate peak memory (bytes) of building and solving a LinearProgram with GLOP per variable, row and matrix nonzero, used by estimate_model_size.
+#Fitted to the peak resident memory of models of the bundled data with 1 to 3 build years on 1 to 24 hour timesteps (within 5%, ex. 360 MB for the hourly year, of which the build takes 130 MB). GLOP's own copy of the model dominates, so rows and columns cost more than nonzeros.
+MEMORY_BYTES = {'variable': 880, 'row': 880, 'nonzero': 40}
+
+#What LinearProgram does when the estimated memory of the model exceeds memory_budget_mb.
+MEMORY_POLICIES = ['refuse', 'warn', 'reduce']
+
+#Timestep lengths (hours) tried by memory_policy = 'reduce', finest first.
+REDUCED_TIMESTEP_HOURS = [2, 3, 4, 6, 8, 12, 24, 48, 168]
+
+#Plotting helpers live in harboropt_plotting, which is only imported where plots are made, so that sweep workers do not pay for importing matplotlib.
 
 ##### TO-DO: 
 ##### 1. Incorporate paired resilient solar+storage systems based on REopt apartment building discussion.
@@ -15,10 +46,111 @@ import utils
 ##### 5. Incorporate timespan of storage and apply discount factor to replacement capacity costs (ie. every 15 years). 
 ##### 6. Split up results functions into specific functions (ex. total_gen, storage_net_source, gen_fractions, curtailment).
         
+def read_weather_profiles(data_dir, weather_years):
+    
+    #Stack the profile tables of weather_years ({profile csv in data_dir: weight}) into one table with a fresh hourly index.
+    #Returns the table, the weight of every hour (year weights normalized to sum to 1, so a single year has weight 1) and the first hour of every year.
+    total_weight = float(sum(weather_years.values()))
+    if total_weight <= 0 or min(weather_years.values()) < 0:
+        raise ValueError('weather_years weights must be >= 0 and sum to more than 0, got %s.' % weather_years)
+    
+    tables = [pd.read_csv(os.path.join(data_dir, name)) for name in weather_years]
+    profiles = pd.concat(tables, ignore_index = True)
+    hour_weights = np.concatenate([np.full(len(table), weight / total_weight) for table, weight in zip(tables, weather_years.values())])
+    starts = list(np.cumsum([0] + [len(table) for table in tables[:-1]]))
+    
+    return profiles, hour_weights, starts
+
+
+def _repeat_for_weather_years(table, starts, hours):
+    
+    #Repeat an hourly table (ex. grid emissions) for every stacked weather year. Every year must have as many hours as the table.
+    lengths = np.diff(list(starts) + [hours])
+    if (lengths != len(table)).any():
+        raise ValueError('Every weather year needs %d hours to match the hourly emissions, got %s.' % (len(table), list(lengths)))
+    
+    return pd.concat([table] * len(starts), ignore_index = True)
+
+
+def timestep_index(timesteps, hours, starts):
+    
+    #Timestep of every hour, for timesteps (timestep lengths in hours, in order) covering all hours stacked hours of the weather years starting at starts.
+    #A timestep cannot span two weather years.
+    lengths = np.asarray(timesteps)
+    if len(lengths) == 0 or (lengths < 1).any() or (lengths != np.round(lengths)).any() or lengths.sum() != hours:
+        raise ValueError('timesteps must be whole numbers of hours >= 1 summing to the %d hours of the profiles, got %d timesteps summing to %s.' % (hours, len(lengths), lengths.sum()))
+    lengths = lengths.astype(int)
+    timestep_starts = np.cumsum(lengths) - lengths
+    if not np.isin(starts, timestep_starts).all():
+        raise ValueError('timesteps cannot span two weather years, which start at hours %s.' % list(starts))
+    
+    return np.repeat(np.arange(len(lengths)), lengths)
+
+
+def coarse_timesteps(weather_year_lengths, hours_per_timestep = 24):
+
+    #Timesteps of hours_per_timestep hours covering weather years of weather_year_lengths hours each. The last timestep of a year is shorter if the year does not divide evenly.
+    timesteps = []
+    for length in weather_year_lengths:
+        timesteps += [hours_per_timestep] * (length // hours_per_timestep)
+        if length % hours_per_timestep:
+            timesteps.append(length % hours_per_timestep)
+
+    return timesteps
+
+
+def estimate_model_size(hours, build_years, dispatchable, nondispatchable, storage, weather_years = 1, installed_capacity_vars = False, hydropower = True):
+
+    #Size of a LinearProgram from its dimensions alone, so it can be checked before anything is allocated (see memory_budget_mb):
+    #hours is the number of timesteps of all weather years, dispatchable, nondispatchable and storage the number of resources of each kind, and hydropower whether HYDROPOWER is one of the dispatchable resources.
+    #Returns {'variables', 'rows', 'nonzeros', 'memory_mb'}, where nonzeros counts every matrix coefficient set (including the zeros of nondispatchable profiles, which the solver drops)
+    #and memory_mb is the approximate peak resident memory of building and solving the model with GLOP, on top of the profiles read from data_dir (see MEMORY_BYTES).
+    years = np.arange(build_years)
+    #Capacity variables every hourly row references per resource in each build year: every build year up to it, or the single installed capacity variable.
+    through_year = np.ones(build_years) if installed_capacity_vars else years + 1.
+
+    variables = (dispatchable + nondispatchable + storage) * build_years + build_years * hours * (3 * storage + dispatchable)
+    #Per hour: fulfill demand and hydro power limit, max charge, max discharge (except the first hour of later build years), state of charge and max state of charge of every storage resource, and max generation of every dispatchable resource.
+    #Per weather year: hydro energy limit in every build year, and the ending state of charge of every storage resource in the last build year.
+    rows = build_years * hours * (2 + 4 * storage + dispatchable) - storage * (build_years - 1) + weather_years * (build_years + storage)
+    nonzeros = (hours * (dispatchable + storage + nondispatchable * through_year + 2 * hydropower + storage * 3 * (through_year + 1) + 4 * storage + dispatchable * (through_year + 1))).sum()
+    nonzeros -= storage * (weather_years * build_years + (through_year[1:] + 1).sum()) - storage * weather_years
+    if installed_capacity_vars:
+        variables += (dispatchable + nondispatchable + storage) * build_years
+        rows += (dispatchable + nondispatchable + storage) * build_years
+        nonzeros += (dispatchable + nondispatchable + storage) * (3 * build_years - 1)
+
+    memory_mb = (MEMORY_BYTES['variable'] * variables + MEMORY_BYTES['row'] * rows + MEMORY_BYTES['nonzero'] * nonzeros) / 2**20
+
+    return {'variables': int(variables), 'rows': int(rows), 'nonzeros': int(nonzeros), 'memory_mb': float(memory_mb)}
+
+
+class _ResourceVariables(collections.abc.Mapping):
+
+    #Read-only {resource: list of solver variables} view of an index array (resource x build year x hour).
+    #Only the columns of the resource looked up are resolved, once per view, so a lookup costs the resource's own columns rather than a proxy for every column of the model.
+    def __init__(self, solver, resources, index):
+        self._solver = solver
+        self._positions = {resource: r for r, resource in enumerate(resources)}
+        self._index = index
+        self._variables = {}
+
+    def __getitem__(self, resource):
+        if resource not in self._variables:
+            self._variables[resource] = [self._solver.variable(int(i)) for i in self._index[self._positions[resource]].ravel()]
+        return self._variables[resource]
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
 class LinearProgram(object):
     
     def __init__(self, initial_state_of_charge = 0, storage_life = 15, timespan = 30,
-                 gas_fuel_cost=8, discount_rate = 0.06, cost=1, build_years = 1, transmission_cost_per_mwh = 2, storage_resilience_incentive_per_kwh = 1000, resilient_storage_grid_fraction = 0.7, carbon_cost_per_ton = 50, pm25_cost_per_ton = 100000, nox_cost_per_ton = 10000, so2_cost_per_ton = 20000, pm10_cost_per_ton = 50000, diesel_genset_carbon_per_mw = 2, diesel_genset_pm25_per_mw = 2, diesel_genset_nox_per_mw = 2, diesel_genset_so2_per_mw = 2, diesel_genset_pm10_per_mw = 2, diesel_genset_fixed_cost_per_mw_year = 35000, diesel_genset_mmbtu_per_mwh = 4, diesel_genset_cost_per_mmbtu = 20, diesel_genset_hours_per_year = 24):
+                 gas_fuel_cost=8, discount_rate = 0.06, cost=1, build_years = 1, transmission_cost_per_mwh = 2, storage_resilience_incentive_per_kwh = 1000, resilient_storage_grid_fraction = 0.7, carbon_cost_per_ton = 50, pm25_cost_per_ton = 100000, nox_cost_per_ton = 10000, so2_cost_per_ton = 20000, pm10_cost_per_ton = 50000, diesel_genset_carbon_per_mw = 2, diesel_genset_pm25_per_mw = 2, diesel_genset_nox_per_mw = 2, diesel_genset_so2_per_mw = 2, diesel_genset_pm10_per_mw = 2, diesel_genset_fixed_cost_per_mw_year = 35000, diesel_genset_mmbtu_per_mwh = 4, diesel_genset_cost_per_mmbtu = 20, diesel_genset_hours_per_year = 24, installed_capacity_vars = False, data_dir = DATA_DIR, solver_backend = 'GLOP', prune_dominated_resources = False, weather_years = None, demand_scale = None, capacity_factor_scale = None, grid_emissions_scale = None, timesteps = None, memory_budget_mb = None, memory_policy = 'refuse'):
         
         self.initial_state_of_charge = initial_state_of_charge
         self.timespan = timespan
@@ -53,82 +185,206 @@ class LinearProgram(object):
         
         self.gas_fuel_cost = gas_fuel_cost
         self.cost = cost
+        
+        #Directory holding the input csv files, so the model can be run from any working directory.
+        #A relative data_dir is resolved once here, so files read later (ex. by gen_results) do not depend on the working directory either.
+        self.data_dir = os.path.abspath(data_dir)
+        
+        if solver_backend not in SOLVER_BACKENDS:
+            raise ValueError('solver_backend must be one of %s, got %r.' % (sorted(SOLVER_BACKENDS), solver_backend))
+        self.solver_backend = solver_backend
         self.solver = pywraplp.Solver('HarborOptimization',
-                         pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+                         SOLVER_BACKENDS[solver_backend])
 
         self.resources = self._setup_resources()
-        self.capacity_vars = self._initialize_capacity_by_resource(build_years)
-        
         self.storage = self._setup_storage()
-        self.storage_capacity_vars = self._initialize_storage_capacity_vars(build_years)
-
-        self.disp = self.resources.loc[self.resources['dispatchable'] == 'y']
-        self.nondisp = self.resources.loc[self.resources['dispatchable'] == 'n']
         
         self.wholegrid_emissions = self._setup_wholegrid_emissions()
         self.outofbasin_emissions = self._setup_outofbasin_emissions()
         
         self.discounting_factor = self.discount_factor_from_cost(self.cost, self.discount_rate, self.build_years)
         
+        #Read in demand and nondispatchable resource profiles.
+        #weather_years ({profile csv in data_dir: weight}, default {'doscoe_profiles.csv': 1}) sizes capacity against several weighted weather or demand years at once.
+        #Their profiles are stacked into one table, so every year gets its own block of hourly dispatch variables and constraints sharing the same capacity variables, and hourly costs are weighted by hour_weights.
+        #To keep the model size independent of the number of years, see harboropt_weather.solve_weather_years.
+        if weather_years is None:
+            weather_years = {'doscoe_profiles.csv': 1}
+        self.weather_years = dict(weather_years)
+        self.profiles, self.hour_weights, self.weather_year_starts = read_weather_profiles(self.data_dir, self.weather_years)
+        if len(self.weather_years) > 1:
+            self.wholegrid_emissions = _repeat_for_weather_years(self.wholegrid_emissions, self.weather_year_starts, len(self.profiles))
+            self.outofbasin_emissions = _repeat_for_weather_years(self.outofbasin_emissions, self.weather_year_starts, len(self.profiles))
+        
+        #Nondispatchable profiles are normalized by their hourly peak, kept here since timesteps average the profiles.
+        self.profile_max = self.profiles.max()
         
-         #Create a dictionary to hold a list for each dispatchable resource that keeps track of its hourly generation variables.
-        self.disp_gen = {}
-        for resource in self.disp.index:
-            self.disp_gen[resource] = []
-            
-        #Create a dictionary to hold a list for each storage resource that keeps track of its hourly charge variables.
-        self.storage_charge_vars = {}
-        for resource in self.storage.index:
-            self.storage_charge_vars[resource] = []
-            
-        #Create a dictionary to hold a list for each storage resource that keeps track of its hourly discharge variables.
-        self.storage_discharge_vars = {}
-        for resource in self.storage.index:
-            self.storage_discharge_vars[resource] = []
+        #timesteps (list of timestep lengths in hours, in order, covering the stacked hours of every weather year; default every hour) builds the model on coarser timesteps, ex. [24] * 365 for daily ones, or a mix of days and hours (see harboropt_resolution).
+        #Every timestep gets the average demand, profiles and emissions of its hours and one set of dispatch variables and constraints, in MW. Energy (state of charge, hydro energy) counts every timestep for its length.
+        #profiles, the emissions tables and weather_year_starts then hold one row per timestep, and hour_weights the weight of the timestep (weight of its weather year times its length), so annual sums such as solution values @ hour_weights are unchanged.
+        #timestep_hours is the length of every row.
+        self.timestep_hours = np.ones(len(self.profiles))
+        if timesteps is not None:
+            self._aggregate_timesteps(timesteps)
+        
+        #Per build year scaling of the single set of hourly base profiles, applied while the model is assembled so multi-year studies need no multi-year input files:
+        # demand_scale: list of DEMAND multipliers per build year (ex. load growth [1, 1.02, 1.04]).
+        # capacity_factor_scale: {resource: list of multipliers per build year} of the hourly output of every MW of the resource (ex. solar degradation, or derating of dispatchable resources).
+        # grid_emissions_scale: list of multipliers per build year of the hourly whole grid and out of basin emissions (ex. a cleaner grid over time).
+        #Each defaults to 1 in every year.
+        self.demand_scale = self._year_scale(demand_scale, 'demand_scale')
+        self.capacity_factor_scale = {resource: self._year_scale(scale, 'capacity_factor_scale[%r]' % resource) for resource, scale in (capacity_factor_scale or {}).items()}
+        unknown = set(self.capacity_factor_scale) - set(self.resources.index)
+        if unknown:
+            raise ValueError('capacity_factor_scale has unknown resources %s.' % sorted(unknown))
+        self.grid_emissions_scale = self._year_scale(grid_emissions_scale, 'grid_emissions_scale')
+        
+        #With prune_dominated_resources, drop resources and storage that are never cheaper than another option at any capacity factor, hour or build year before any of their variables are created (see _dominated_resources).
+        #The optimal objective is unchanged. dominated_resources maps each dropped resource to the resource that dominates it.
+        self.dominated_resources = {}
+        if prune_dominated_resources:
+            self.dominated_resources = self._dominated_resources()
+            self.resources = self.resources.drop([r for r in self.dominated_resources if r in self.resources.index])
+            self.storage = self.storage.drop([r for r in self.dominated_resources if r in self.storage.index])
+        
+        #With installed_capacity_vars, add an "installed capacity in year y" variable per resource, linked to the build year capacity variables by one recursion row per year.
+        #Hourly rows then reference one installed capacity column instead of every build year up to that year, which cuts matrix nonzeros in multi-year models (the optimum is the same).
+        self.installed_capacity_vars = installed_capacity_vars
+        
+        #memory_budget_mb (default None, no limit) caps the estimated peak memory of building and solving the model (see estimate_model_size), checked before any variable is created.
+        #Over the budget, memory_policy 'refuse' raises MemoryError, 'warn' prints a warning and builds the model anyway,
+        #and 'reduce' builds an hourly model on the finest timesteps of REDUCED_TIMESTEP_HOURS that fit the budget instead (see timesteps), raising MemoryError if none do.
+        #memory_estimate is the estimate of the model that is built.
+        if memory_policy not in MEMORY_POLICIES:
+            raise ValueError('memory_policy must be one of %s, got %r.' % (MEMORY_POLICIES, memory_policy))
+        self.memory_estimate = self.estimate_size()
+        if memory_budget_mb is not None and self.memory_estimate['memory_mb'] > memory_budget_mb:
+            self._apply_memory_policy(memory_budget_mb, memory_policy, timesteps)
+        
+        self.capacity_vars = self._initialize_capacity_by_resource(build_years)
+        self.storage_capacity_vars = self._initialize_storage_capacity_vars(build_years)
+        
+        if installed_capacity_vars:
+            self.installed_vars = self._initialize_installed_capacity_vars(self.capacity_vars)
+            self.installed_storage_vars = self._initialize_installed_capacity_vars(self.storage_capacity_vars)
+
+        self.disp = self.resources.loc[self.resources['dispatchable'] == 'y']
+        self.nondisp = self.resources.loc[self.resources['dispatchable'] == 'n']
+        
+        #Keep track of the solver column index of every hourly variable in arrays of (resource x build year x hour), with resources in the order of self.disp.index and self.storage.index.
+        #Only integer indices are kept rather than one Python variable object per resource-hour-year. Use solution_values() to gather results, or the disp_gen, storage_charge_vars, storage_discharge_vars and storage_state_of_charge_vars properties to resolve the variables themselves.
+        hours = len(self.profiles)
+        self.disp_gen_index = np.full((len(self.disp.index), build_years, hours), -1, dtype = np.int32)
+        self.storage_charge_index = np.full((len(self.storage.index), build_years, hours), -1, dtype = np.int32)
+        self.storage_discharge_index = np.full((len(self.storage.index), build_years, hours), -1, dtype = np.int32)
+        self.storage_state_of_charge_index = np.full((len(self.storage.index), build_years, hours), -1, dtype = np.int32)
             
-        #Create a dictionary to hold a list for each storage resource that keeps track of its hourly state of charge variables.
-        self.storage_state_of_charge_vars = {}
-        for resource in self.storage.index:
-            self.storage_state_of_charge_vars[resource] = []
+        #Keep track of the hourly fulfill demand constraints and the yearly hydro energy constraints to report their shadow prices.
+        self.fulfill_demand_constraints = []
+        self.hydro_energy_constraints = []
         
+        #Keep track of the row indices of the hourly limit constraints (max charge, discharge, state of charge and generation, and the hydro power limit) and their hours, to find the timesteps where capacity binds (see harboropt_resolution).
+        self.hourly_limit_rows = []
+        self.hourly_limit_hours = []
         
         self.objective = self._add_constraints_and_costs() 
         
+        #Solver holding the simplex state of the last solve, used to warm start neighboring sweep points.
+        self.warm_solver = None
+        
+        #Result status of the last solve (ex. pywraplp.Solver.OPTIMAL), None until solve() is called.
+        self.status = None
+        #Why the last solve stopped early ('time limit', 'iteration limit' or 'cancelled'), None if it finished.
+        self.stop_reason = None
+        #Scaling (see model_scaling) of the model held by warm_solver, None if it is not scaled.
+        self.warm_scaling = None
+        
              
         
+    def _aggregate_timesteps(self, timesteps):
+        
+        #Average the hourly profiles and emissions over timesteps (see timesteps in __init__).
+        index = timestep_index(timesteps, len(self.profiles), self.weather_year_starts)
+        self.timestep_hours = np.bincount(index).astype(float)
+        self.profiles = self.profiles.groupby(index).mean()
+        self.wholegrid_emissions = self.wholegrid_emissions.groupby(index).mean()
+        self.outofbasin_emissions = self.outofbasin_emissions.groupby(index).mean()
+        self.hour_weights = np.bincount(index, weights = self.hour_weights)
+        self.weather_year_starts = [int(index[start]) for start in self.weather_year_starts]
+    
+    def estimate_size(self, timesteps = None):
+        
+        #estimate_model_size of the model, or of the model on a number of timesteps.
+        dispatchable = self.resources['dispatchable'] == 'y'
+        return estimate_model_size(len(self.profiles) if timesteps is None else timesteps, self.build_years, int(dispatchable.sum()), int((self.resources['dispatchable'] == 'n').sum()), len(self.storage),
+                                   len(self.weather_year_starts), self.installed_capacity_vars, 'HYDROPOWER' in self.resources.index[dispatchable])
+    
+    def _apply_memory_policy(self, memory_budget_mb, memory_policy, timesteps):
+        
+        #Refuse, warn about or reduce a model whose memory_estimate is over memory_budget_mb (see memory_policy in __init__).
+        estimate = self.memory_estimate
+        message = 'The model needs about %.0f MB (%d variables, %d rows, %d nonzeros), over the memory budget of %.0f MB.' % (estimate['memory_mb'], estimate['variables'], estimate['rows'], estimate['nonzeros'], memory_budget_mb)
+        if memory_policy == 'warn':
+            print('Warning: ' + message)
+            return
+        
+        if memory_policy == 'reduce' and timesteps is None:
+            lengths = np.diff(self.weather_year_starts + [len(self.profiles)])
+            for hours_per_timestep in REDUCED_TIMESTEP_HOURS:
+                reduced = coarse_timesteps(lengths, hours_per_timestep)
+                reduced_estimate = self.estimate_size(len(reduced))
+                if reduced_estimate['memory_mb'] <= memory_budget_mb:
+                    print('%s Building it on %d hour timesteps instead (about %.0f MB).' % (message, hours_per_timestep, reduced_estimate['memory_mb']))
+                    self._aggregate_timesteps(reduced)
+                    self.memory_estimate = reduced_estimate
+                    return
+        
+        raise MemoryError(message + ' Use coarser timesteps, fewer build years or fewer weather years (see harboropt_weather.solve_weather_years), or raise memory_budget_mb.')
+    
     def _add_constraints_and_costs(self):
         
         #Initialize objective function.
         objective = self.solver.Objective()
         
-        #Read in demand and nondispatchable resource profiles.
-        profiles = pd.read_csv('data/doscoe_profiles.csv')
+        profiles = self.profiles
+        timestep_hours = self.timestep_hours
+        
+        weather_year_starts = set(self.weather_year_starts)
+        weather_year_ends = set(start - 1 for start in self.weather_year_starts[1:]) | {len(profiles) - 1}
+        
+        #Hourly base arrays, computed once and scaled for every build year.
+        demand = profiles['DEMAND'].values
+        normalized_profiles = {resource: (profiles[resource] / self.profile_max[resource]).values for resource in self.nondisp.index}
         
         for year in range(self.build_years):
-
-            #Initialize hydro energy limit constraint: hydro resources cannot exceed the following energy supply limit in each year.
-            hydro_energy_limit = self.solver.Constraint(0, 13808000)
+            
+            capacity_factor_scale = {resource: self.capacity_factor_scale[resource][year] if resource in self.capacity_factor_scale else 1 for resource in self.resources.index}
 
             # Loop through every hour in demand, creating:
             # 1) hourly gen variables for each disp resource 
             # 2) hourly constraints
-            # 3) adding variable cost coefficients to each hourly generation variable.
+            #Costs are added to the objective by _set_costs once the model is built.
             for ind in profiles.index:
 
+                #Initialize hydro energy limit constraint: hydro resources cannot exceed the following energy supply limit in each year (and each weather year).
+                if ind in weather_year_starts:
+                    hydro_energy_limit = self.solver.Constraint(0, 13808000)
+                    self.hydro_energy_constraints.append(hydro_energy_limit)
+
                 #Initialize fulfill demand constraint: summed generation from all resources must be equal or greater to demand in all hours.
                 #Constraint only applies in the last year of build.
                 if year == (self.build_years-1):
-                    fulfill_demand = self.solver.Constraint(profiles.loc[ind,'DEMAND'], self.solver.infinity())
+                    fulfill_demand = self.solver.Constraint(demand[ind] * self.demand_scale[year], self.solver.infinity())
                 else:
                     fulfill_demand = self.solver.Constraint(0, self.solver.infinity())
+                self.fulfill_demand_constraints.append(fulfill_demand)
 
                 #Initialize hydro power limit constraint: hydro resources cannot exceed the following power supply limit in each hour.
                 hydro_power_limit = self.solver.Constraint(0, 9594.8)
-                
-                grid_monetized_emissions = self.wholegrid_emissions.loc[ind, 'CO2']*self.carbon_cost_per_ton + self.wholegrid_emissions.loc[ind, 'PM2.5']*self.pm25_cost_per_ton + self.wholegrid_emissions.loc[ind, 'NOX']*self.nox_cost_per_ton + self.wholegrid_emissions.loc[ind, 'SO2']*self.so2_cost_per_ton + self.wholegrid_emissions.loc[ind, 'PM10']*self.pm10_cost_per_ton
+                self._add_hourly_limit(hydro_power_limit, ind)
 
                 #Create hourly charge and discharge variables for each storage resource and store in respective dictionaries. 
-                for resource in self.storage.index:
+                for s, resource in enumerate(self.storage.index):
 
                     storage_duration = self.storage.loc[resource, 'storage_duration (hrs)']
                     efficiency = self.storage.loc[resource, 'efficiency']    
@@ -137,14 +393,10 @@ class LinearProgram(object):
                     charge= self.solver.NumVar(0, self.solver.infinity(), '_charge_year'+ str(year) + '_hour' + str(ind))
                     discharge= self.solver.NumVar(0, self.solver.infinity(), '_discharge_year'+ str(year) + '_hour' + str(ind))
 
-                    #Add variable cost of charging and monetized emissions to objective function.
-                    variable_cost = self.storage.loc[resource,'variable ($/MWh)'] + grid_monetized_emissions
-                    objective.SetCoefficient(charge, variable_cost)
-
                     #Limit hourly charge and discharge variables to storage max power (MW). 
                     #Sum storage capacity from previous and current build years to set max power.
                     max_charge= self.solver.Constraint(0, self.solver.infinity())
-                    storage_capacity_cumulative = self.storage_capacity_vars[resource][0:year+1]
+                    storage_capacity_cumulative = self._capacity_through_year(self.storage_capacity_vars, resource, year)
                     for i, var in enumerate(storage_capacity_cumulative):
                         if self.storage.loc[resource, 'resilient'] == 'y':
                             #For resilient storage, limit max charge to the fraction of capacity set aside for the grid.
@@ -152,6 +404,7 @@ class LinearProgram(object):
                         else: 
                             max_charge.SetCoefficient(var, 1)
                     max_charge.SetCoefficient(charge, -1)
+                    self._add_hourly_limit(max_charge, ind)
 
                     if year == 0 and ind == 0:
                         max_discharge= self.solver.Constraint(0, self.solver.infinity())
@@ -162,6 +415,7 @@ class LinearProgram(object):
                         else: 
                             max_discharge.SetCoefficient(var, 1)
                         max_discharge.SetCoefficient(discharge, -1)
+                        self._add_hourly_limit(max_discharge, ind)
                         
 #                     elif year > 0 and ind == 0:
 #                         max_discharge= self.solver.Constraint(0, self.solver.infinity())
@@ -172,7 +426,7 @@ class LinearProgram(object):
 
                     elif ind > 0:
                         max_discharge= self.solver.Constraint(0, self.solver.infinity())
-                        storage_capacity_cumulative = self.storage_capacity_vars[resource][0:year+1]
+                        storage_capacity_cumulative = self._capacity_through_year(self.storage_capacity_vars, resource, year)
                         for i, var in enumerate(storage_capacity_cumulative):
                             if self.storage.loc[resource, 'resilient'] == 'y':
                             #For resilient storage, limit max charge and discharge to the fraction of capacity set aside for the grid.
@@ -180,11 +434,12 @@ class LinearProgram(object):
                             else: 
                                 max_discharge.SetCoefficient(var, 1)
                         max_discharge.SetCoefficient(discharge, -1)
+                        self._add_hourly_limit(max_discharge, ind)
                     
                         
-                    #Keep track of hourly charge and discharge variables by appending to lists for each storage resource.
-                    self.storage_charge_vars[resource].append(charge)
-                    self.storage_discharge_vars[resource].append(discharge)
+                    #Keep track of the column indices of hourly charge and discharge variables for each storage resource.
+                    self.storage_charge_index[s, year, ind] = charge.index()
+                    self.storage_discharge_index[s, year, ind] = discharge.index()
 
                     #Hourly discharge variables of storage resources are incorporated into the fulfill demand constraint. If storage can only charge from portfolio resources, include the charge variable in this constraint.
                     fulfill_demand.SetCoefficient(discharge, efficiency)
@@ -194,33 +449,32 @@ class LinearProgram(object):
                     #Creates hourly state of charge variable, representing the state of charge at the end of each timestep. 
                     state_of_charge= self.solver.NumVar(0, self.solver.infinity(), 'state_of_charge_year'+ str(year) + '_hour' + str(ind))
 
-                    #Temporal coupling of storage state of charge.
-                    if ind > 0:
+                    #Temporal coupling of storage state of charge. Every weather year starts from the initial state of charge.
+                    #Charge and discharge are MW, so they change the state of charge by the length of the timestep (1 hour by default).
+                    if ind not in weather_year_starts:
                         state_of_charge_constraint= self.solver.Constraint(0, 0)
                         state_of_charge_constraint.SetCoefficient(state_of_charge, -1)
-                        state_of_charge_constraint.SetCoefficient(discharge, -1)
+                        state_of_charge_constraint.SetCoefficient(discharge, -timestep_hours[ind])
                         #To-Do: Should coefficient here be "efficiency" to represent lost power during charging?
-                        state_of_charge_constraint.SetCoefficient(charge, 1)
+                        state_of_charge_constraint.SetCoefficient(charge, timestep_hours[ind])
 
                         #Get the state of charge from previous timestep to include in the state_of_charge_constraint.
-                        previous_state = self.storage_state_of_charge_vars[resource][-1]
-                        if year == 3 and ind == 0:
-                            print('previous_state', previous_state)
+                        previous_state = self.solver.variable(int(self.storage_state_of_charge_index[s, year, ind-1]))
                         state_of_charge_constraint.SetCoefficient(previous_state, 1)
                         
                     else: 
                         state_of_charge_constraint= self.solver.Constraint(self.initial_state_of_charge, self.initial_state_of_charge)
                         state_of_charge_constraint.SetCoefficient(state_of_charge, 1)
-                        state_of_charge_constraint.SetCoefficient(discharge, 1)
+                        state_of_charge_constraint.SetCoefficient(discharge, timestep_hours[ind])
                         #To-Do: Should coefficient here be "efficiency" to represent lost power during charging?
-                        state_of_charge_constraint.SetCoefficient(charge, -1)
+                        state_of_charge_constraint.SetCoefficient(charge, -timestep_hours[ind])
 
-                    #Add hourly state of charge variable to corresponding list for each storage resource.
-                    self.storage_state_of_charge_vars[resource].append(state_of_charge)
+                    #Keep track of the column index of the hourly state of charge variable for each storage resource.
+                    self.storage_state_of_charge_index[s, year, ind] = state_of_charge.index()
 
                     #Creates constraint setting max state of charge to: storage capacity * storage duration.
                     max_storage= self.solver.Constraint(0, self.solver.infinity())
-                    storage_capacity_cumulative = self.storage_capacity_vars[resource][0:year+1]
+                    storage_capacity_cumulative = self._capacity_through_year(self.storage_capacity_vars, resource, year)
                     for i, var in enumerate(storage_capacity_cumulative):
                         if self.storage.loc[resource, 'resilient'] == 'y':
                             #For resilient storage, limit max storage to the fraction of capacity set aside for the grid * storage_duration.
@@ -228,42 +482,23 @@ class LinearProgram(object):
                         else: 
                             max_storage.SetCoefficient(var, storage_duration)
                     max_storage.SetCoefficient(state_of_charge, -1)
+                    self._add_hourly_limit(max_storage, ind)
 
                     #Creates constraint ensuring that no net energy is supplied by storage (ending state of charge is equal to initial state of charge).
                     #if harborgen.index.get_loc(ind) == len(harborgen)-1:
-                    if year == (self.build_years-1) and ind == (len(profiles)-1):
+                    if year == (self.build_years-1) and ind in weather_year_ends:
                         ending_state = self.solver.Constraint(self.initial_state_of_charge, self.initial_state_of_charge)
                         ending_state.SetCoefficient(state_of_charge, 1)
 
 
                 #Loop through dispatchable resources.
-                for resource in self.disp.index:
+                for d, resource in enumerate(self.disp.index):
 
                     #Create generation variable for each dispatchable resource for every hour. 
                     gen = self.solver.NumVar(0, self.solver.infinity(), '_gen_year_'+ str(year) + '_hour' + str(ind))
 
-                    #Append hourly gen variable to the list for that resource, located in the disp_gen dictionary.
-                    self.disp_gen[resource].append(gen)
-
-                    #Calculate monetized emissions for given resource in selected hour.
-                    if resource == 'outofbasin':
-                        resource_monetized_emissions = self.outofbasin_emissions.loc[ind, 'CO2']*self.carbon_cost_per_ton + self.outofbasin_emissions.loc[ind, 'PM2.5']*self.pm25_cost_per_ton + self.outofbasin_emissions.loc[ind, 'NOX']*self.nox_cost_per_ton + self.outofbasin_emissions.loc[ind, 'SO2']*self.so2_cost_per_ton + self.outofbasin_emissions.loc[ind, 'PM10']*self.pm10_cost_per_ton
-                    else:
-                        resource_monetized_emissions = self.disp.loc[resource, 'CO2']*self.carbon_cost_per_ton + self.disp.loc[resource, 'PM2.5']*self.pm25_cost_per_ton + self.disp.loc[resource, 'NOX']*self.nox_cost_per_ton + self.disp.loc[resource, 'SO2']*self.so2_cost_per_ton + self.disp.loc[resource, 'PM10']*self.pm10_cost_per_ton
-                        
-                    #Calculate variable cost for each dispatchable resource and extrapolate cost to total timespan, accounting for discount rate.
-                    if 'NG' in resource:
-                        variable_cost = self.disp.loc[resource,'variable']+ (self.disp.loc[resource,'heat_rate']* self.gas_fuel_cost) + resource_monetized_emissions
-                        variable_cost_extrapolated = variable_cost * self.discounting_factor[year]
-                    elif resource == 'outofbasin':
-                        variable_cost = self.disp.loc[resource,'variable']+ resource_monetized_emissions + self.transmission_cost_per_mwh
-                        variable_cost_extrapolated = variable_cost * self.discounting_factor[year]
-                    else:
-                        variable_cost = self.disp.loc[resource,'variable']+ resource_monetized_emissions
-                        variable_cost_extrapolated = variable_cost * self.discounting_factor[year]
-
-                    #Incorporate extrapolated variable cost of hourly gen for each disp resource into objective function.
-                    objective.SetCoefficient(gen, variable_cost_extrapolated)
+                    #Keep track of the column index of the hourly gen variable for that resource.
+                    self.disp_gen_index[d, year, ind] = gen.index()
 
                     #Add hourly gen variables for disp resources to the fulfill_demand constraint.
                     fulfill_demand.SetCoefficient(gen, 1)
@@ -271,29 +506,80 @@ class LinearProgram(object):
                     #For hydro resource, add hourly generation to power limit constraint (resets every hour) and energy limit constraint.
                     if resource in ['HYDROPOWER']:
                         hydro_power_limit.SetCoefficient(gen, 1)
-                        hydro_energy_limit.SetCoefficient(gen, 1)
+                        hydro_energy_limit.SetCoefficient(gen, timestep_hours[ind])
 
                     #Initialize max_gen constraint: hourly gen must be less than or equal to capacity for each dispatchable resource.
+                    #Capacity (including existing capacity) is derated by the resource's capacity factor scale in this year.
                     if self.resources.loc[str(resource)]['legacy'] == 'y':
                         existing_mw = self.resources.loc[str(resource)]['existing_mw']
-                        max_gen = self.solver.Constraint(-existing_mw, self.solver.infinity())
+                        max_gen = self.solver.Constraint(-existing_mw * capacity_factor_scale[resource], self.solver.infinity())
                     else:
                         max_gen = self.solver.Constraint(0, self.solver.infinity())
-                    disp_capacity_cumulative = self.capacity_vars[resource][0:year+1]
+                    disp_capacity_cumulative = self._capacity_through_year(self.capacity_vars, resource, year)
                     for i, var in enumerate(disp_capacity_cumulative):
-                        max_gen.SetCoefficient(var, 1)
+                        max_gen.SetCoefficient(var, capacity_factor_scale[resource])
                     max_gen.SetCoefficient(gen, -1)
+                    self._add_hourly_limit(max_gen, ind)
 
                 #Nondispatchable resources can only generate their hourly profile scaled by nameplate capacity to help fulfill demand.   
                 for resource in self.nondisp.index:
-                    profile_max = max(profiles[resource])
-                    scaling_coefficient = profiles.loc[ind, resource] / profile_max
-                    nondisp_capacity_cumulative = self.capacity_vars[resource][0:year+1]
+                    scaling_coefficient = normalized_profiles[resource][ind] * capacity_factor_scale[resource]
+                    nondisp_capacity_cumulative = self._capacity_through_year(self.capacity_vars, resource, year)
 
                     for i, var in enumerate(nondisp_capacity_cumulative):
                         fulfill_demand.SetCoefficient(var, scaling_coefficient)
 
-            #Outside of hourly loop, add capex costs to objective function for every disp resource.         
+        self._set_costs(objective)
+
+        return objective
+
+
+    def _dispatch_costs(self):
+        
+        #Objective coefficients of the hourly charge variables of every storage resource and of the hourly gen variables of every dispatchable resource, as arrays of (resource x build year x hour), computed from the current prices.
+        #Hourly costs are weighted by the weight of the hour's weather year (1 with a single weather year).
+        profiles = self.profiles
+        discounting_factor = np.array(self.discounting_factor, dtype = float)[:, None]
+        grid_emissions_scale = self.grid_emissions_scale[:, None]
+        charge_costs = np.zeros((len(self.storage.index), self.build_years, len(profiles)))
+        gen_costs = np.zeros((len(self.disp.index), self.build_years, len(profiles)))
+        
+        #Variable cost of charging and monetized emissions of the grid for every storage resource (build year x hour).
+        grid_monetized_emissions = self._monetized_emissions(self.wholegrid_emissions)
+        for s, resource in enumerate(self.storage.index):
+            variable_cost = self.storage.loc[resource,'variable ($/MWh)'] + grid_monetized_emissions * grid_emissions_scale
+            charge_costs[s] = variable_cost * self.hour_weights
+        
+        #Variable cost of every dispatchable resource, including monetized emissions, extrapolated to the total timespan accounting for the discount rate.
+        outofbasin_monetized_emissions = self._monetized_emissions(self.outofbasin_emissions)
+        disp_monetized_emissions = self._monetized_emissions(self.disp)
+        for d, resource in enumerate(self.disp.index):
+            if 'NG' in resource:
+                variable_cost = self.disp.loc[resource,'variable']+ (self.disp.loc[resource,'heat_rate']* self.gas_fuel_cost) + disp_monetized_emissions[d]
+            elif resource == 'outofbasin':
+                variable_cost = self.disp.loc[resource,'variable']+ outofbasin_monetized_emissions * grid_emissions_scale + self.transmission_cost_per_mwh
+            else:
+                variable_cost = self.disp.loc[resource,'variable']+ disp_monetized_emissions[d]
+            gen_costs[d] = variable_cost * discounting_factor * self.hour_weights
+        
+        return charge_costs, gen_costs
+    
+    def _costs(self):
+        
+        #Column indices and objective coefficients of every cost of the model, computed from its current prices (see update_parameters).
+        profiles = self.profiles
+        charge_costs, gen_costs = self._dispatch_costs()
+        indices = [self.storage_charge_index.ravel(), self.disp_gen_index.ravel()]
+        coefficients = [charge_costs.ravel(), gen_costs.ravel()]
+        
+        #Costs of the capacity built in every build year.
+        capacity_indices = []
+        capacity_coefficients = []
+        for year in range(self.build_years):
+            
+            capacity_factor_scale = {resource: self.capacity_factor_scale[resource][year] if resource in self.capacity_factor_scale else 1 for resource in self.resources.index}
+            
+            #Add capex costs for every disp resource.         
             for resource in self.disp.index:
                 capacity = self.capacity_vars[resource][year]
                 capex_initial = self.resources.loc[resource, 'capex']
@@ -301,9 +587,10 @@ class LinearProgram(object):
                 capex_now = capex_initial* pow((1-capex_decline), year)
                 fixed = self.resources.loc[resource, 'fixed'] * self.discounting_factor[year]
                 capex_fixed = capex_now + fixed
-                objective.SetCoefficient(capacity, capex_fixed)
+                capacity_indices.append(capacity.index())
+                capacity_coefficients.append(capex_fixed)
 
-            #Outside of hourly loop, add capex costs to objective function for every storage resource.
+            #Add capex costs for every storage resource.
             for resource in self.storage.index:
                 capex_decline = self.storage.loc[resource, 'annual capex decline']
                 
@@ -344,10 +631,11 @@ class LinearProgram(object):
                     
 
                 #Set capex cost for storage built in this year.
-                objective.SetCoefficient(self.storage_capacity_vars[resource][year], capex_now + fixed)
+                capacity_indices.append(self.storage_capacity_vars[resource][year].index())
+                capacity_coefficients.append(capex_now + fixed)
                   
 
-            #Outside of hourly loop, add capex and extrapolated variable costs to obj function for each nondisp resource. 
+            #Add capex and extrapolated variable costs for each nondisp resource. 
             for resource in self.nondisp.index: 
                 capacity = self.capacity_vars[resource][year]
                 fixed = self.nondisp.loc[resource, 'fixed'] * self.discounting_factor[year]
@@ -356,9 +644,7 @@ class LinearProgram(object):
                 capex_now = capex_initial* pow((1-capex_decline), year) 
                 capex_fixed = capex_now + fixed
 
-                profile_max = max(profiles[resource])
-                profile = profiles[resource] / profile_max
-                profile_sum = sum(profile)
+                profile_sum = ((profiles[resource] / self.profile_max[resource]).values @ self.hour_weights) * capacity_factor_scale[resource]
                 
                 resource_monetized_emissions = self.nondisp.loc[resource, 'CO2']*self.carbon_cost_per_ton + self.nondisp.loc[resource, 'PM2.5']*self.pm25_cost_per_ton + self.nondisp.loc[resource, 'NOX']*self.nox_cost_per_ton + self.nondisp.loc[resource, 'SO2']*self.so2_cost_per_ton + self.nondisp.loc[resource, 'PM10']*self.pm10_cost_per_ton
 
@@ -370,11 +656,254 @@ class LinearProgram(object):
                 total_cost_coefficient = annual_sum_var_cost_extrapolated + capex_fixed
 
                 #Add total cost coefficient to nondisp capacity variable in objective function.
-                objective.SetCoefficient(capacity, total_cost_coefficient)
-
-        return objective
-
-
+                capacity_indices.append(capacity.index())
+                capacity_coefficients.append(total_cost_coefficient)
+        
+        indices.append(np.array(capacity_indices, dtype = int))
+        coefficients.append(np.array(capacity_coefficients, dtype = float))
+        
+        return np.concatenate(indices).astype(int), np.concatenate(coefficients)
+    
+    def _set_costs(self, objective):
+        
+        #Set the objective coefficient of every cost of the model (see _costs). Only coefficients that changed since the last call are set, so updating a few prices of a built model is cheap.
+        indices, coefficients = self._costs()
+        previous = getattr(self, '_cost_coefficients', None)
+        changed = np.ones(len(indices), dtype = bool) if previous is None else coefficients != previous
+        variables = self.solver.variables()
+        for i, coefficient in zip(indices[changed], coefficients[changed]):
+            objective.SetCoefficient(variables[i], coefficient)
+        self._cost_coefficients = coefficients
+    
+    def _year_scale(self, values, name):
+        
+        #Per build year multipliers as an array, all ones if values is None.
+        if values is None:
+            return np.ones(self.build_years)
+        values = np.asarray(values, dtype = float)
+        if values.shape != (self.build_years,):
+            raise ValueError('%s needs one value per build year (%d), got %s.' % (name, self.build_years, values.tolist()))
+        
+        return values
+    
+    def _add_hourly_limit(self, constraint, hour):
+        
+        #Record an hourly limit constraint and its hour (see hourly_limit_rows).
+        self.hourly_limit_rows.append(constraint.index())
+        self.hourly_limit_hours.append(hour)
+    
+    def _monetized_emissions(self, emissions):
+        
+        #Monetized emissions ($/MWh) of each row of a table with CO2, PM2.5, NOX, SO2 and PM10 columns (tons/MWh).
+        return (emissions['CO2']*self.carbon_cost_per_ton + emissions['PM2.5']*self.pm25_cost_per_ton + emissions['NOX']*self.nox_cost_per_ton + emissions['SO2']*self.so2_cost_per_ton + emissions['PM10']*self.pm10_cost_per_ton).values
+    
+    def _dominated_resources(self):
+        
+        #Screening curves: find resources and storage that can always be replaced by another option at no extra cost, using the same cost coefficients as _add_constraints_and_costs.
+        #Returns {dominated resource: dominating resource}.
+        #
+        #Resource B dominates resource A if, for every MW of A built in any build year y, one MW of B can deliver the same power in every hour for no more cost:
+        # - B can deliver at least A's normalized profile in every hour (dispatchable resources deliver up to 1, nondispatchable ones their profile), and B is not hydro, whose power and energy are limited.
+        # - c_B[y] + S[y] * W <= c_A[y], where c is the capacity cost coefficient, S[y] the discounting factors summed over the years y and after in which the capacity is used, and W the worst case variable cost increase per MW-year:
+        #   sum over hours of max(v_B - v_A, 0) if A is dispatchable (at any capacity factor), or of v_B * A's profile if A is nondispatchable.
+        #   This is the screening curve test: B's annualized cost line lies below A's at capacity factor 0 and 1, so at every capacity factor between.
+        #Storage B dominates storage A if B's grid share of power and duration covers A's, B is at least as efficient, and both its capacity cost (per MW of grid power) and its charging cost in every hour are no higher.
+        #Legacy resources are never dropped, since their existing capacity is free.
+        #The comparison uses the unscaled base year, so resources with a capacity_factor_scale other than 1 are left out, and so are outofbasin and storage if grid_emissions_scale is not 1.
+        discounting_factor = np.array(self.discounting_factor, dtype = float)
+        if (discounting_factor <= 0).any():
+            return {}
+        years = np.arange(self.build_years)
+        remaining_discounting = np.cumsum(discounting_factor[::-1])[::-1]
+        profiles = self.profiles
+        
+        resources = self.resources
+        dispatchable = (resources['dispatchable'] == 'y').values
+        capex = resources['capex'].values[:, None] * (1 - resources['annual capex decline'].values[:, None]) ** years
+        capacity_cost = capex + resources['fixed'].values[:, None] * discounting_factor
+        
+        #Normalized hourly output per MW (resource x hour) and hourly variable cost per MWh of dispatchable resources, before discounting.
+        output = np.ones((len(resources), len(profiles)))
+        variable_cost = np.zeros((len(resources), len(profiles)))
+        monetized_emissions = self._monetized_emissions(resources)
+        for i, resource in enumerate(resources.index):
+            if dispatchable[i]:
+                if resource == 'outofbasin':
+                    variable_cost[i] = resources.loc[resource, 'variable'] + self._monetized_emissions(self.outofbasin_emissions) + self.transmission_cost_per_mwh
+                elif 'NG' in resource:
+                    variable_cost[i] = resources.loc[resource, 'variable'] + resources.loc[resource, 'heat_rate'] * self.gas_fuel_cost + monetized_emissions[i]
+                else:
+                    variable_cost[i] = resources.loc[resource, 'variable'] + monetized_emissions[i]
+            else:
+                output[i] = profiles[resource] / self.profile_max[resource]
+                capacity_cost[i] += (resources.loc[resource, 'variable'] + monetized_emissions[i]) * (output[i] @ self.hour_weights) * discounting_factor
+        
+        dominated = {}
+        scaled = [resource for resource, scale in self.capacity_factor_scale.items() if (scale != 1).any()]
+        if (self.grid_emissions_scale != 1).any():
+            scaled.append('outofbasin')
+        comparable = ~resources.index.isin(scaled)
+        can_replace = (resources.index != 'HYDROPOWER') & comparable
+        for a, resource in enumerate(resources.index):
+            if resources.loc[resource, 'legacy'] == 'y' or not comparable[a]:
+                continue
+            if dispatchable[a]:
+                variable_increase = np.maximum(variable_cost - variable_cost[a], 0) @ self.hour_weights
+            else:
+                variable_increase = variable_cost @ (output[a] * self.hour_weights)
+            dominates = (can_replace & (output >= output[a]).all(axis = 1)
+                         & (capacity_cost + remaining_discounting * variable_increase[:, None] <= capacity_cost[a]).all(axis = 1))
+            dominates[a] = False
+            #Resources with identical costs dominate each other, so only compare against resources that have not been dropped.
+            dominates &= ~resources.index.isin(list(dominated))
+            if dominates.any():
+                dominated[resource] = resources.index[np.argmax(dominates)]
+        
+        storage = self.storage.loc[self.storage['legacy'] == 'n']
+        if (self.grid_emissions_scale != 1).any():
+            storage = storage.iloc[:0]
+        grid_fraction = np.where(storage['resilient'] == 'y', self.resilient_storage_grid_fraction, 1.0)
+        efficiency = storage['efficiency'].values
+        duration = storage['storage_duration (hrs)'].values
+        storage_capex = storage['capex ($/MW)'].values[:, None] * (1 - storage['annual capex decline'].values[:, None]) ** years
+        incentive = np.where(storage['resilient'] == 'y', self.resilience_incentive_per_mwh * duration, 0)
+        storage_capex = np.maximum(storage_capex - incentive[:, None], np.where(storage['resilient'] == 'y', 0, -np.inf)[:, None])
+        storage_cost = storage_capex + storage['fixed ($/MW-year)'].values[:, None] * discounting_factor
+        if 'diesel_genset_replacement_storage_4hr' in storage.index:
+            diesel_genset_monetized_emissions_yearly = self.diesel_genset_carbon_per_mw * self.carbon_cost_per_ton + self.diesel_genset_pm25_per_mw * self.pm25_cost_per_ton + self.diesel_genset_nox_per_mw * self.nox_cost_per_ton + self.diesel_genset_so2_per_mw * self.so2_cost_per_ton + self.diesel_genset_pm10_per_mw * self.pm10_cost_per_ton
+            diesel_genset_fuel_cost_yearly = self.diesel_genset_mmbtu_per_mwh * self.diesel_genset_cost_per_mmbtu * self.diesel_genset_hours_per_year
+            storage_cost[storage.index.get_loc('diesel_genset_replacement_storage_4hr')] -= (diesel_genset_monetized_emissions_yearly + diesel_genset_fuel_cost_yearly + self.diesel_genset_fixed_cost_per_mw_year) * discounting_factor
+        #Capacity cost per MW of power available to the grid, and hourly charging cost.
+        storage_cost = storage_cost / grid_fraction[:, None]
+        charge_cost = storage['variable ($/MWh)'].values[:, None] + self._monetized_emissions(self.wholegrid_emissions)
+        
+        for a, resource in enumerate(storage.index):
+            #A more efficient storage resource charges and discharges less to deliver the same energy. This only holds if the initial state of charge is zero, since it is not scaled.
+            if self.initial_state_of_charge == 0:
+                efficiency_ok = efficiency >= efficiency[a]
+            else:
+                efficiency_ok = efficiency == efficiency[a]
+            charge_ratio = efficiency[a] / efficiency
+            dominates = (efficiency_ok & (duration >= duration[a])
+                         & (storage_cost <= storage_cost[a]).all(axis = 1)
+                         & (charge_ratio[:, None] * charge_cost <= charge_cost[a]).all(axis = 1))
+            dominates[a] = False
+            dominates &= ~storage.index.isin(list(dominated))
+            if dominates.any():
+                dominated[resource] = storage.index[np.argmax(dominates)]
+        
+        #Dominance is transitive, so point every dropped resource to one that is kept.
+        for resource in dominated:
+            while dominated[resource] in dominated:
+                dominated[resource] = dominated[dominated[resource]]
+        
+        return dominated
+    
+    def solution_values(self, index = None):
+        
+        #Solution values of all solver columns as a numpy array, gathered in one call rather than one solution_value() call per variable.
+        #If index is given (ex. self.disp_gen_index), returns the values at those column indices with the same shape (ex. resource x build year x hour).
+        #Values are NaN if the solver has no solution (ex. the problem is infeasible or unbounded).
+        response = linear_solver_pb2.MPSolutionResponse()
+        self.solver.FillSolutionResponseProto(response)
+        if len(response.variable_value) == self.solver.NumVariables():
+            values = np.array(response.variable_value)
+        else:
+            values = np.full(self.solver.NumVariables(), np.nan)
+        if index is None:
+            return values
+        
+        return values[index]
+    
+    
+    def _emissions_coefficients(self, emissions = 'CO2'):
+        
+        #Column indices and coefficients of the annual emissions of the last build year, the year demand is met in.
+        #emissions is one of 'CO2', 'PM2.5', 'NOX', 'SO2', 'PM10' (tons) or 'monetized' ($ of damages at this model's $/ton prices).
+        #Built from the same emission rates as the objective: dispatchable generation, storage charging from the grid (hourly grid emissions), nondispatchable generation of the capacity built so far, and the diesel genset emissions avoided by replacement storage (negative).
+        pollutants = {'CO2': 'carbon', 'PM2.5': 'pm25', 'NOX': 'nox', 'SO2': 'so2', 'PM10': 'pm10'}
+        if emissions == 'monetized':
+            rates = self._monetized_emissions
+            diesel_per_mw = sum(getattr(self, 'diesel_genset_%s_per_mw' % name) * getattr(self, '%s_cost_per_ton' % name) for name in pollutants.values())
+        elif emissions in pollutants:
+            rates = lambda table: table[emissions].values
+            diesel_per_mw = getattr(self, 'diesel_genset_%s_per_mw' % pollutants[emissions])
+        else:
+            raise ValueError('emissions must be one of %s or \'monetized\', got %r.' % (list(pollutants), emissions))
+        
+        year = self.build_years - 1
+        grid_rates = rates(self.wholegrid_emissions) * self.grid_emissions_scale[year]
+        outofbasin_rates = rates(self.outofbasin_emissions) * self.grid_emissions_scale[year]
+        
+        indices = []
+        coefficients = []
+        for d, (resource, rate) in enumerate(zip(self.disp.index, rates(self.disp))):
+            hourly_rate = outofbasin_rates if resource == 'outofbasin' else np.full(len(self.hour_weights), rate)
+            indices.append(self.disp_gen_index[d, year])
+            coefficients.append(hourly_rate * self.hour_weights)
+        for s in range(len(self.storage.index)):
+            indices.append(self.storage_charge_index[s, year])
+            coefficients.append(grid_rates * self.hour_weights)
+        for resource, rate in zip(self.nondisp.index, rates(self.nondisp)):
+            profile = self.profiles[resource]
+            annual_output = (profile.values @ self.hour_weights) / self.profile_max[resource] * self.capacity_factor_scale.get(resource, np.ones(self.build_years))[year]
+            variables = self._capacity_through_year(self.capacity_vars, resource, year)
+            indices.append([var.index() for var in variables])
+            coefficients.append(np.full(len(variables), rate * annual_output))
+        if 'diesel_genset_replacement_storage_4hr' in self.storage_capacity_vars:
+            variables = self._capacity_through_year(self.storage_capacity_vars, 'diesel_genset_replacement_storage_4hr', year)
+            indices.append([var.index() for var in variables])
+            coefficients.append(np.full(len(variables), -diesel_per_mw))
+        
+        return np.concatenate(indices).astype(int), np.concatenate(coefficients)
+    
+    def add_emissions_cap(self, emissions = 'CO2', cap = None):
+        
+        #Add a constraint capping the annual emissions of the last build year at cap (tons, or $ if emissions is 'monetized'; no limit if None), and return it.
+        #The cap can be changed afterwards with constraint.SetUb and the model re-solved, which starts from the previous basis. Its dual_value() after a solve is the shadow price of the cap ($ of objective per ton).
+        indices, coefficients = self._emissions_coefficients(emissions)
+        constraint = self.solver.Constraint(-self.solver.infinity(), self.solver.infinity() if cap is None else cap)
+        variables = self.solver.variables()
+        for i, coefficient in zip(indices, coefficients):
+            constraint.SetCoefficient(variables[i], coefficient)
+        
+        return constraint
+    
+    def annual_emissions(self, emissions = 'CO2'):
+        
+        #Annual emissions of the last build year in the solution (tons, or $ of damages if emissions is 'monetized'), counted the same way as add_emissions_cap.
+        indices, coefficients = self._emissions_coefficients(emissions)
+        
+        return self.solution_values(indices) @ coefficients
+    
+    
+    def _variables_by_resource(self, resources, index_name):
+        
+        #Resolve the columns of an index array into a mapping holding a list of solver variables for each resource, in the same build year and hour order as the index array.
+        #The view is kept per index array and solver, so repeated lookups of a resource (ex. in a loop over resources) do not resolve its variables again.
+        views = self.__dict__.setdefault('_variable_views', {})
+        if index_name not in views or views[index_name]._solver is not self.solver:
+            views[index_name] = _ResourceVariables(self.solver, resources, getattr(self, index_name))
+        
+        return views[index_name]
+    
+    @property
+    def disp_gen(self):
+        return self._variables_by_resource(self.disp.index, 'disp_gen_index')
+    
+    @property
+    def storage_charge_vars(self):
+        return self._variables_by_resource(self.storage.index, 'storage_charge_index')
+    
+    @property
+    def storage_discharge_vars(self):
+        return self._variables_by_resource(self.storage.index, 'storage_discharge_index')
+    
+    @property
+    def storage_state_of_charge_vars(self):
+        return self._variables_by_resource(self.storage.index, 'storage_state_of_charge_index')
+    
+    
     def discount_factor_from_cost(self, cost, discount_rate, build_years):
         growth_rate = 1.0 + discount_rate
         
@@ -393,14 +922,14 @@ class LinearProgram(object):
     
     
     def _setup_resources(self):
-        resources = pd.read_csv('data/doscoe_resources.csv')
+        resources = pd.read_csv(os.path.join(self.data_dir, 'doscoe_resources.csv'))
         resources = resources.set_index('resource')     
         
         return resources
 
         
     def _setup_storage(self):
-        storage = pd.read_csv('data/storage.csv')
+        storage = pd.read_csv(os.path.join(self.data_dir, 'storage.csv'))
         num_columns = storage.columns[3:]
         storage[num_columns] = storage[num_columns].astype(float)
         storage = storage.set_index('resource')
@@ -435,26 +964,107 @@ class LinearProgram(object):
 
         return storage_capacity_vars
     
+    def _initialize_installed_capacity_vars(self, capacity_vars):
+        installed_vars = {}
+        for resource in capacity_vars:
+            
+            installed_by_year = []
+            for year, capacity in enumerate(capacity_vars[resource]):
+                installed = self.solver.NumVar(0, self.solver.infinity(), str(resource)+ '_installed_' + str(year))
+                
+                #Installed capacity in a year is the installed capacity of the previous year plus the capacity built this year.
+                recursion = self.solver.Constraint(0, 0)
+                recursion.SetCoefficient(installed, 1)
+                recursion.SetCoefficient(capacity, -1)
+                if year > 0:
+                    recursion.SetCoefficient(installed_by_year[-1], -1)
+                installed_by_year.append(installed)
+            installed_vars[resource] = installed_by_year
+        
+        return installed_vars
+    
+    def _capacity_through_year(self, capacity_vars, resource, year):
+        
+        #Variables whose sum is the capacity of a resource installed by the end of year: either its single installed capacity variable or every build year capacity variable up to year.
+        if self.installed_capacity_vars:
+            if capacity_vars is self.storage_capacity_vars:
+                return [self.installed_storage_vars[resource][year]]
+            return [self.installed_vars[resource][year]]
+        
+        return capacity_vars[resource][0:year+1]
+    
     def _setup_outofbasin_emissions(self):
-        outofbasin_emissions = pd.read_csv('data/outofbasin_emissions.csv')
+        outofbasin_emissions = pd.read_csv(os.path.join(self.data_dir, 'outofbasin_emissions.csv'))
         #outofbasin_emissions.insert(0, 'datetime', harborgen.index)
         #outofbasin_emissions = outofbasin_emissions.set_index('datetime')
         
         return outofbasin_emissions
     
     def _setup_wholegrid_emissions(self):
-        wholegrid_emissions = pd.read_csv('data/whole_grid_emissions.csv')
+        wholegrid_emissions = pd.read_csv(os.path.join(self.data_dir, 'whole_grid_emissions.csv'))
         #outofbasin_emissions.insert(0, 'datetime', harborgen.index)
         #outofbasin_emissions = outofbasin_emissions.set_index('datetime')
         
         return wholegrid_emissions
     
 
-    def solve(self):
+    def solve(self, warm_start=None, time_limit = None, iteration_limit = None, progress = None, progress_interval = 1000, cancel = None, scaling = False):
+        
+        #warm_start can be a previously solved LinearProgram with the same resources, storage, build years and profiles (ex. the neighboring point of a sweep over gas_fuel_cost or carbon_cost_per_ton).
+        #Its solver is updated in place with this model's coefficients and re-solved starting from its optimal basis, then the solution is loaded into this model's solver.
+        #The previous LinearProgram hands its solver over, so read (or save) any results needed from it before using it as a warm start.
+        #time_limit (seconds) and iteration_limit (simplex iterations, GLOP only) stop a long solve. progress is called with a report of iterations, objective and primal/dual infeasibility every progress_interval iterations (ex. print_progress).
+        #cancel (ex. a threading.Event, or a multiprocessing.Event set by a parent process) stops the solve from another thread or process when it is set (GLOP only).
+        #A stopped solve ends FEASIBLE with the best feasible solution found, or NOT_SOLVED if none was found, and self.stop_reason says why it stopped ('time limit', 'iteration limit' or 'cancelled').
+        #With scaling, a copy of the model with equilibrated rows and columns and a normalized objective (see model_scaling) is solved, and its solution is unscaled into this model's solver, so results read the same.
+        #Progress infeasibilities are then in scaled units. A warm start keeps the scaling of the LinearProgram it starts from.
+        if self.solver_backend != 'GLOP' and (iteration_limit is not None or cancel is not None):
+            raise ValueError('iteration_limit and cancel need the GLOP solver backend, got %r.' % self.solver_backend)
         self.objective.SetMinimization()
-        status = self.solver.Solve()
+        
+        if warm_start is None:
+            solver = self.solver
+            self.warm_scaling = None
+            if scaling:
+                model = linear_solver_pb2.MPModelProto()
+                self.solver.ExportModelToProto(model)
+                self.warm_scaling = model_scaling(model)
+                solver = pywraplp.Solver('HarborOptimizationScaled', SOLVER_BACKENDS[self.solver_backend])
+                solver.LoadModelFromProto(scale_model(model, self.warm_scaling))
+        else:
+            solver = warm_start.warm_solver
+            if solver is None:
+                raise ValueError('warm_start must be a LinearProgram that has been solved and not already used as a warm start.')
+        
+            model = linear_solver_pb2.MPModelProto()
+            self.solver.ExportModelToProto(model)
+            self.warm_scaling = warm_start.warm_scaling
+            if self.warm_scaling is not None:
+                model = scale_model(model, self.warm_scaling)
+            copy_model_changes(solver, model)
+            warm_start.warm_solver = None
+    
+        if progress is not None and self.warm_scaling is not None:
+            objective_scale = self.warm_scaling[2]
+            report_progress = progress
+            progress = lambda report: report_progress(dict(report, objective = report['objective'] / objective_scale))
+        status, self.stop_reason = _solve_with_limits(solver, time_limit, iteration_limit, progress, progress_interval, cancel)
+        self.warm_solver = solver
+    
+        if solver is not self.solver and status in [solver.OPTIMAL, solver.FEASIBLE]:
+            solution = linear_solver_pb2.MPSolutionResponse()
+            solver.FillSolutionResponseProto(solution)
+            if self.warm_scaling is not None:
+                solution = unscale_solution(solution, self.warm_scaling)
+            self.solver.LoadSolutionFromProto(solution)
+        
         if status == self.solver.OPTIMAL:
             print("Solver found optimal solution.")
+        elif self.stop_reason is not None:
+            if status == self.solver.FEASIBLE:
+                print('Solver stopped (%s). The best feasible solution found is loaded (objective %.8g).' % (self.stop_reason, self.solver.Objective().Value()))
+            else:
+                print('Solver stopped (%s) before a feasible solution was found.' % self.stop_reason)
         elif status == self.solver.FEASIBLE:
             # No optimal solution was found.
             print('A potentially suboptimal solution was found.')
@@ -462,36 +1072,39 @@ class LinearProgram(object):
             print('The solver could not solve the problem.')
             #print("Solver exited with error code {}".format(status))
             
+        self.status = status
+        return status
+            
                    
     def capacity_results(self):
         
+        #Fraction of the capacity installed by the end of the last build year that each resource makes up.
+        values = self.solution_values()
+        year = self.build_years - 1
+        capacity = {resource: sum(values[var.index()] for var in self._capacity_through_year(self.capacity_vars, resource, year)) for resource in self.capacity_vars}
+        total_capacity = sum(capacity.values())
         capacity_fractions = {}
-        total_capacity = 0
-        for resource in self.capacity_vars:
-            total_capacity = total_capacity + self.capacity_vars[resource].solution_value()
-        for resource in self.capacity_vars:
-            fraction_capacity = self.capacity_vars[resource].solution_value() / total_capacity
-            capacity_fractions[resource] = fraction_capacity
+        for resource in capacity:
+            capacity_fractions[resource] = capacity[resource] / total_capacity
         
         return capacity_fractions
             
     def gen_results(self):
 
-        profiles = pd.read_csv('data/gen_profiles.csv')
-        #Sum total annual generation across all resources.
-        total_gen = 0
-        for resource in self.disp.index:
-            summed_gen = 0
-            for i_gen in self.disp_gen[str(resource)]:
-                summed_gen += i_gen.solution_value()
-            total_gen = total_gen + summed_gen
+        #Sum generation across all resources and build years, with every hour weighted by self.hour_weights so that weather years and timesteps add up to annual totals.
+        values = self.solution_values()
+        generation = {}
+        for d, resource in enumerate(self.disp.index):
+            generation[resource] = (values[self.disp_gen_index[d]] @ self.hour_weights).sum()
 
         for resource in self.nondisp.index:
-            profile_max = max(profiles[resource])
-            summed_gen = sum(profiles[resource]) / profile_max
-            capacity = self.capacity_vars[resource].solution_value()
-            gen = summed_gen * capacity
-            total_gen = total_gen + gen
+            profile_sum = (self.profiles[resource] / self.profile_max[resource]).values @ self.hour_weights
+            capacity_factor_scale = self.capacity_factor_scale.get(resource, np.ones(self.build_years))
+            generation[resource] = 0
+            for year in range(self.build_years):
+                capacity = sum(values[var.index()] for var in self._capacity_through_year(self.capacity_vars, resource, year))
+                generation[resource] += capacity * profile_sum * capacity_factor_scale[year]
+        total_gen = sum(generation.values())
         
         #If storage can charge from sources outside portfolio, then net supply from storage should be counted towards total generation.
 #         for resource in self.storage_capacity_vars:
@@ -505,54 +1118,420 @@ class LinearProgram(object):
                 
             
         gen_fractions = {}
-        for resource in self.disp.index:
-            summed_gen = 0
-            for i_gen in self.disp_gen[str(resource)]:
-                summed_gen += i_gen.solution_value()
-            fraction_generation = summed_gen / total_gen
-            gen_fractions[resource] = fraction_generation
-
-        for resource in self.nondisp.index:
-            profile_max = max(profiles[resource])
-            summed_gen = sum(profiles[resource]) / profile_max
-            capacity = self.capacity_vars[resource].solution_value()
-            gen = summed_gen * capacity
-            fraction_generation = gen / total_gen
-            gen_fractions[resource] = fraction_generation
+        for resource in generation:
+            gen_fractions[resource] = generation[resource] / total_gen
         
         return total_gen #gen_fractions
 
+    def sensitivity_results(self):
+        
+        #Sensitivity of the solved model, read from the duals and reduced costs of a single solve. Call after solve().
+        #Returns a dictionary with:
+        # 'capacity': DataFrame indexed by resource and build year with the capacity, its cost coefficient in the objective, its reduced cost, and the range of the cost coefficient over which the current build stays optimal.
+        #             The range is exact for resources that are not built (the cost must drop by the reduced cost before they are built, and any increase keeps them unbuilt).
+        #             For built resources the range needs the simplex tableau, which the solver does not expose, so it is left as NaN.
+        # 'marginal_energy_cost': DataFrame (hour x build year) of the shadow prices of the fulfill demand constraints, in $/MWh for that year (undiscounted).
+        # 'hydro_energy': Series indexed by build year and weather year of the shadow price of the hydro energy limit, in $/MWh (negative when the limit binds).
+        #With several weather years, both are per MWh of the hour's own weather year, so stacking copies of the same year gives the prices of that year alone.
+        tolerance = 1e-7
+        
+        rows = []
+        capacity_vars = list(self.capacity_vars.items()) + list(self.storage_capacity_vars.items())
+        for resource, capacity_by_build_year in capacity_vars:
+            for year, var in enumerate(capacity_by_build_year):
+                capacity = var.solution_value()
+                cost = self.objective.GetCoefficient(var)
+                reduced_cost = var.reduced_cost()
+                if capacity <= tolerance:
+                    cost_lower = cost - max(reduced_cost, 0)
+                    cost_upper = np.inf
+                else:
+                    cost_lower = np.nan
+                    cost_upper = np.nan
+                rows.append([resource, year, capacity, cost, reduced_cost, cost_lower, cost_upper])
+                
+        capacity = pd.DataFrame(rows, columns = ['resource', 'build_year', 'capacity', 'cost', 'reduced_cost', 'cost_lower', 'cost_upper'])
+        capacity = capacity.set_index(['resource', 'build_year'])
+        
+        #Duals are in units of the objective, so divide by the discounting factor to get $/MWh in each year, and by the weight of the hour (weight of its weather year times the timestep length), so each row is the $/MWh of one timestep of its weather year.
+        discounting_factor = np.array(self.discounting_factor, dtype = float)
+        duals = np.array([constraint.dual_value() for constraint in self.fulfill_demand_constraints])
+        duals = duals.reshape(self.build_years, -1)
+        marginal_energy_cost = pd.DataFrame((duals / discounting_factor[:, None] / self.hour_weights).T)
+        marginal_energy_cost.index.name = 'hour'
+        marginal_energy_cost.columns.name = 'build_year'
+        
+        #There is one hydro energy limit per weather year in every build year: divide each by the discounting factor of its build year and by the weight of its weather year.
+        year_weights = self.hour_weights[self.weather_year_starts] / self.timestep_hours[self.weather_year_starts]
+        hydro_duals = np.array([constraint.dual_value() for constraint in self.hydro_energy_constraints])
+        hydro_duals = hydro_duals.reshape(self.build_years, len(self.weather_year_starts))
+        index = pd.MultiIndex.from_product([range(self.build_years), list(self.weather_years)], names = ['build_year', 'weather_year'])
+        hydro_energy = pd.Series((hydro_duals / discounting_factor[:, None] / year_weights).ravel(), index = index, name = 'hydro_energy')
+        
+        return {'capacity': capacity, 'marginal_energy_cost': marginal_energy_cost, 'hydro_energy': hydro_energy}
+
+    def update_parameters(self, **parameters):
+        
+        #Change parameters of a built model in place (any of UPDATABLE_PARAMETERS, ex. carbon_cost_per_ton for the next point of a sweep) without building it again.
+        #Only the objective coefficients that change are set, and the demand bounds if demand_scale changes. The next solve starts from the basis of the last one.
+        #Not available if prune_dominated_resources dropped resources, since which resources are dominated depends on the prices.
+        unknown = set(parameters) - set(UPDATABLE_PARAMETERS)
+        if unknown:
+            raise ValueError('Only %s can be updated in a built LinearProgram, got %s.' % (UPDATABLE_PARAMETERS, sorted(unknown)))
+        if self.dominated_resources:
+            raise ValueError('A LinearProgram that dropped dominated resources (%s) cannot be updated, since they depend on the prices.' % sorted(self.dominated_resources))
+        
+        self._set_parameters(**parameters)
+        self._set_costs(self.objective)
+        
+        #Demand only has to be met in the last build year.
+        if 'demand_scale' in parameters:
+            demand = self.profiles['DEMAND'].values * self.demand_scale[-1]
+            for constraint, value in zip(self.fulfill_demand_constraints[-len(demand):], demand):
+                constraint.SetLb(value)
+        
+        self.status = None
+        self.stop_reason = None
+    
+    def _set_parameters(self, **parameters):
+        
+        #Set the attributes of UPDATABLE_PARAMETERS, without touching the solver.
+        for name, value in parameters.items():
+            if name == 'storage_resilience_incentive_per_kwh':
+                self.resilience_incentive_per_mwh = value * 1000
+            elif name == 'demand_scale':
+                self.demand_scale = self._year_scale(value, 'demand_scale')
+            else:
+                setattr(self, name, value)
+        self.discounting_factor = self.discount_factor_from_cost(self.cost, self.discount_rate, self.build_years)
+    
+    def __getstate__(self):
+        
+        #Pickle the model as a serialized MPModelProto, with its variables and constraints stored as indices, so a built model can be sent to another process and loaded there without building it again.
+        #The solution and the warm start state are not kept.
+        state = dict(self.__dict__)
+        if self.solver is not None:
+            model = linear_solver_pb2.MPModelProto()
+            self.solver.ExportModelToProto(model)
+            state['solver'] = model.SerializeToString()
+        state.update(objective = None, warm_solver = None, warm_scaling = None, status = None, stop_reason = None)
+        state.pop('_variable_views', None)
+        for name in _VARIABLE_ATTRIBUTES:
+            if name in state:
+                state[name] = {resource: [var.index() for var in variables] for resource, variables in state[name].items()}
+        for name in _CONSTRAINT_ATTRIBUTES:
+            state[name] = [constraint.index() for constraint in state[name]]
+        
+        return state
+    
+    def __setstate__(self, state):
+        
+        self.__dict__.update(state)
+        if self.solver is None:
+            return
+        model = linear_solver_pb2.MPModelProto()
+        model.ParseFromString(state['solver'])
+        self.solver = pywraplp.Solver('HarborOptimization', SOLVER_BACKENDS[self.solver_backend])
+        error = self.solver.LoadModelFromProto(model)
+        if error:
+            raise ValueError('Could not load the pickled model: %s' % error)
+        self.objective = self.solver.Objective()
+        
+        variables = self.solver.variables()
+        constraints = self.solver.constraints()
+        for name in _VARIABLE_ATTRIBUTES:
+            if name in state:
+                setattr(self, name, {resource: [variables[i] for i in indices] for resource, indices in state[name].items()})
+        for name in _CONSTRAINT_ATTRIBUTES:
+            setattr(self, name, [constraints[i] for i in state[name]])
+
+    def release_solver(self):
+        
+        #Drop the solver and every variable and constraint reference so their memory can be freed, ex. once the results of a sweep point have been written out with harboropt_results.
+        #Solution values can no longer be read from this LinearProgram afterwards.
+        self.solver = None
+        self.warm_solver = None
+        self.warm_scaling = None
+        self.objective = None
+        self.capacity_vars = {}
+        self.storage_capacity_vars = {}
+        if self.installed_capacity_vars:
+            self.installed_vars = {}
+            self.installed_storage_vars = {}
+        self.fulfill_demand_constraints = []
+        self.hydro_energy_constraints = []
+        self.__dict__.pop('_variable_views', None)
+
 #Could add other keys to storage results (ex. hourly charge, hourly state of charge, hourly discharge).
-    def storage_results():
+    def storage_results(self):
         
         storage_results = {}
-        for resource in self.storage_capacity_vars:
+        charge = self.solution_values(self.storage_charge_index)
+        discharge = self.solution_values(self.storage_discharge_index)
+        for s, resource in enumerate(self.storage.index):
+            if resource not in self.storage_capacity_vars:
+                continue
             resource_results_dict = {}
             
-            storage_capacity = self.storage_capacity_vars[resource].solution_value()
+            storage_capacity = sum(var.solution_value() for var in self.storage_capacity_vars[resource])
             resource_results_dict['capacity']= storage_capacity
 
-            #Get hourly net charge values and add to resource_results_dict.
-            storage_hourly_net = []
-            storage_hourly_charge = []
-            storage_hourly_discharge = []
+            #Get hourly net charge values (across all build years) and add to resource_results_dict.
             efficiency = self.storage.loc[resource, 'efficiency']
-            for i,hour in enumerate(self.storage_charge_vars[resource]):
-                
-                charge_var = self.storage_charge_vars[resource][i].solution_value()
-                discharge_var = self.storage_discharge_vars[resource][i].solution_value() * efficiency
-                
-                net = discharge_var - charge_var
-                storage_hourly_net.append(net)
-                
-                storage_hourly_charge.append(charge_var)
-                storage_hourly_discharge.append(discharge_var)
+            storage_hourly_charge = charge[s].ravel()
+            storage_hourly_discharge = discharge[s].ravel() * efficiency
+            storage_hourly_net = storage_hourly_discharge - storage_hourly_charge
             
-            resource_results_dict['hourly_net_source']= storage_hourly_net    
-            resource_results_dict['hourly_charge']= storage_hourly_charge
-            resource_results_dict['hourly_discharge']= storage_hourly_discharge
+            resource_results_dict['hourly_net_source']= list(storage_hourly_net)
+            resource_results_dict['hourly_charge']= list(storage_hourly_charge)
+            resource_results_dict['hourly_discharge']= list(storage_hourly_discharge)
             
             
             storage_results[resource]=resource_results_dict
         
-        return storage_results
\ No newline at end of file
+        return storage_results
+
+
+def copy_model_changes(solver, model):
+    
+    #Copy the objective coefficients, bounds and constraint coefficients of an exported model (MPModelProto) into a solver that holds a model with the same variables and constraints.
+    #Only the values that differ are set, so the solver keeps its basis and can re-solve incrementally.
+    current = linear_solver_pb2.MPModelProto()
+    solver.ExportModelToProto(current)
+    if len(current.variable) != len(model.variable) or len(current.constraint) != len(model.constraint):
+        raise ValueError('Warm start model does not have the same variables and constraints.')
+    
+    variables = solver.variables()
+    objective = solver.Objective()
+    if current.maximize != model.maximize:
+        objective.SetOptimizationDirection(model.maximize)
+    for i, (old, new) in enumerate(zip(current.variable, model.variable)):
+        if old.objective_coefficient != new.objective_coefficient:
+            objective.SetCoefficient(variables[i], new.objective_coefficient)
+        if old.lower_bound != new.lower_bound or old.upper_bound != new.upper_bound:
+            variables[i].SetBounds(new.lower_bound, new.upper_bound)
+    
+    constraints = solver.constraints()
+    for i, (old, new) in enumerate(zip(current.constraint, model.constraint)):
+        if old.var_index != new.var_index:
+            raise ValueError('Warm start model does not have the same variables and constraints.')
+        if old.coefficient != new.coefficient:
+            for var_index, coefficient in zip(new.var_index, new.coefficient):
+                constraints[i].SetCoefficient(variables[var_index], coefficient)
+        if old.lower_bound != new.lower_bound or old.upper_bound != new.upper_bound:
+            constraints[i].SetBounds(new.lower_bound, new.upper_bound)
+
+
+def _model_matrix(model):
+    
+    #Row indices, column indices and coefficients of the constraint matrix of an exported model (MPModelProto), and the number of terms of each row.
+    lengths = np.array([len(row.var_index) for row in model.constraint], dtype = int)
+    rows = np.repeat(np.arange(len(model.constraint)), lengths)
+    columns = np.fromiter((i for row in model.constraint for i in row.var_index), dtype = int, count = lengths.sum())
+    coefficients = np.fromiter((a for row in model.constraint for a in row.coefficient), dtype = float, count = lengths.sum())
+    
+    return rows, columns, coefficients, lengths
+
+
+
+def _geometric_scale(index, magnitudes, size):
+    
+    #1 / sqrt(largest * smallest) of the magnitudes of each of size rows or columns (1 where there are none), given the row or column index of each magnitude.
+    largest = np.zeros(size)
+    smallest = np.full(size, np.inf)
+    np.maximum.at(largest, index, magnitudes)
+    np.minimum.at(smallest, index, magnitudes)
+    scale = np.ones(size)
+    present = largest > 0
+    scale[present] = 1 / np.sqrt(largest[present] * smallest[present])
+    
+    return scale
+
+def model_scaling(model, passes = 4):
+    
+    #Row and column scale factors that equilibrate the constraint matrix of an exported model (MPModelProto), and an objective scale factor.
+    #Geometric mean scaling: each pass divides every row, then every column, by the geometric mean of its largest and smallest absolute coefficient.
+    #Column scales act as a choice of units for each variable (ex. GW instead of MW), and the objective scale as a choice of currency unit (ex. $M) that brings the largest cost coefficient near 1.
+    #Factors are rounded to powers of 2, so scaling and unscaling add no rounding error.
+    #Returns (row_scale, column_scale, objective_scale): the scaled model has coefficients row_scale[i] * a[i, j] * column_scale[j] and variables x[j] / column_scale[j], and its objective is multiplied by objective_scale.
+    rows, columns, coefficients, lengths = _model_matrix(model)
+    magnitudes = np.abs(coefficients)
+    nonzero = magnitudes > 0
+    rows, columns, magnitudes = rows[nonzero], columns[nonzero], magnitudes[nonzero]
+    row_scale = np.ones(len(model.constraint))
+    column_scale = np.ones(len(model.variable))
+    
+    for p in range(passes):
+        row_scale *= _geometric_scale(rows, magnitudes * row_scale[rows] * column_scale[columns], len(row_scale))
+        column_scale *= _geometric_scale(columns, magnitudes * row_scale[rows] * column_scale[columns], len(column_scale))
+    row_scale = 2.0 ** np.round(np.log2(row_scale))
+    column_scale = 2.0 ** np.round(np.log2(column_scale))
+    
+    costs = np.abs(np.array([var.objective_coefficient for var in model.variable])) * column_scale
+    objective_scale = 2.0 ** -np.round(np.log2(costs.max())) if costs.max() > 0 else 1.0
+    
+    return row_scale, column_scale, objective_scale
+
+
+def scale_model(model, scaling):
+    
+    #Copy of an exported model (MPModelProto) with the scaling of model_scaling applied.
+    row_scale, column_scale, objective_scale = scaling
+    rows, columns, coefficients, lengths = _model_matrix(model)
+    scaled_coefficients = np.split(coefficients * row_scale[rows] * column_scale[columns], np.cumsum(lengths)[:-1])
+    
+    scaled = linear_solver_pb2.MPModelProto()
+    scaled.CopyFrom(model)
+    scaled.objective_offset *= objective_scale
+    for var, scale in zip(scaled.variable, column_scale):
+        var.lower_bound /= scale
+        var.upper_bound /= scale
+        var.objective_coefficient *= scale * objective_scale
+    for row, scale, row_coefficients in zip(scaled.constraint, row_scale, scaled_coefficients):
+        row.lower_bound *= scale
+        row.upper_bound *= scale
+        row.coefficient[:] = row_coefficients
+    
+    return scaled
+
+
+def unscale_solution(response, scaling):
+    
+    #Solution (MPSolutionResponse) of a scaled model converted back to the units of the original model: variable values, reduced costs, duals and objective.
+    row_scale, column_scale, objective_scale = scaling
+    unscaled = linear_solver_pb2.MPSolutionResponse()
+    unscaled.CopyFrom(response)
+    unscaled.objective_value /= objective_scale
+    unscaled.best_objective_bound /= objective_scale
+    if len(response.variable_value) == len(column_scale):
+        unscaled.variable_value[:] = np.array(response.variable_value) * column_scale
+    if len(response.reduced_cost) == len(column_scale):
+        unscaled.reduced_cost[:] = np.array(response.reduced_cost) / (column_scale * objective_scale)
+    if len(response.dual_value) == len(row_scale):
+        unscaled.dual_value[:] = np.array(response.dual_value) * row_scale / objective_scale
+    
+    return unscaled
+
+
+def print_progress(report):
+    
+    #Progress callback for LinearProgram.solve that prints one line per report.
+    print('%d iterations, %.1f s: objective %.8g, primal infeasibility %.3g, dual infeasibility %.3g' % (report['iterations'], report['seconds'], report['objective'], report['primal_infeasibility'], report['dual_infeasibility']))
+
+
+def _progress_report(solver, status, iterations, seconds, bounds):
+    
+    #Progress of a solve from the solution the solver holds. bounds are the (lower, upper) bounds of the variables and constraints of its exported model.
+    #primal_infeasibility is the largest violation of a variable or constraint bound, dual_infeasibility the largest reduced cost of the wrong sign for a minimization. Both are NaN without a solution.
+    report = {'iterations': iterations, 'seconds': seconds, 'status': status, 'objective': np.nan, 'primal_infeasibility': np.nan, 'dual_infeasibility': np.nan}
+    response = linear_solver_pb2.MPSolutionResponse()
+    solver.FillSolutionResponseProto(response)
+    if len(response.variable_value) != solver.NumVariables():
+        return report
+    
+    (variable_lb, variable_ub), (constraint_lb, constraint_ub) = bounds
+    values = np.array(response.variable_value)
+    activities = np.array(solver.ComputeConstraintActivities())
+    violations = [variable_lb - values, values - variable_ub, constraint_lb - activities, activities - constraint_ub]
+    report['objective'] = response.objective_value
+    report['primal_infeasibility'] = max(0, max(violation.max(initial = 0) for violation in violations))
+    if len(response.reduced_cost) == len(values):
+        reduced_cost = np.array(response.reduced_cost)
+        tolerance = 1e-6 * np.maximum(1, np.abs(values))
+        can_increase = np.where(values < variable_ub - tolerance, np.maximum(-reduced_cost, 0), 0)
+        can_decrease = np.where(values > variable_lb + tolerance, np.maximum(reduced_cost, 0), 0)
+        report['dual_infeasibility'] = max(can_increase.max(initial = 0), can_decrease.max(initial = 0))
+    
+    return report
+
+
+def _solve_with_limits(solver, time_limit = None, iteration_limit = None, progress = None, progress_interval = 1000, cancel = None):
+    
+    #Solve with pywraplp solver, stopping at time_limit (seconds), iteration_limit (simplex iterations, GLOP only) or when cancel (ex. a threading.Event or multiprocessing.Event) is set.
+    #With progress, GLOP solves in chunks of progress_interval iterations, each resuming from the basis of the previous one, and progress(report) is called after every chunk (see _progress_report). Other backends report once at the end.
+    #cancel is watched from a thread that interrupts the running solve, which GLOP supports.
+    #Returns (status, stop_reason). stop_reason is None if the solver finished on its own, else 'time limit', 'iteration limit' or 'cancelled'.
+    #A stopped solve is FEASIBLE with the best feasible solution found loaded into the solver, or NOT_SOLVED if no feasible solution was found.
+    start = time.time()
+    chunk = progress_interval if progress is not None else iteration_limit
+    bounds = None
+    if progress is not None:
+        model = linear_solver_pb2.MPModelProto()
+        solver.ExportModelToProto(model)
+        bounds = [(np.array([row.lower_bound for row in rows]), np.array([row.upper_bound for row in rows])) for rows in [model.variable, model.constraint]]
+    
+    solving = threading.Event()
+    solving.set()
+    watcher = None
+    iterations = 0
+    chunked = False
+    best = None
+    stop_reason = None
+    try:
+        if cancel is not None:
+            watcher = threading.Thread(target = _interrupt_when_set, args = (solver, cancel, solving), daemon = True)
+            watcher.start()
+        while True:
+            if cancel is not None and cancel.is_set():
+                stop_reason = 'cancelled'
+                break
+            if time_limit is not None:
+                time_left = time_limit - (time.time() - start)
+                if time_left <= 0:
+                    stop_reason = 'time limit'
+                    break
+                #A time limit of 0 means no limit.
+                solver.SetTimeLimit(max(1, int(time_left * 1000)))
+            chunk_limit = chunk
+            if iteration_limit is not None:
+                chunk_limit = min(chunk_limit, iteration_limit - iterations)
+            if chunk_limit is not None and not solver.SetSolverSpecificParametersAsString('max_number_of_iterations: %d' % chunk_limit):
+                #The backend has no iteration limit (ex. CLP), so solve in one go.
+                chunk = chunk_limit = None
+            chunked = chunked or chunk_limit is not None
+            
+            status = solver.Solve()
+            iterations += solver.iterations()
+            feasible = status in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE] and solver.VerifySolution(1e-6, False)
+            if feasible:
+                best = linear_solver_pb2.MPSolutionResponse()
+                solver.FillSolutionResponseProto(best)
+            if progress is not None:
+                progress(_progress_report(solver, status, iterations, time.time() - start, bounds))
+            
+            if status not in [pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED]:
+                #Optimal, or a definite outcome (infeasible, unbounded, abnormal).
+                return status, None
+            if cancel is not None and cancel.is_set():
+                stop_reason = 'cancelled'
+            elif chunk_limit is not None and solver.iterations() >= chunk_limit:
+                if iteration_limit is not None and iterations >= iteration_limit:
+                    stop_reason = 'iteration limit'
+                else:
+                    continue
+            elif time_limit is not None and time.time() - start >= time_limit * 0.99:
+                stop_reason = 'time limit'
+            else:
+                return status, None
+            break
+    finally:
+        solving.clear()
+        if watcher is not None:
+            watcher.join()
+        solver.SetTimeLimit(0)
+        if chunked:
+            solver.SetSolverSpecificParametersAsString('')
+    
+    if best is None:
+        return pywraplp.Solver.NOT_SOLVED, stop_reason
+    solver.LoadSolutionFromProto(best)
+    return pywraplp.Solver.FEASIBLE, stop_reason
+
+
+def _interrupt_when_set(solver, cancel, solving):
+    
+    #Interrupt the running solve of solver as soon as cancel is set, until solving is cleared.
+    while solving.is_set():
+        if cancel.wait(0.1):
+            solver.InterruptSolve()
+            return
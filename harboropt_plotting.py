@@ -0,0 +1,129 @@
+import numpy as np # numerical library
+import matplotlib.pyplot as plt # plotting library
+
+#Plotting and reporting helpers for solved harboropt LinearPrograms.
+#These live outside the model module so that importing the model does not pull in matplotlib. Import this module only where plots are made.
+
+
+def hourly_dispatch(lp, results_year = 0):
+
+    #Collect the hourly generation of every resource and the hourly charge and discharge of every storage resource in the chosen build year (index starts at 0).
+    #Returns two dictionaries keyed by resource: generation (including storage discharge) and storage charge (negative values). Resources that never run are left out.
+    profiles = lp.profiles
+
+    resource_gen_dict = {}
+    resource_charge_dict = {}
+
+    disp_gen = lp.solution_values(lp.disp_gen_index[:, results_year])
+    storage_charge = lp.solution_values(lp.storage_charge_index[:, results_year])
+    storage_discharge = lp.solution_values(lp.storage_discharge_index[:, results_year])
+
+    for d, resource in enumerate(lp.disp.index):
+        gen_list = list(disp_gen[d])
+        if any(gen_list):
+            resource_gen_dict[resource] = gen_list
+
+    for resource in lp.nondisp.index:
+        profile_max = max(profiles[resource])
+        profile = profiles[resource] / profile_max
+
+        #Nondispatchable generation uses the capacity built up to and including the chosen year.
+        capacity = sum(var.solution_value() for var in lp.capacity_vars[resource][0:results_year+1])
+
+        gen_list = list(profile * capacity)
+        if any(gen_list):
+            resource_gen_dict[resource] = gen_list
+
+    for s, resource in enumerate(lp.storage.index):
+        efficiency = lp.storage.loc[resource, 'efficiency']
+
+        storage_hourly_charge = list(-storage_charge[s])
+        if any(storage_hourly_charge):
+            resource_charge_dict[resource + '_CHARGE'] = storage_hourly_charge
+
+        storage_hourly_discharge = list(storage_discharge[s] * efficiency)
+        if any(storage_hourly_discharge):
+            resource_gen_dict[resource + '_DISCHARGE'] = storage_hourly_discharge
+
+    return resource_gen_dict, resource_charge_dict
+
+
+def _format_axes(ax, xlabel, ylabel, title, fontsize = 20):
+
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.yaxis.set_ticks_position('left')
+    ax.xaxis.set_ticks_position('bottom')
+    ax.set_xlabel(xlabel, fontsize = fontsize)
+    ax.set_ylabel(ylabel, fontsize = fontsize)
+    ax.set_title(title, fontsize = fontsize).set_position([.5, 1.05])
+    ax.tick_params(labelsize = fontsize)
+
+
+def plot_hourly_dispatch(lp, results_year = 0, start_hour = 0, end_hour = 1000):
+
+    #Stacked area chart of hourly generation by resource, with storage charging below zero and demand as a line.
+    resource_gen_dict, resource_charge_dict = hourly_dispatch(lp, results_year)
+    profiles = lp.profiles
+    hours = profiles.index[start_hour:end_hour]
+
+    fig, ax = plt.subplots()
+
+    lines = [item[start_hour:end_hour] for item in resource_gen_dict.values()]
+    labels = list(resource_gen_dict.keys())
+
+    lines_neg = [item[start_hour:end_hour] for item in resource_charge_dict.values()]
+    labels_neg = list(resource_charge_dict.keys())
+
+    cmap = plt.get_cmap('tab20')
+    colors = cmap(np.linspace(0, 1.0, (len(lines)+len(lines_neg))))
+
+    if lines:
+        ax.stackplot(hours, lines, labels = labels, colors = colors[0:len(lines)])
+    if lines_neg:
+        ax.stackplot(hours, lines_neg, labels = labels_neg, colors = colors[len(lines):])
+
+    #Plot demand.
+    ax.plot(hours, profiles.DEMAND[start_hour:end_hour], label = 'DEMAND', color = 'k', linewidth = 3)
+
+    ax.legend(loc = 'center left', bbox_to_anchor=(1,0.77), fontsize = 15)
+    _format_axes(ax, 'Hour', 'Generation (MW)', 'Hourly Generation (MW) by Resource in Year '+ str(results_year+1))
+    fig.set_size_inches(20, 10)
+
+    return fig, ax
+
+
+def plot_resource_dispatch(lp, selected_resource, results_year = 0, start_hour = 0, end_hour = 8760):
+
+    #Line chart of the hourly generation (or storage charge, ex. 'storage_utility_4hr_CHARGE') of one resource against demand.
+    resource_gen_dict, resource_charge_dict = hourly_dispatch(lp, results_year)
+    profiles = lp.profiles
+    hours = profiles.index[start_hour:end_hour]
+
+    fig, ax = plt.subplots()
+
+    for resource_dict in [resource_gen_dict, resource_charge_dict]:
+        if selected_resource in resource_dict:
+            ax.plot(hours, resource_dict[selected_resource][start_hour:end_hour], label = str(selected_resource))
+
+    #Plot demand.
+    ax.plot(hours, profiles.DEMAND[start_hour:end_hour], label = 'DEMAND', color = 'k')
+
+    ax.legend(loc = 'center left', bbox_to_anchor=(1,0.77))
+    _format_axes(ax, 'Hour', 'Generation (MW)', selected_resource +' Hourly Generation (MW) in Year '+ str(results_year+1), fontsize = 18)
+    fig.set_size_inches(14, 8)
+
+    return fig, ax
+
+
+def plot_sweep(parameter_values, y_values, label, xlabel, ylabel, title):
+
+    #Line chart of a result (ex. a capacity solution value) against the swept parameter values.
+    fig, ax = plt.subplots()
+
+    ax.plot(parameter_values, y_values, label = label)
+
+    ax.legend(loc = 'center left', bbox_to_anchor=(1,0.77))
+    _format_axes(ax, xlabel, ylabel, title, fontsize = 12)
+
+    return fig, ax
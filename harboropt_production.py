@@ -0,0 +1,266 @@
+import collections
+import concurrent.futures
+import copy
+import time
+
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+import harboropt_lp_storage_buildyear_emissions
+import harboropt_screening
+import harboropt_sweep
+
+#Production cost of a fixed portfolio, dispatched hour by hour over the year in weekly windows.
+#
+#Once capacity is chosen (ex. by a LinearProgram on coarse timesteps, see harboropt_resolution), the hourly dispatch no longer needs one LP over the whole year: the weeks are only coupled by
+#the state of charge of storage at their boundaries and the yearly hydro energy limit. solve_production_cost() splits the year into windows of window_hours (the last one takes the remainder, ex. 52 weeks with a last week of 192 hours)
+#and solves one small dispatch LP per window, in parallel, at the capacities the LinearProgram built by its last build year. Each window also looks overlap_hours into the next one, so storage sees what is coming.
+#The windows are coordinated over rounds:
+# - Storage: every window starts from the state of charge the previous window ended its own hours with in the previous round, and values the energy left at the end of its lookahead at the
+#   shadow price of energy in the window that covers that hour (the dual of its state of charge rows). The last window ends at initial_state_of_charge, like the LinearProgram.
+# - Hydro: its generation is charged a price on top of its variable cost, bisected until the windows together use no more than the hydro energy limit of the year (the dual of that limit in a single LP).
+#It stops when no boundary state of charge changes by more than tolerance times the largest storage energy capacity, no value of the energy left at the end of a lookahead by more than tolerance times the largest value,
+#and the hydro energy is within tolerance of its limit (or under it at no price).
+#Costs are the objective coefficients of the last build year of the LinearProgram, so the cost is in its objective units (the variable costs and monetized emissions of dispatch, extrapolated over the timespan).
+#
+#   lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(carbon_cost_per_ton = 50, timesteps = [24] * 365)
+#   lp.solve()
+#   result = harboropt_production.solve_production_cost(lp, workers = 4, carbon_cost_per_ton = 100)
+
+#Stitched hourly dispatch of solve_production_cost: cost (objective units, NaN if a window has no solution), DataFrames (hour x resource) of generation, charge, discharge and state_of_charge (MW and MWh),
+#and a table with one row per round (see solve_production_cost).
+ProductionCostResult = collections.namedtuple('ProductionCostResult', ['cost', 'generation', 'charge', 'discharge', 'state_of_charge', 'history'])
+
+
+def _hourly_costs(lp, prices):
+
+    #Hourly objective coefficients of the charge of every storage resource and the generation of every dispatchable resource (resource x hour) in the last build year of lp at prices (UPDATABLE_PARAMETERS),
+    #and the hourly demand of that year. A shallow copy of lp gets the prices and the hourly profiles and emissions, so lp itself is unchanged and can be on timesteps.
+    unknown = set(prices) - set(harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS)
+    if unknown:
+        raise ValueError('Only %s can be changed for the production cost, got %s.' % (harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS, sorted(unknown)))
+    priced = copy.copy(lp)
+    priced._set_parameters(**prices)
+    priced.profiles, priced.hour_weights, starts = harboropt_lp_storage_buildyear_emissions.read_weather_profiles(lp.data_dir, lp.weather_years)
+    priced.wholegrid_emissions = priced._setup_wholegrid_emissions()
+    priced.outofbasin_emissions = priced._setup_outofbasin_emissions()
+    charge_costs, gen_costs = priced._dispatch_costs()
+
+    return charge_costs[:, -1], gen_costs[:, -1], priced.profiles, priced.profiles['DEMAND'].values * priced.demand_scale[-1]
+
+
+def _portfolio(lp, values, profiles):
+
+    #Capacities of a solved LinearProgram in its last build year: the generation limit of every dispatchable resource (MW, with existing capacity and the hydro power limit),
+    #the hourly output of all nondispatchable resources together (MW, for profiles), and the power (MW) and energy (MWh) of every storage resource available to the grid.
+    year = lp.build_years - 1
+    capacity = {resource: sum(values[var.index()] for var in lp._capacity_through_year(lp.capacity_vars, resource, year)) for resource in lp.resources.index}
+    capacity_factor_scale = {resource: lp.capacity_factor_scale[resource][year] if resource in lp.capacity_factor_scale else 1 for resource in lp.resources.index}
+
+    gen_capacity = np.zeros(len(lp.disp.index))
+    for d, resource in enumerate(lp.disp.index):
+        existing_mw = lp.resources.loc[resource, 'existing_mw'] if lp.resources.loc[resource, 'legacy'] == 'y' else 0
+        gen_capacity[d] = (capacity[resource] + existing_mw) * capacity_factor_scale[resource]
+        if resource == 'HYDROPOWER':
+            gen_capacity[d] = min(gen_capacity[d], harboropt_screening.HYDRO_MAX_POWER)
+
+    nondisp_output = np.zeros(len(profiles))
+    for resource in lp.nondisp.index:
+        nondisp_output += capacity[resource] * profiles[resource].values / lp.profile_max[resource] * capacity_factor_scale[resource]
+
+    power = np.zeros(len(lp.storage.index))
+    energy = np.zeros(len(lp.storage.index))
+    for s, resource in enumerate(lp.storage.index):
+        grid_fraction = lp.resilient_storage_grid_fraction if lp.storage.loc[resource, 'resilient'] == 'y' else 1
+        power[s] = grid_fraction * sum(values[var.index()] for var in lp._capacity_through_year(lp.storage_capacity_vars, resource, year))
+        energy[s] = power[s] * lp.storage.loc[resource, 'storage_duration (hrs)']
+
+    return gen_capacity, nondisp_output, power, energy
+
+
+def _solve_window(solver_backend, net_demand, gen_capacity, gen_costs, hydro, hydro_price, charge_costs, power, energy, efficiency, start_state, end_state = None, end_value = None):
+
+    #Solve the hourly dispatch LP of one window and return its status, dispatch (resource x hour) and the value of stored energy at the end of every hour (objective units per MWh, from the duals of the state of charge rows).
+    #Kept at module level so it can be sent to process pool workers.
+    #net_demand is the demand less nondispatchable output. Generation of dispatchable resource hydro (-1 for none) costs hydro_price more.
+    #Storage starts from start_state and, if end_state is given, ends at it, or else the energy it ends with is worth end_value (per storage resource).
+    hours = len(net_demand)
+    solver = pywraplp.Solver('ProductionCostWindow', harboropt_lp_storage_buildyear_emissions.SOLVER_BACKENDS[solver_backend])
+    objective = solver.Objective()
+
+    fulfill_demand = [solver.Constraint(net_demand[h], solver.infinity()) for h in range(hours)]
+
+    gen = [[solver.NumVar(0, gen_capacity[d], '') for h in range(hours)] for d in range(len(gen_capacity))]
+    for d, gen_by_hour in enumerate(gen):
+        for h, var in enumerate(gen_by_hour):
+            fulfill_demand[h].SetCoefficient(var, 1)
+            objective.SetCoefficient(var, gen_costs[d, h] + (hydro_price if d == hydro else 0))
+
+    charge = []
+    discharge = []
+    state_of_charge = []
+    state_of_charge_rows = []
+    for s in range(len(power)):
+        charge.append([solver.NumVar(0, power[s], '') for h in range(hours)])
+        discharge.append([solver.NumVar(0, power[s], '') for h in range(hours)])
+        state_of_charge.append([solver.NumVar(0, energy[s], '') for h in range(hours)])
+        if end_state is not None:
+            state_of_charge[s][-1].SetBounds(end_state[s], min(end_state[s], energy[s]))
+        elif end_value is not None:
+            objective.SetCoefficient(state_of_charge[s][-1], -end_value[s])
+        for h in range(hours):
+            fulfill_demand[h].SetCoefficient(discharge[s][h], efficiency[s])
+            objective.SetCoefficient(charge[s][h], charge_costs[s, h])
+
+            #State of charge at the end of the hour is the previous state of charge plus charge less discharge.
+            previous = start_state[s] if h == 0 else 0
+            row = solver.Constraint(previous, previous)
+            row.SetCoefficient(state_of_charge[s][h], 1)
+            row.SetCoefficient(charge[s][h], -1)
+            row.SetCoefficient(discharge[s][h], 1)
+            if h > 0:
+                row.SetCoefficient(state_of_charge[s][h - 1], -1)
+            state_of_charge_rows.append(row)
+
+    objective.SetMinimization()
+    status = solver.Solve()
+
+    def solution(variables):
+        return np.array([[var.solution_value() for var in by_hour] for by_hour in variables]).reshape(len(variables), hours)
+
+    if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
+        return {'status': status}
+
+    #The dual of a state of charge row is the change in cost per MWh more energy in storage at the end of that hour, so the value of the energy is its negative.
+    energy_value = -np.array([row.dual_value() for row in state_of_charge_rows]).reshape(len(power), hours)
+
+    return {'status': status, 'generation': solution(gen), 'charge': solution(charge), 'discharge': solution(discharge), 'state_of_charge': solution(state_of_charge), 'energy_value': energy_value}
+
+
+def solve_production_cost(lp, window_hours = 168, overlap_hours = 24, workers = 1, executor = 'thread', tolerance = 0.01, max_rounds = 10, hydro_max_energy = harboropt_screening.HYDRO_MAX_ENERGY, **prices):
+
+    #Hourly production cost of the portfolio of a solved LinearProgram (capacity in its last build year) in windows of window_hours hours looking overlap_hours ahead, solved on workers processes or threads (executor, see harboropt_sweep).
+    #prices are UPDATABLE_PARAMETERS to dispatch at instead of those of lp (ex. carbon_cost_per_ton = 100). lp is not changed.
+    #The model can be on timesteps, but needs a single weather year. Its solution gives the starting boundary states of charge and hydro price.
+    #Returns a ProductionCostResult, whose history has one row per round:
+    # 'status' (pywraplp status of the worst window), 'cost' (objective units), 'boundary_change' (largest change of a boundary state of charge, MWh),
+    # 'value_change' (largest change of the value of the energy left at the end of a lookahead, objective units per MWh), 'hydro_mwh' (hydro generation of the year),
+    # 'hydro_price' (objective units per MWh) and 'seconds'.
+    if executor not in harboropt_sweep.EXECUTORS:
+        raise ValueError('executor must be one of %s, got %r.' % (harboropt_sweep.EXECUTORS, executor))
+    if len(lp.weather_years) > 1:
+        raise ValueError('The production cost needs a model of a single weather year, got %d.' % len(lp.weather_years))
+    values = lp.solution_values()
+    if np.isnan(values).all():
+        raise ValueError('The LinearProgram has no solution, solve it first.')
+
+    charge_costs, gen_costs, profiles, demand = _hourly_costs(lp, prices)
+    gen_capacity, nondisp_output, power, energy = _portfolio(lp, values, profiles)
+    efficiency = lp.storage['efficiency'].values.astype(float)
+    hydro = list(lp.disp.index).index('HYDROPOWER') if 'HYDROPOWER' in lp.disp.index else -1
+    hours = len(profiles)
+    net_demand = demand - nondisp_output
+
+    #Windows of window_hours, the last one taking the remainder of the year.
+    starts = np.arange(max(1, hours // window_hours)) * window_hours
+    ends = np.append(starts[1:], hours)
+
+    #Boundary states of charge (window x storage resource) start from the solution of lp, at the end of the timestep holding the hour before every window.
+    #The first window starts from initial_state_of_charge.
+    year = lp.build_years - 1
+    timestep = np.repeat(np.arange(len(lp.timestep_hours)), lp.timestep_hours.astype(int))
+    lp_state_of_charge = values[lp.storage_state_of_charge_index[:, year]]
+    boundary = np.clip(lp_state_of_charge[:, timestep[starts - 1]].T, 0, energy)
+    boundary[0] = lp.initial_state_of_charge
+    energy_value = np.zeros((len(power), hours))
+
+    #The hydro price starts from the shadow price of the hydro energy limit of the last build year.
+    hydro_price = 0.
+    lower = 0.
+    upper = np.inf
+    over_dispatch = None
+    under_dispatch = None
+    if hydro >= 0 and lp.hydro_energy_constraints and lp.status == pywraplp.Solver.OPTIMAL:
+        hydro_price = max(0., -lp.hydro_energy_constraints[-1].dual_value())
+
+    dispatch = {name: np.zeros((len(gen_capacity) if name == 'generation' else len(power), hours)) for name in ['generation', 'charge', 'discharge', 'state_of_charge']}
+    cost = np.nan
+    rows = []
+    pool = concurrent.futures.ThreadPoolExecutor if executor == 'thread' else concurrent.futures.ProcessPoolExecutor
+    with pool(max_workers = workers) as workers_pool:
+        for round_number in range(max_rounds):
+            start = time.time()
+            jobs = []
+            end_hours = np.minimum(ends[:-1] + overlap_hours, hours) - 1
+            end_values = energy_value[:, end_hours].copy()
+            for k in range(len(starts)):
+                last = k == len(starts) - 1
+                window = slice(starts[k], hours if last else end_hours[k] + 1)
+                jobs.append(workers_pool.submit(_solve_window, lp.solver_backend, net_demand[window], gen_capacity, gen_costs[:, window], hydro, hydro_price, charge_costs[:, window], power, energy, efficiency, boundary[k],
+                                                np.full(len(power), float(lp.initial_state_of_charge)) if last else None, None if last else end_values[:, k]))
+            windows = [job.result() for job in jobs]
+
+            #Stitch the hours of every window, leaving out its lookahead.
+            statuses = [window['status'] for window in windows]
+            row = {'round': round_number, 'status': max(statuses)}
+            failed = [k for k, status in enumerate(statuses) if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]]
+            if failed:
+                print('The portfolio has no feasible dispatch in hours %d to %d (status %d).' % (starts[failed[0]], ends[failed[0]] - 1, statuses[failed[0]]))
+                cost = np.nan
+                rows.append(row)
+                break
+            for k, window in enumerate(windows):
+                core = ends[k] - starts[k]
+                for name in dispatch:
+                    dispatch[name][:, starts[k]:ends[k]] = window[name][:, :core]
+                energy_value[:, starts[k]:ends[k]] = window['energy_value'][:, :core]
+
+            cost = (charge_costs * dispatch['charge']).sum() + (gen_costs * dispatch['generation']).sum()
+            next_boundary = boundary.copy()
+            next_boundary[1:] = dispatch['state_of_charge'][:, starts[1:] - 1].T
+            row['cost'] = cost
+            row['boundary_change'] = np.abs(next_boundary - boundary).max() if len(power) else 0.
+            row['value_change'] = np.abs(energy_value[:, end_hours] - end_values).max(initial = 0)
+            row['hydro_mwh'] = dispatch['generation'][hydro].sum() if hydro >= 0 else 0.
+            row['hydro_price'] = hydro_price
+            row['seconds'] = time.time() - start
+            rows.append(row)
+            print('Round %d: cost %.6g, largest boundary change %.6g MWh, hydro %.6g MWh at price %.6g.' % (round_number, cost, row['boundary_change'], row['hydro_mwh'], hydro_price))
+
+            #Bisect the hydro price between a price at which hydro uses too much energy and one at which it leaves energy unused.
+            settled = row['boundary_change'] <= tolerance * max(energy.max(initial = 0), 1) and row['value_change'] <= tolerance * max(np.abs(energy_value).max(initial = 0), 1e-9)
+            over = row['hydro_mwh'] > hydro_max_energy * (1 + tolerance)
+            under = hydro_price > 0 and row['hydro_mwh'] < hydro_max_energy * (1 - tolerance)
+            if over:
+                lower = hydro_price
+                over_dispatch = ({name: array.copy() for name, array in dispatch.items()}, cost, row['hydro_mwh'])
+            elif under:
+                upper = hydro_price
+                under_dispatch = ({name: array.copy() for name, array in dispatch.items()}, cost, row['hydro_mwh'])
+            if settled and not over and not under:
+                break
+
+            #Hydro costs the same in every hour, so at the price that balances it the windows can switch between using too much and too little of it.
+            #Once the bracket is narrow, blend the dispatch of both ends so that it uses exactly the limit. Every window is a linear program, so the blend is a feasible dispatch.
+            if settled and lower > 0 and np.isfinite(upper) and upper - lower <= tolerance * upper:
+                (over_values, over_cost, over_hydro), (under_values, under_cost, under_hydro) = over_dispatch, under_dispatch
+                weight = (over_hydro - hydro_max_energy) / (over_hydro - under_hydro)
+                dispatch = {name: weight * under_values[name] + (1 - weight) * over_values[name] for name in dispatch}
+                cost = weight * under_cost + (1 - weight) * over_cost
+                row.update({'cost': cost, 'hydro_mwh': hydro_max_energy})
+                print('Blended the dispatch at hydro prices %.6g and %.6g to use the hydro energy limit, cost %.6g.' % (lower, upper, cost))
+                break
+
+            if over:
+                hydro_price = max(2 * hydro_price, np.abs(gen_costs).max()) if np.isinf(upper) else (hydro_price + upper) / 2
+            elif under:
+                hydro_price = (lower + hydro_price) / 2
+            boundary = next_boundary
+
+    index = pd.RangeIndex(hours, name = 'hour')
+    generation = pd.DataFrame(dispatch['generation'].T, index = index, columns = lp.disp.index)
+    charge, discharge, state_of_charge = [pd.DataFrame(dispatch[name].T, index = index, columns = lp.storage.index) for name in ['charge', 'discharge', 'state_of_charge']]
+
+    return ProductionCostResult(cost, generation, charge, discharge, state_of_charge, pd.DataFrame(rows).set_index('round'))
@@ -0,0 +1,345 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import sys
+import time
+import traceback
+import uuid
+
+import harboropt_lp_storage_buildyear_emissions
+import harboropt_results
+import harboropt_sweep
+
+#Work queue for running sweeps across several machines that share a filesystem, with no scheduler or message broker.
+#
+#The queue is a directory with one small JSON file per job, moved between state directories:
+# pending/<key>.json   job waiting to run: {"key", "function" ('module:function'), "kwargs"}
+# claimed/<key>.json   job being run. A worker claims a job by renaming it out of pending/, which only one worker can do.
+#                      The worker touches the file while the job runs, so its modification time is the lease.
+# done/<key>.json      job with its return value and the worker that ran it.
+# failed/<key>.json    job with the traceback of the error it raised.
+#Claimed jobs whose lease has not been renewed for lease_timeout seconds (ex. the worker's node rebooted) are moved back to pending/ by any worker.
+#Lease ages are measured against the modification time of a file in the queue directory that the requeuing worker touches just before, not against its own clock.
+#Leases and that file are both touched with os.utime, which takes the file server's current time on network filesystems, so the clocks of the nodes do not need to agree.
+#On a filesystem that takes the time from the client instead, keep the node clocks synchronized (ex. with NTP) and lease_timeout well above their skew.
+#A job can therefore run more than once, so job functions should be safe to repeat (ex. harboropt_sweep.run_scenario returns the stored result if the scenario was already written).
+#
+#Jobs can run any importable function whose arguments and return value are JSON values, ex. harboropt_sweep.run_scenario for harboropt LinearPrograms, or
+#grid_sim_website_example.run_region for gridsim regional runs (with doscoe/gridsim on PYTHONPATH).
+#
+#   python harboropt_queue.py submit /shared/queue scenarios/carbon_sweep.json --output-dir /shared/results
+#   python harboropt_queue.py work /shared/queue --workers 8        (on every node)
+#   python harboropt_queue.py status /shared/queue
+#
+#With template (or workers > 1 in the scenario file), every job runs harboropt_sweep.run_sweep on a batch of batch_size scenarios instead of one scenario, so the template is built once per batch.
+
+STATES = ['pending', 'claimed', 'done', 'failed']
+
+#File in the queue directory whose modification time is the current time of the shared filesystem (see WorkQueue.now).
+CLOCK_FILE = '.clock'
+
+#Scenarios per job when jobs run batches of a sweep.
+DEFAULT_BATCH_SIZE = 20
+
+
+def _write_json(path, data):
+
+    #Write to a temporary file in the same directory and rename it into place, so readers on other nodes never see a partial file.
+    temp_path = os.path.join(os.path.dirname(path), '.%s.%s.tmp' % (os.path.basename(path), uuid.uuid4().hex))
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent = 1)
+    os.replace(temp_path, path)
+
+
+def _read_json(path):
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def _import_function(name):
+
+    #Resolve 'module:function' (ex. 'harboropt_sweep:run_scenario') to the function.
+    module_name, function_name = name.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _run_claimed_job(queue, job, worker):
+
+    #Run a claimed job in its own process and record its return value or error. Kept at module level so it can be the target of a worker process.
+    try:
+        result = _import_function(job['function'])(**job['kwargs'])
+    except Exception:
+        queue.fail(job, traceback.format_exc(), worker)
+        print('%s failed %s' % (worker, job['key']))
+    else:
+        queue.complete(job, result, worker)
+        print('%s finished %s' % (worker, job['key']))
+    sys.stdout.flush()
+
+
+class WorkQueue(object):
+
+    def __init__(self, directory, lease_timeout = 600):
+
+        #directory: shared queue directory, created with its state directories if it does not exist.
+        #lease_timeout: seconds after the last lease renewal before a claimed job is handed to another worker.
+        self.directory = directory
+        self.lease_timeout = lease_timeout
+        for state in STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok = True)
+
+    def _path(self, state, key):
+
+        if not harboropt_results.KEY_PATTERN.match(key):
+            raise ValueError('Job key %r can only contain letters, digits and . _ = , + -' % key)
+        return os.path.join(self.directory, state, key + '.json')
+
+    def _keys(self, state):
+
+        return sorted(name[:-len('.json')] for name in os.listdir(os.path.join(self.directory, state)) if name.endswith('.json') and not name.startswith('.'))
+
+    def state(self, key):
+
+        #State of a job ('pending', 'claimed', 'done' or 'failed'), or None if it was never submitted.
+        for state in STATES:
+            if os.path.exists(self._path(state, key)):
+                return state
+        return None
+
+    def submit(self, key, function, kwargs = None):
+
+        #Add a job running function ('module:function') with keyword arguments kwargs. Returns False if a job with this key already exists in any state.
+        if self.state(key) is not None:
+            return False
+        _write_json(self._path('pending', key), {'key': key, 'function': function, 'kwargs': kwargs or {}})
+        return True
+
+    def now(self):
+
+        #Current time of the shared filesystem: the modification time of CLOCK_FILE, touched just now.
+        path = os.path.join(self.directory, CLOCK_FILE)
+        with open(path, 'a'):
+            pass
+        os.utime(path)
+        return os.path.getmtime(path)
+
+    def claim(self):
+
+        #Claim the next pending job and return it, or None if there are no pending jobs.
+        self.requeue_expired()
+        for key in self._keys('pending'):
+            pending_path = self._path('pending', key)
+            claimed_path = self._path('claimed', key)
+            try:
+                #Renaming keeps the modification time, so start the lease before the job becomes visible in claimed/.
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+            except FileNotFoundError:
+                #Another worker claimed it first.
+                continue
+            os.utime(claimed_path)
+            return _read_json(claimed_path)
+
+        return None
+
+    def renew(self, key):
+
+        #Renew the lease of a claimed job. Returns False if the job is no longer claimed (ex. it expired and was requeued).
+        try:
+            os.utime(self._path('claimed', key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job, result, worker = None):
+
+        done = dict(job, result = result, worker = worker, finished = time.time())
+        _write_json(self._path('done', job['key']), done)
+        self._release(job['key'])
+
+    def fail(self, job, error, worker = None):
+
+        failed = dict(job, error = error, worker = worker, finished = time.time())
+        _write_json(self._path('failed', job['key']), failed)
+        self._release(job['key'])
+
+    def _release(self, key):
+
+        try:
+            os.remove(self._path('claimed', key))
+        except FileNotFoundError:
+            pass
+
+    def requeue_expired(self):
+
+        #Move claimed jobs with expired leases back to pending. Returns the requeued keys.
+        requeued = []
+        now = self.now()
+        for key in self._keys('claimed'):
+            claimed_path = self._path('claimed', key)
+            try:
+                if now - os.path.getmtime(claimed_path) < self.lease_timeout:
+                    continue
+                os.rename(claimed_path, self._path('pending', key))
+            except FileNotFoundError:
+                continue
+            requeued.append(key)
+
+        return requeued
+
+    def requeue_failed(self):
+
+        #Move failed jobs back to pending (ex. after fixing the cause of the error). Returns the requeued keys.
+        requeued = []
+        for key in self._keys('failed'):
+            job = _read_json(self._path('failed', key))
+            _write_json(self._path('pending', key), {'key': key, 'function': job['function'], 'kwargs': job['kwargs']})
+            os.remove(self._path('failed', key))
+            requeued.append(key)
+
+        return requeued
+
+    def counts(self):
+
+        return {state: len(self._keys(state)) for state in STATES}
+
+    def results(self):
+
+        #Return values of finished jobs, keyed by job key.
+        return {key: _read_json(self._path('done', key))['result'] for key in self._keys('done')}
+
+
+def run_worker(queue, workers = 1, poll_interval = 10, exit_when_empty = True):
+
+    #Claim and run up to workers jobs at a time from queue until there are no jobs left (or forever if exit_when_empty is False).
+    #Every job runs in its own process, so this process can keep renewing the leases during long solves, and a job whose process crashes is recorded as failed without affecting the others.
+    worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    renew_interval = max(1, queue.lease_timeout / 4)
+    running = {}
+
+    while True:
+        while len(running) < workers:
+            job = queue.claim()
+            if job is None:
+                break
+            process = multiprocessing.Process(target = _run_claimed_job, args = (queue, job, worker))
+            process.start()
+            running[process] = job
+            print('%s claimed %s' % (worker, job['key']))
+            sys.stdout.flush()
+
+        if not running:
+            if exit_when_empty and not queue.counts()['claimed']:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        multiprocessing.connection.wait([process.sentinel for process in running], timeout = renew_interval)
+        for process, job in list(running.items()):
+            if process.is_alive():
+                queue.renew(job['key'])
+                continue
+            process.join()
+            del running[process]
+            if process.exitcode != 0 and queue.state(job['key']) == 'claimed':
+                queue.fail(job, 'Job process exited with code %s.' % process.exitcode, worker)
+                print('%s failed %s, its process exited with code %s' % (worker, job['key'], process.exitcode))
+                sys.stdout.flush()
+
+
+def submit_scenario_file(queue, scenario_file, output_dir = None, data_dir = None, solver_backend = None, hourly = None, template = None, workers = None, executor = None, batch_size = None):
+
+    #Submit the scenarios of a scenario file as jobs. Returns the number of new jobs.
+    #Arguments left as None take their value from the scenario file, as in harboropt_sweep.main.
+    #Without template and with one worker per job, every scenario is a harboropt_sweep.run_scenario job.
+    #Otherwise every job runs harboropt_sweep.run_sweep on batch_size scenarios (default DEFAULT_BATCH_SIZE) with template, workers and executor.
+    config = harboropt_sweep.load_scenario_file(scenario_file)
+    kwargs = {'data_dir': os.path.abspath(data_dir or config.get('data_dir', harboropt_lp_storage_buildyear_emissions.DATA_DIR)),
+              'solver_backend': solver_backend or config.get('solver', 'GLOP'),
+              'output_dir': os.path.abspath(output_dir or config.get('output_dir', 'results')),
+              'hourly': hourly if hourly is not None else config.get('hourly', False),
+              'screen': config.get('screen', True),
+              'max_cost': config.get('max_cost'),
+              'time_limit': config.get('time_limit'),
+              'iteration_limit': config.get('iteration_limit'),
+              'scaling': config.get('scaling', False)}
+    template = template if template is not None else config.get('template', False)
+    workers = workers or config.get('workers', 1)
+    executor = executor or config.get('executor', 'process')
+    if executor not in harboropt_sweep.EXECUTORS:
+        raise ValueError('executor must be one of %s, got %r.' % (harboropt_sweep.EXECUTORS, executor))
+
+    scenarios = harboropt_sweep.sweep_scenarios(config.get('parameters'), config.get('sweep'))
+    harboropt_sweep.write_manifest(kwargs['output_dir'], scenarios, kwargs['data_dir'], kwargs['solver_backend'])
+
+    submitted = 0
+    if not template and workers == 1:
+        for key, parameters in scenarios:
+            submitted += queue.submit(key, 'harboropt_sweep:run_scenario', dict(kwargs, key = key, parameters = parameters))
+        return submitted
+
+    #A batch job is keyed by its first scenario and its size, so resubmitting the same scenario file adds no new jobs.
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    for start in range(0, len(scenarios), batch_size):
+        batch = scenarios[start:start + batch_size]
+        key = '%s,batch_size=%d' % (batch[0][0], len(batch))
+        submitted += queue.submit(key, 'harboropt_sweep:run_sweep', dict(kwargs, scenarios = batch, template = template, workers = workers, executor = executor))
+
+    return submitted
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Run sweeps from a work queue directory shared between machines.')
+    parser.add_argument('--lease-timeout', type = float, default = 600, help = 'seconds before the job of an unresponsive worker is requeued')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    submit = subparsers.add_parser('submit', help = 'add one harboropt job per scenario of a scenario file')
+    submit.add_argument('queue_dir')
+    submit.add_argument('scenario_file')
+    submit.add_argument('--output-dir')
+    submit.add_argument('--data-dir')
+    submit.add_argument('--solver')
+    submit.add_argument('--hourly', action = 'store_true', default = None)
+    submit.add_argument('--template', action = 'store_true', default = None, help = 'run batches of scenarios as template sweeps (default: template in the scenario file, else off)')
+    submit.add_argument('--workers', type = int, help = 'parallel workers of every batch job (default: workers in the scenario file, else 1)')
+    submit.add_argument('--executor', choices = harboropt_sweep.EXECUTORS, help = 'run the workers of a batch job as processes or threads (default: executor in the scenario file, else process)')
+    submit.add_argument('--batch-size', type = int, help = 'scenarios per batch job (default: %d)' % DEFAULT_BATCH_SIZE)
+
+    work = subparsers.add_parser('work', help = 'claim and run jobs until the queue is empty')
+    work.add_argument('queue_dir')
+    work.add_argument('--workers', type = int, default = 1)
+    work.add_argument('--poll-interval', type = float, default = 10)
+    work.add_argument('--forever', action = 'store_true', help = 'keep polling for new jobs when the queue is empty')
+
+    status = subparsers.add_parser('status', help = 'print the number of jobs in each state')
+    status.add_argument('queue_dir')
+
+    requeue = subparsers.add_parser('requeue', help = 'move expired claimed jobs (and failed jobs with --failed) back to pending')
+    requeue.add_argument('queue_dir')
+    requeue.add_argument('--failed', action = 'store_true')
+
+    args = parser.parse_args(argv)
+    queue = WorkQueue(args.queue_dir, args.lease_timeout)
+
+    if args.command == 'submit':
+        submitted = submit_scenario_file(queue, args.scenario_file, args.output_dir, args.data_dir, args.solver, args.hourly, args.template, args.workers, args.executor, args.batch_size)
+        print('Submitted %d new jobs to %s' % (submitted, args.queue_dir))
+    elif args.command == 'work':
+        run_worker(queue, args.workers, args.poll_interval, exit_when_empty = not args.forever)
+    elif args.command == 'requeue':
+        requeued = queue.requeue_expired()
+        if args.failed:
+            requeued += queue.requeue_failed()
+        print('Requeued %d jobs' % len(requeued))
+
+    print(', '.join('%s: %d' % item for item in queue.counts().items()))
+
+
+if __name__ == '__main__':
+    main()
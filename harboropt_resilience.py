@@ -0,0 +1,166 @@
+import os
+
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+import harboropt_lp_storage_buildyear_emissions
+import harboropt_screening
+
+#Outage survival of resilient storage.
+#
+#Resilient storage (resilient = 'y' in storage.csv) only serves the grid with resilient_storage_grid_fraction of its capacity (see LinearProgram). The rest of its energy is held in reserve for outages.
+#data/REopt_dispatch.csv is the hourly shape of the critical load that REopt dispatches resilient storage to serve through an outage ('Resilient Dispatch', one row per hour of the year).
+#simulate_outages() evaluates outages of a solved LinearProgram starting in every hour of the year at once:
+# - During an outage the whole battery is islanded, so it can deliver its full power and its reserve plus the state of charge the grid dispatch left it with at the start, after losses.
+# - An outage of L hours starting at hour s is survived if the critical load of every hour stays within that power, and the load summed over the L hours within that energy.
+#   Both sums come from cumulative sums of the load over the year, for all start hours and durations together, rather than a loop over start hours.
+#survival_curve() turns the hours survived from every start hour into the probability of surviving an outage of each duration.
+#calibrate_grid_fraction() finds the largest resilient_storage_grid_fraction whose optimal portfolio still meets a survival target, so the reserve does not have to be tuned by hand.
+#
+#   lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(carbon_cost_per_ton = 50)
+#   lp.solve()
+#   hours_survived, curve = harboropt_resilience.simulate_outages(lp, critical_load_mw = 20)
+
+#Outage durations (hours) of the default survival curve.
+OUTAGE_HOURS = [1, 2, 4, 8, 12, 24, 48, 72]
+
+
+def read_critical_load(data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR):
+
+    #Hourly critical load shape of the year from REopt_dispatch.csv in data_dir.
+    return pd.read_csv(os.path.join(data_dir, 'REopt_dispatch.csv'))['Resilient Dispatch'].values.astype(float)
+
+
+def outage_survival(critical_load, energy, power = np.inf, max_hours = 168):
+
+    #Hours that storage carries critical_load (MW in every hour of the year) through an outage starting in every hour of the year, up to max_hours.
+    #energy is the energy the storage can deliver (MWh) at the start of the outage, a number or one per start hour, and power the power it can deliver (MW).
+    #Outages that run past the end of the year continue at its start.
+    load = np.asarray(critical_load, dtype = float)
+    hours = len(load)
+    wrapped = np.concatenate([load, np.resize(load, max_hours)])
+    cumulative_load = np.concatenate([[0], np.cumsum(wrapped)])
+    cumulative_overload = np.concatenate([[0], np.cumsum(wrapped > power)])
+
+    #(start hour x duration) of the load served by an outage starting at that hour and lasting that many hours.
+    starts = np.arange(hours)[:, None]
+    ends = starts + np.arange(1, max_hours + 1)
+    energy = np.broadcast_to(np.asarray(energy, dtype = float), (hours,))[:, None]
+    survived = cumulative_load[ends] - cumulative_load[starts] <= energy + 1e-9
+    survived &= cumulative_overload[ends] == cumulative_overload[starts]
+
+    #Both conditions only get harder with duration, so the hours survived are the number of durations survived.
+    return survived.sum(axis = 1)
+
+
+def survival_curve(hours_survived, outage_hours = OUTAGE_HOURS):
+
+    #Probability that an outage of each of outage_hours is survived, over all start hours of hours_survived (see outage_survival).
+    hours_survived = np.asarray(hours_survived)
+    return pd.Series([np.mean(hours_survived >= hours) for hours in outage_hours], index = pd.Index(outage_hours, name = 'outage_hours'), name = 'survival_probability')
+
+
+def resilient_storage(lp, include_state_of_charge = True):
+
+    #Power (MW), energy capacity (MWh) and energy (MWh, one value per hour) that the resilient storage of a solved LinearProgram can deliver in an outage starting in every hour of its last build year, after losses.
+    #The energy is the reserve (1 - resilient_storage_grid_fraction of the energy capacity) plus, with include_state_of_charge, the state of charge of the grid dispatch at the end of the previous hour.
+    #The state of charge needs a model on hourly timesteps.
+    hours = len(lp.profiles)
+    if include_state_of_charge and (lp.timestep_hours != 1).any():
+        raise ValueError('The state of charge needs a model on hourly timesteps, use include_state_of_charge = False for a model on timesteps.')
+
+    values = lp.solution_values()
+    if np.isnan(values).all():
+        raise ValueError('The LinearProgram has no solution, solve it first.')
+    year = lp.build_years - 1
+    power = 0.
+    capacity = 0.
+    state_of_charge = np.zeros(hours)
+    for s, resource in enumerate(lp.storage.index):
+        if lp.storage.loc[resource, 'resilient'] != 'y':
+            continue
+        efficiency = lp.storage.loc[resource, 'efficiency']
+        resource_power = sum(values[var.index()] for var in lp.storage_capacity_vars[resource])
+        power += efficiency * resource_power
+        capacity += efficiency * resource_power * lp.storage.loc[resource, 'storage_duration (hrs)']
+        if include_state_of_charge:
+            state_of_charge += efficiency * np.roll(values[lp.storage_state_of_charge_index[s, year]], 1)
+
+    return power, capacity, (1 - lp.resilient_storage_grid_fraction) * capacity + state_of_charge
+
+
+def simulate_outages(lp, outage_hours = OUTAGE_HOURS, critical_load_mw = None, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, include_state_of_charge = True):
+
+    #Simulate outages of every duration in outage_hours starting in every hour of the year for the resilient storage of a solved LinearProgram (see resilient_storage).
+    #The critical load is the shape of REopt_dispatch.csv in data_dir times critical_load_mw, or times the resilient storage power capacity if critical_load_mw is None.
+    #Returns the hours survived by an outage starting in every hour (up to the longest of outage_hours) and the survival_curve.
+    critical_load = read_critical_load(data_dir)
+    power, capacity, energy = resilient_storage(lp, include_state_of_charge)
+    if len(energy) != len(critical_load):
+        if include_state_of_charge:
+            raise ValueError('The model has %d hours but REopt_dispatch.csv has %d, use include_state_of_charge = False for a model of several weather years.' % (len(energy), len(critical_load)))
+        energy = np.full(len(critical_load), energy[0])
+    critical_load = critical_load * (power if critical_load_mw is None else critical_load_mw)
+    hours_survived = outage_survival(critical_load, energy, power, max(outage_hours))
+
+    return hours_survived, survival_curve(hours_survived, outage_hours)
+
+
+def required_reserve(critical_load, outage_hours, target_probability):
+
+    #Smallest energy (MWh) that carries critical_load (MW in every hour of the year) through outages of outage_hours hours starting in a target_probability share of the hours of the year:
+    #the target_probability quantile of the load summed over outage_hours hours from every start hour, from the same cumulative sums as outage_survival.
+    load = np.asarray(critical_load, dtype = float)
+    cumulative_load = np.concatenate([[0], np.cumsum(np.concatenate([load, np.resize(load, outage_hours)]))])
+    window_load = cumulative_load[outage_hours:outage_hours + len(load)] - cumulative_load[:len(load)]
+
+    return np.quantile(window_load, target_probability, method = 'inverted_cdf')
+
+
+def calibrate_grid_fraction(outage_hours, target_probability, parameters = None, critical_load_mw = None, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP', include_state_of_charge = True, tolerance = 0.01, max_iterations = 10, **solve_options):
+
+    #Largest resilient_storage_grid_fraction whose reserve alone carries the critical load through outages of outage_hours hours with target_probability (see required_reserve), for the portfolio the optimizer builds with that fraction.
+    #The resilient storage capacity depends on the fraction, so it is found by fixed point iteration: solve a LinearProgram with parameters (keyword arguments of LinearProgram) and the current fraction,
+    #then set the fraction so the reserve of the capacity built is the required reserve, until the fraction changes by less than tolerance.
+    #It starts from resilient_storage_grid_fraction in parameters (default that of LinearProgram). The critical load is as in simulate_outages, so with critical_load_mw = None the required reserve grows with the capacity and one step is enough.
+    #solve_options are passed to LinearProgram.solve (ex. time_limit).
+    #Returns the fraction of the last step and the LinearProgram solved with it, and a table with one row per step:
+    # 'grid_fraction', 'status' (pywraplp status), 'cost' (objective value, $), 'resilient_mw' (resilient storage power capacity, after losses),
+    # 'survival_probability' (of outages of outage_hours, see simulate_outages) and 'next_grid_fraction'.
+    #The fraction is None if the optimizer builds no resilient storage at a fraction, or not enough to meet the target even with all of it in reserve.
+    if parameters is None:
+        parameters = {}
+    parameters = dict(parameters)
+    grid_fraction = parameters.pop('resilient_storage_grid_fraction', harboropt_screening._linear_program_defaults()['resilient_storage_grid_fraction'])
+    critical_load = read_critical_load(data_dir)
+
+    rows = []
+    lp = None
+    for iteration in range(max_iterations):
+        lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(data_dir = data_dir, solver_backend = solver_backend, resilient_storage_grid_fraction = grid_fraction, **parameters)
+        status = lp.solve(**solve_options)
+        row = {'grid_fraction': grid_fraction, 'status': status}
+        rows.append(row)
+        if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
+            grid_fraction = None
+            break
+
+        row['cost'] = lp.solver.Objective().Value()
+        row['resilient_mw'], capacity, energy = resilient_storage(lp, include_state_of_charge = False)
+        row['survival_probability'] = simulate_outages(lp, [outage_hours], critical_load_mw, data_dir, include_state_of_charge)[1][outage_hours]
+
+        required = required_reserve(critical_load * (row['resilient_mw'] if critical_load_mw is None else critical_load_mw), outage_hours, target_probability)
+        if capacity <= 0 or required > capacity:
+            print('The portfolio built with grid fraction %.4g has %.6g MWh of resilient storage, less than the %.6g MWh needed to survive %.1f%% of %d hour outages.' % (grid_fraction, capacity, required, 100 * target_probability, outage_hours))
+            grid_fraction = None
+            break
+
+        row['next_grid_fraction'] = 1 - required / capacity
+        print('Grid fraction %.4g: %.1f%% of %d hour outages survived, next grid fraction %.4g.' % (grid_fraction, 100 * row['survival_probability'], outage_hours, row['next_grid_fraction']))
+        if abs(row['next_grid_fraction'] - grid_fraction) <= tolerance or iteration == max_iterations - 1:
+            break
+        grid_fraction = row['next_grid_fraction']
+
+    return grid_fraction, lp, pd.DataFrame(rows)
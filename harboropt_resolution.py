@@ -0,0 +1,102 @@
+import time
+
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.linear_solver import linear_solver_pb2
+from ortools.linear_solver import pywraplp
+
+import harboropt_lp_storage_buildyear_emissions
+import harboropt_results
+
+#Capacity sizing on a mix of coarse and hourly timesteps.
+#
+#A full hourly LinearProgram has a block of dispatch variables and constraints for every hour, but most hours do not change which capacity is built.
+#solve_multi_resolution() first solves the model on coarse timesteps (see LinearProgram timesteps, ex. days), then repeatedly re-solves it with the coarse timesteps that matter most split into hours, keeping the rest coarse:
+# - Timesteps whose hourly limit constraints bind with the largest shadow prices (max generation, storage charge, discharge and state of charge, hydro power), which are the scarcity rents that pay for capacity.
+#   Demand binds in every timestep, so its shadow price (variable cost plus these rents) adds nothing to rank by.
+# - Timesteps with the largest aggregation error: how far the hourly net load (demand less nondispatchable output at the solved capacities) strays from its average over the timestep.
+#It stops when no capacity changes by more than tolerance times the largest capacity between two rounds, or when every timestep is hourly.
+#
+#   lp, history = harboropt_resolution.solve_multi_resolution(parameters = {'carbon_cost_per_ton': 50}, hours_per_timestep = 24, refine_fraction = 0.1)
+
+
+def _refinement_scores(lp, index, hourly_profiles, hourly_weights):
+
+    #Score of every timestep of a solved LinearProgram built on timesteps, where index is the timestep of every hour.
+    #The score is the timestep's share of the shadow prices of all hourly limit constraints plus its share of the aggregation error of the net load.
+    response = linear_solver_pb2.MPSolutionResponse()
+    lp.solver.FillSolutionResponseProto(response)
+    duals = np.abs(np.array(response.dual_value)[lp.hourly_limit_rows])
+    rent = np.bincount(lp.hourly_limit_hours, weights = duals, minlength = len(lp.timestep_hours))
+
+    #Hourly net load of the last build year at the solved capacities.
+    year = lp.build_years - 1
+    net_load = hourly_profiles['DEMAND'].values * lp.demand_scale[year]
+    values = lp.solution_values()
+    for resource in lp.nondisp.index:
+        capacity = sum(values[var.index()] for var in lp._capacity_through_year(lp.capacity_vars, resource, year))
+        net_load = net_load - capacity * hourly_profiles[resource].values / lp.profile_max[resource] * lp.capacity_factor_scale.get(resource, np.ones(lp.build_years))[year]
+    average = np.bincount(index, weights = net_load) / lp.timestep_hours
+    error = np.bincount(index, weights = np.abs(net_load - average[index]) * hourly_weights)
+
+    scores = np.zeros(len(lp.timestep_hours))
+    for measure in [rent, error]:
+        if measure.sum() > 0:
+            scores += measure / measure.sum()
+
+    return scores
+
+
+def solve_multi_resolution(parameters = None, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP', hours_per_timestep = 24, refine_fraction = 0.1, tolerance = 0.01, max_rounds = 10, **solve_options):
+
+    #Solve a LinearProgram with parameters (keyword arguments of LinearProgram, ex. {'carbon_cost_per_ton': 50}) on timesteps of hours_per_timestep hours, then refine it until its capacity results settle.
+    #Every round splits the refine_fraction of the first round's coarse timesteps with the highest scores (see _refinement_scores) into hours and rebuilds and re-solves the model.
+    #solve_options are passed to LinearProgram.solve (ex. time_limit).
+    #Returns the LinearProgram of the last round and a table with one row per round:
+    # 'timesteps': number of timesteps of the model.
+    # 'hourly_fraction': fraction of the hours that are hourly timesteps.
+    # 'status': pywraplp status of the solve.
+    # 'cost': objective value ($).
+    # 'capacity_change': largest change of any capacity from the previous round (MW).
+    # 'seconds': time to build and solve the model.
+    # One column per resource and storage resource with its capacity built over all build years (MW).
+    if parameters is None:
+        parameters = {}
+    weather_years = parameters.get('weather_years') or {'doscoe_profiles.csv': 1}
+    hourly_profiles, hourly_weights, starts = harboropt_lp_storage_buildyear_emissions.read_weather_profiles(data_dir, weather_years)
+    timesteps = harboropt_lp_storage_buildyear_emissions.coarse_timesteps(np.diff(starts + [len(hourly_profiles)]), hours_per_timestep)
+    refine_count = max(1, int(np.ceil(refine_fraction * sum(length > 1 for length in timesteps))))
+
+    rows = []
+    previous = None
+    for round_number in range(max_rounds):
+        start = time.time()
+        lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(data_dir = data_dir, solver_backend = solver_backend, timesteps = timesteps, **parameters)
+        status = lp.solve(**solve_options)
+        row = {'round': round_number, 'timesteps': len(timesteps), 'hourly_fraction': np.mean(np.repeat(np.array(timesteps) == 1, timesteps)), 'status': status}
+        if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
+            rows.append(row)
+            break
+
+        record = harboropt_results.results_record(lp)
+        capacity = np.concatenate([record['capacity'].ravel(), record['storage_capacity'].ravel()])
+        row['cost'] = lp.solver.Objective().Value()
+        row['capacity_change'] = np.inf if previous is None else np.abs(capacity - previous).max()
+        row['seconds'] = time.time() - start
+        for names, resource_capacity in [(record['resources'], record['capacity']), (record['storage_resources'], record['storage_capacity'])]:
+            row.update(zip(names, resource_capacity.sum(axis = 1)))
+        rows.append(row)
+        print('Round %d: %d timesteps, %.1f%% of hours hourly, largest capacity change %.6g MW.' % (round_number, len(timesteps), 100 * row['hourly_fraction'], row['capacity_change']))
+
+        if row['capacity_change'] <= tolerance * max(np.abs(capacity).max(), 1) or all(length == 1 for length in timesteps):
+            break
+
+        index = harboropt_lp_storage_buildyear_emissions.timestep_index(timesteps, len(hourly_profiles), starts)
+        scores = _refinement_scores(lp, index, hourly_profiles, hourly_weights)
+        coarse = np.flatnonzero(np.array(timesteps) > 1)
+        refine = set(coarse[np.argsort(scores[coarse])[::-1][:refine_count]])
+        timesteps = [length for t, length in enumerate(timesteps) for length in ([1] * length if t in refine else [length])]
+        previous = capacity
+
+    return lp, pd.DataFrame(rows).set_index('round')
@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import uuid
+
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+#Append-only results store for sweeps of harboropt LinearPrograms.
+#Each solved scenario is written as one compressed npz shard holding a compact record: scenario parameters, objective, status, capacity and annual generation per resource and build year, and optionally the hourly dispatch arrays.
+#Shards are never rewritten, so a sweep can be stopped and its results read (or plotted) at any point without re-solving, and the solver of each scenario can be released as soon as its record is written.
+
+#Keys become file names, so keep them to characters that are safe on every filesystem (ex. 'carbon_cost_per_ton=50').
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9._=,+-]+$')
+
+
+def results_record(lp, parameters = None, hourly = False):
+
+    #Collect the results of a solved LinearProgram into a dictionary of numpy arrays.
+    #Capacity and generation are (resource x build year) in MW and MWh per year. Nondispatchable generation uses the capacity built up to and including each year.
+    #Storage charge and discharge are annual MWh, with discharge counted as delivered energy (after efficiency).
+    #With several weather years (see LinearProgram weather_years), annual values are weighted averages over the weather years, and hourly arrays hold the stacked hours of every weather year.
+    #With timesteps (see LinearProgram timesteps), hourly arrays hold one value per timestep, in MW.
+    #If the solve was stopped by a time or iteration limit or cancelled (see LinearProgram.solve), the record has a 'reason', and the values are those of the best feasible solution found.
+    #If hourly is True, hourly generation of dispatchable resources and hourly charge, discharge and state of charge of storage are added as (resource x build year x hour) float32 arrays.
+    if parameters is None:
+        parameters = {}
+    build_years = lp.build_years
+
+    record = {}
+    record['parameters'] = np.array(json.dumps(parameters, sort_keys = True))
+    record['objective'] = np.array(lp.solver.Objective().Value())
+    record['status'] = np.array(-1 if lp.status is None else lp.status)
+    if lp.stop_reason is not None:
+        #Solve stopped early by a limit or cancellation: the record holds the best feasible solution found, if any.
+        record['reason'] = np.array('stopped: %s' % lp.stop_reason)
+        if lp.status != pywraplp.Solver.FEASIBLE:
+            record['objective'] = np.array(np.nan)
+
+    values = lp.solution_values()
+
+    resources = list(lp.resources.index)
+    capacity = values[[[var.index() for var in lp.capacity_vars[resource]] for resource in resources]].reshape(len(resources), build_years)
+
+    hourly_gen = values[lp.disp_gen_index]
+
+    generation = np.zeros((len(resources), build_years))
+    for i, resource in enumerate(resources):
+        if resource in lp.disp.index:
+            generation[i] = hourly_gen[lp.disp.index.get_loc(resource)] @ lp.hour_weights
+        else:
+            profile = lp.profiles[resource]
+            generation[i] = np.cumsum(capacity[i]) * ((profile.values @ lp.hour_weights) / lp.profile_max[resource]) * lp.capacity_factor_scale.get(resource, 1)
+
+    record['resources'] = np.array(resources, dtype = str)
+    record['capacity'] = capacity
+    record['generation'] = generation
+
+    storage_resources = list(lp.storage_capacity_vars)
+    storage_capacity = values[[[var.index() for var in lp.storage_capacity_vars[resource]] for resource in storage_resources]].reshape(len(storage_resources), build_years)
+    efficiency = lp.storage.loc[storage_resources, 'efficiency'].values.reshape(-1, 1, 1)
+
+    storage_rows = [lp.storage.index.get_loc(resource) for resource in storage_resources]
+    hourly_charge = values[lp.storage_charge_index[storage_rows]]
+    hourly_discharge = values[lp.storage_discharge_index[storage_rows]] * efficiency
+
+    record['storage_resources'] = np.array(storage_resources, dtype = str)
+    record['storage_capacity'] = storage_capacity
+    record['storage_charge'] = hourly_charge @ lp.hour_weights
+    record['storage_discharge'] = hourly_discharge @ lp.hour_weights
+
+    if hourly:
+        hourly_state_of_charge = values[lp.storage_state_of_charge_index[storage_rows]]
+
+        record['dispatchable_resources'] = np.array(list(lp.disp.index), dtype = str)
+        record['hourly_generation'] = hourly_gen.astype(np.float32)
+        record['hourly_charge'] = hourly_charge.astype(np.float32)
+        record['hourly_discharge'] = hourly_discharge.astype(np.float32)
+        record['hourly_state_of_charge'] = hourly_state_of_charge.astype(np.float32)
+
+    return record
+
+
+class ResultsStore(object):
+
+    def __init__(self, directory):
+
+        #Directory holding one '<key>.npz' shard per scenario. Created if it does not exist.
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def _path(self, key):
+
+        if not KEY_PATTERN.match(key):
+            raise ValueError('Results key %r can only contain letters, digits and . _ = , + -' % key)
+        return os.path.join(self.directory, key + '.npz')
+
+    def write(self, key, lp, parameters = None, hourly = False, release = True):
+
+        #Write the record of a solved LinearProgram under key and, if release is True, release its solver (see LinearProgram.release_solver).
+        #The shard is written to a temporary file and linked into place, so readers never see a partial shard and an existing key is never overwritten.
+        path = self._path(key)
+        if os.path.exists(path):
+            raise ValueError('Results for %r have already been written.' % key)
+
+        record = results_record(lp, parameters, hourly)
+        self._write_record(key, record)
+
+        if release:
+            lp.release_solver()
+
+        return path
+
+    def write_screened(self, key, status, reason, parameters = None, build_years = 0):
+
+        #Write a record for a scenario rejected by harboropt_screening.screen before it was built, with the pywraplp status it would have been solved to and the reason it was rejected.
+        #Capacity and generation arrays are empty, so capacity_table() skips the scenario.
+        if parameters is None:
+            parameters = {}
+        path = self._path(key)
+        if os.path.exists(path):
+            raise ValueError('Results for %r have already been written.' % key)
+
+        empty = np.zeros((0, build_years))
+        record = {'parameters': np.array(json.dumps(parameters, sort_keys = True)),
+                  'objective': np.array(np.nan),
+                  'status': np.array(status),
+                  'reason': np.array(reason),
+                  'resources': np.array([], dtype = str),
+                  'capacity': empty,
+                  'generation': empty,
+                  'storage_resources': np.array([], dtype = str),
+                  'storage_capacity': empty,
+                  'storage_charge': empty,
+                  'storage_discharge': empty}
+        self._write_record(key, record)
+
+        return path
+
+    def _write_record(self, key, record):
+
+        path = self._path(key)
+        record['key'] = np.array(key)
+
+        temp_path = os.path.join(self.directory, '.%s.%s.tmp' % (key, uuid.uuid4().hex))
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **record)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            raise ValueError('Results for %r have already been written.' % key)
+        finally:
+            os.remove(temp_path)
+
+    def __contains__(self, key):
+
+        return os.path.exists(self._path(key))
+
+    def keys(self):
+
+        #Keys of all written scenarios, in sorted order.
+        return sorted(name[:-len('.npz')] for name in os.listdir(self.directory) if name.endswith('.npz') and not name.startswith('.'))
+
+    def load(self, key):
+
+        #Full record of one scenario as a dictionary of numpy arrays, with parameters decoded back into a dictionary.
+        with np.load(self._path(key)) as shard:
+            record = {name: shard[name] for name in shard.files}
+        record['parameters'] = json.loads(str(record['parameters']))
+
+        return record
+
+    def table(self):
+
+        #One row per scenario, indexed by key, with the scenario parameters, objective, solver status and, for scenarios rejected by screening or stopped early, the reason they were not solved to optimality.
+        rows = []
+        for key in self.keys():
+            with np.load(self._path(key)) as shard:
+                row = {'key': key}
+                row.update(json.loads(str(shard['parameters'])))
+                row['objective'] = float(shard['objective'])
+                row['status'] = int(shard['status'])
+                row['reason'] = str(shard['reason']) if 'reason' in shard.files else ''
+            rows.append(row)
+
+        if not rows:
+            return pd.DataFrame(columns = ['key', 'objective', 'status', 'reason']).set_index('key')
+        return pd.DataFrame(rows).set_index('key')
+
+    def capacity_table(self):
+
+        #Long table of capacity and annual generation, indexed by (key, resource, build_year), including storage (generation is delivered discharge).
+        #ex. store.capacity_table()['capacity'].unstack('resource') gives a scenario x resource capacity table for plotting.
+        frames = []
+        for key in self.keys():
+            with np.load(self._path(key)) as shard:
+                for names, capacity, generation in [(shard['resources'], shard['capacity'], shard['generation']),
+                                                    (shard['storage_resources'], shard['storage_capacity'], shard['storage_discharge'])]:
+                    build_years = capacity.shape[1]
+                    frames.append(pd.DataFrame({'key': key,
+                                                'resource': np.repeat(names, build_years),
+                                                'build_year': np.tile(np.arange(build_years), len(names)),
+                                                'capacity': capacity.ravel(),
+                                                'generation': generation.ravel()}))
+
+        if not frames:
+            return pd.DataFrame(columns = ['key', 'resource', 'build_year', 'capacity', 'generation']).set_index(['key', 'resource', 'build_year'])
+        return pd.concat(frames, ignore_index = True).set_index(['key', 'resource', 'build_year'])
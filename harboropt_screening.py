@@ -0,0 +1,223 @@
+import collections
+import inspect
+import os
+
+import numpy as np # numerical library
+import pandas as pd
+
+import harboropt_lp_storage_buildyear_emissions
+
+#Pre-solve screening of harboropt scenarios.
+#screen() reads the input tables and, with a few vectorized array operations, finds scenarios that cannot have an optimal solution and a lower bound on the cost of the ones that can.
+#It takes milliseconds, so sweeps can skip building and solving scenarios that are infeasible, unbounded or more expensive than a known alternative.
+
+#status is 'ok', 'infeasible' or 'unbounded'. reason explains a rejection. cost_lower_bound is in objective units ($), -inf if no bound could be found.
+ScreeningResult = collections.namedtuple('ScreeningResult', ['status', 'reason', 'cost_lower_bound'])
+
+EMISSIONS = ['CO2', 'PM2.5', 'NOX', 'SO2', 'PM10']
+
+#Hydro limits of the model (see LinearProgram._add_constraints_and_costs).
+HYDRO_MAX_ENERGY = 13808000
+HYDRO_MAX_POWER = 9594.8
+
+
+def _linear_program_defaults():
+
+    signature = inspect.signature(harboropt_lp_storage_buildyear_emissions.LinearProgram.__init__)
+    return {name: parameter.default for name, parameter in signature.parameters.items() if name != 'self'}
+
+
+def screen(**parameters):
+
+    #Screen a scenario given the keyword arguments it would be passed to LinearProgram with (including data_dir).
+    #The checks are necessary conditions only: a scenario that passes can still turn out infeasible, but a rejected scenario never has an optimal solution.
+    # unbounded: a capacity variable has a negative cost coefficient (ex. large diesel genset credits on replacement storage). Capacity is not limited, so the solver could build an unlimited amount of it.
+    # infeasible: DEMAND in the last build year cannot be met by the resources that can supply power in each hour, or by the hydro energy limit.
+    #The lower bound relaxes the hourly coupling: every MWh of demand is met by the cheapest resource at its cheapest cost per MWh (ignoring the capital cost of dispatchable resources), and hydro is limited by its power and energy limits only.
+    #With several weather_years every year is checked, and the lower bound is the weighted sum of the bounds of each year.
+    #With timesteps, the profiles and emissions are averaged over the timesteps like in LinearProgram, so the bound holds for the model on timesteps.
+    p = _linear_program_defaults()
+    unknown = set(parameters) - set(p)
+    if unknown:
+        raise TypeError('Unknown LinearProgram parameters: %s' % sorted(unknown))
+    p.update(parameters)
+    data_dir = p['data_dir']
+
+    weather_years = p['weather_years'] or {'doscoe_profiles.csv': 1}
+    profiles, hour_weights, starts = harboropt_lp_storage_buildyear_emissions.read_weather_profiles(data_dir, weather_years)
+    resources = pd.read_csv(os.path.join(data_dir, 'doscoe_resources.csv')).set_index('resource')
+    storage = pd.read_csv(os.path.join(data_dir, 'storage.csv')).set_index('resource')
+    wholegrid_emissions = pd.read_csv(os.path.join(data_dir, 'whole_grid_emissions.csv'))
+    outofbasin_emissions = pd.read_csv(os.path.join(data_dir, 'outofbasin_emissions.csv'))
+
+    #Per build year scales of LinearProgram (demand_scale, capacity_factor_scale, grid_emissions_scale). The bound uses their last build year values.
+    ones = np.ones(p['build_years'])
+    demand_scale = np.asarray(p['demand_scale'] if p['demand_scale'] is not None else ones, dtype = float)
+    grid_emissions_scale = np.asarray(p['grid_emissions_scale'] if p['grid_emissions_scale'] is not None else ones, dtype = float)
+    capacity_factor_scale = pd.DataFrame(np.ones((len(resources), p['build_years'])), index = resources.index)
+    for resource, scale in (p['capacity_factor_scale'] or {}).items():
+        capacity_factor_scale.loc[resource] = np.asarray(scale, dtype = float)
+    profiles = profiles.copy()
+    profiles['DEMAND'] *= demand_scale[-1]
+    if len(weather_years) > 1:
+        wholegrid_emissions = harboropt_lp_storage_buildyear_emissions._repeat_for_weather_years(wholegrid_emissions, starts, len(profiles))
+        outofbasin_emissions = harboropt_lp_storage_buildyear_emissions._repeat_for_weather_years(outofbasin_emissions, starts, len(profiles))
+
+    disp = resources.loc[resources['dispatchable'] == 'y']
+    nondisp = resources.loc[resources['dispatchable'] == 'n']
+    storage = storage.loc[storage['legacy'] == 'n']
+
+    build_years = p['build_years']
+    years = np.arange(build_years)
+    growth_rate = 1.0 + p['discount_rate']
+    if p['discount_rate'] == 0:
+        #As in LinearProgram.discount_factor_from_cost.
+        discounting_factor = np.full(build_years, float(p['cost']))
+    else:
+        discounting_factor = p['cost'] * (1.0 - growth_rate ** -(p['timespan'] - years)) / (1.0 - 1.0 / growth_rate)
+    last_year_factor = discounting_factor[-1]
+
+    prices = np.array([p['carbon_cost_per_ton'], p['pm25_cost_per_ton'], p['nox_cost_per_ton'], p['so2_cost_per_ton'], p['pm10_cost_per_ton']])
+    grid_monetized_emissions = (wholegrid_emissions[EMISSIONS].values @ prices) * grid_emissions_scale[-1]
+    outofbasin_monetized_emissions = (outofbasin_emissions[EMISSIONS].values @ prices) * grid_emissions_scale[-1]
+
+    #Cost coefficients of the capacity variables, (resource x build year).
+    capex_decline = (1 - resources['annual capex decline'].values[:, None]) ** years
+    capex = resources['capex'].values[:, None] * capex_decline
+    fixed = resources['fixed'].values[:, None] * discounting_factor
+    capacity_cost = pd.DataFrame(capex + fixed, index = resources.index)
+
+    #Nondispatchable profiles are normalized by their hourly peak, before any averaging over timesteps (see LinearProgram).
+    profile_max = profiles[nondisp.index].max()
+    year_weights = hour_weights[starts]
+    timestep_hours = np.ones(len(profiles))
+    if p['timesteps'] is not None:
+        index = harboropt_lp_storage_buildyear_emissions.timestep_index(p['timesteps'], len(profiles), starts)
+        timestep_hours = np.bincount(index).astype(float)
+        profiles = profiles.groupby(index).mean()
+        grid_monetized_emissions = pd.Series(grid_monetized_emissions).groupby(index).mean().values
+        outofbasin_monetized_emissions = pd.Series(outofbasin_monetized_emissions).groupby(index).mean().values
+        hour_weights = np.bincount(index, weights = hour_weights)
+        starts = [int(index[start]) for start in starts]
+    profile_sum = hour_weights @ (profiles[nondisp.index] / profile_max)
+    nondisp_monetized_emissions = nondisp[EMISSIONS].values @ prices
+    nondisp_variable_cost = (nondisp['variable'].values + nondisp_monetized_emissions) * profile_sum.values
+    capacity_cost.loc[nondisp.index] += nondisp_variable_cost[:, None] * capacity_factor_scale.loc[nondisp.index].values * discounting_factor
+
+    storage_capex = storage['capex ($/MW)'].values[:, None] * (1 - storage['annual capex decline'].values[:, None]) ** years
+    resilient = (storage['resilient'] == 'y').values
+    incentive = p['storage_resilience_incentive_per_kwh'] * 1000 * storage['storage_duration (hrs)'].values
+    storage_capex[resilient] = np.maximum(storage_capex[resilient] - incentive[resilient, None], 0)
+    storage_fixed = storage['fixed ($/MW-year)'].values[:, None] * discounting_factor
+    storage_cost = pd.DataFrame(storage_capex + storage_fixed, index = storage.index)
+    if 'diesel_genset_replacement_storage_4hr' in storage.index:
+        diesel_monetized_emissions = (np.array([p['diesel_genset_carbon_per_mw'], p['diesel_genset_pm25_per_mw'], p['diesel_genset_nox_per_mw'], p['diesel_genset_so2_per_mw'], p['diesel_genset_pm10_per_mw']]) @ prices)
+        diesel_fuel_cost = p['diesel_genset_mmbtu_per_mwh'] * p['diesel_genset_cost_per_mmbtu'] * p['diesel_genset_hours_per_year']
+        diesel_credit = (diesel_monetized_emissions + diesel_fuel_cost + p['diesel_genset_fixed_cost_per_mw_year']) * discounting_factor
+        storage_cost.loc['diesel_genset_replacement_storage_4hr'] -= diesel_credit
+
+    for costs in [capacity_cost, storage_cost]:
+        negative = costs.values < 0
+        if negative.any():
+            resource_index, year = np.argwhere(negative)[0]
+            return ScreeningResult('unbounded', 'capacity cost of %s in build year %d is negative (%.6g), so unlimited capacity would be built.' % (costs.index[resource_index], year, costs.values[resource_index, year]), -np.inf)
+
+    ends = list(starts[1:]) + [len(profiles)]
+    cost_lower_bound = 0.0
+    for start, end, weight in zip(starts, ends, year_weights):
+        year_profiles = profiles.iloc[start:end].reset_index(drop = True)
+        result = _screen_weather_year(year_profiles, timestep_hours[start:end], profile_max, disp, nondisp, storage, capacity_cost, storage_cost, capacity_factor_scale[p['build_years'] - 1], grid_monetized_emissions[start:end], outofbasin_monetized_emissions[start:end], last_year_factor, prices, p)
+        if result.status != 'ok':
+            if len(starts) > 1:
+                result = result._replace(reason = 'weather year %s: %s' % (list(weather_years)[starts.index(start)], result.reason))
+            return result
+        cost_lower_bound += weight * result.cost_lower_bound
+
+    return ScreeningResult('ok', '', cost_lower_bound)
+
+
+def _screen_weather_year(profiles, timestep_hours, profile_max, disp, nondisp, storage, capacity_cost, storage_cost, capacity_factor_scale, grid_monetized_emissions, outofbasin_monetized_emissions, last_year_factor, prices, p):
+
+    #Infeasibility checks and cost lower bound of one weather year, given the capacity cost coefficients of screen().
+    #profiles hold one row per timestep of timestep_hours hours (1 without timesteps), with the average demand (MW) of the timestep, and energy counts every timestep for its length.
+    #Hourly cost per MWh of each way to meet demand in the last build year.
+    demand = profiles['DEMAND'].values
+    energy = demand * timestep_hours
+    hours = len(demand)
+    profile_sum = timestep_hours @ (profiles[nondisp.index] / profile_max)
+    unlimited_costs = [np.full(hours, np.inf)]
+    hydro_cost = None
+    for resource in disp.index:
+        if resource == 'outofbasin':
+            variable_cost = disp.loc[resource, 'variable'] + outofbasin_monetized_emissions + p['transmission_cost_per_mwh']
+        elif 'NG' in resource:
+            variable_cost = disp.loc[resource, 'variable'] + disp.loc[resource, 'heat_rate'] * p['gas_fuel_cost'] + disp.loc[resource, EMISSIONS].values @ prices
+        else:
+            variable_cost = disp.loc[resource, 'variable'] + disp.loc[resource, EMISSIONS].values @ prices
+        variable_cost = np.broadcast_to(variable_cost * last_year_factor, (hours,))
+        if resource == 'HYDROPOWER':
+            hydro_cost = variable_cost
+        else:
+            unlimited_costs.append(variable_cost)
+
+    #Nondispatchable resources can only serve hours where their profile is above zero, at their average cost per MWh generated.
+    #Their capacity delivers its normalized profile in each hour, and dispatchable capacity its MW, both times their capacity factor scale in the last build year.
+    capacity_costs = [np.full(hours, np.inf)]
+    for resource in disp.index:
+        if resource != 'HYDROPOWER' and capacity_factor_scale[resource] > 0:
+            capacity_costs.append(np.full(hours, capacity_cost.loc[resource].min() / capacity_factor_scale[resource]))
+    for resource in nondisp.index:
+        if profile_sum[resource] > 0 and capacity_factor_scale[resource] > 0:
+            profile = profiles[resource].values / profile_max[resource] * capacity_factor_scale[resource]
+            cost_per_mwh = capacity_cost.loc[resource].min() / (profile_sum[resource] * capacity_factor_scale[resource])
+            unlimited_costs.append(np.where(profile > 0, cost_per_mwh, np.inf))
+            with np.errstate(divide = 'ignore'):
+                capacity_costs.append(np.where(profile > 0, capacity_cost.loc[resource].min() / profile, np.inf))
+
+    #Storage charges from the grid, so it can discharge in any hour at the cheapest cost of charging.
+    #Its capacity delivers up to its grid share of capacity times efficiency in each hour.
+    for resource in storage.index:
+        efficiency = storage.loc[resource, 'efficiency']
+        charge_cost = storage.loc[resource, 'variable ($/MWh)'] + grid_monetized_emissions
+        unlimited_costs.append(np.full(hours, charge_cost.min() / efficiency))
+        grid_fraction = p['resilient_storage_grid_fraction'] if storage.loc[resource, 'resilient'] == 'y' else 1
+        capacity_costs.append(np.full(hours, storage_cost.loc[resource].min() / (grid_fraction * efficiency)))
+
+    unlimited_cost = np.min(unlimited_costs, axis = 0)
+
+    #Hours with demand that only hydro can serve.
+    hydro_only = np.isinf(unlimited_cost) & (demand > 0)
+    if hydro_only.any():
+        if hydro_cost is None:
+            return ScreeningResult('infeasible', 'no resource can supply power in %d hours with demand (first: hour %d).' % (hydro_only.sum(), np.argmax(hydro_only)), np.inf)
+        over_hydro_power = hydro_only & (demand > HYDRO_MAX_POWER)
+        if over_hydro_power.any():
+            return ScreeningResult('infeasible', 'demand exceeds the hydro power limit in %d hours that no other resource can serve (first: hour %d).' % (over_hydro_power.sum(), np.argmax(over_hydro_power)), np.inf)
+        if energy[hydro_only].sum() > HYDRO_MAX_ENERGY:
+            return ScreeningResult('infeasible', 'demand in hours that only hydro can serve (%.6g MWh) exceeds the hydro energy limit.' % energy[hydro_only].sum(), np.inf)
+
+    served = demand > 0
+    if (unlimited_cost[served & ~hydro_only] < 0).any() or (hydro_cost is not None and (hydro_cost < 0).any()):
+        return ScreeningResult('ok', '', -np.inf)
+
+    #Energy bound: hydro replaces the unlimited resources where it saves the most, within its power and energy limits.
+    energy_lower_bound = energy[served & ~hydro_only] @ unlimited_cost[served & ~hydro_only]
+    if hydro_cost is not None:
+        energy_lower_bound += energy[hydro_only] @ hydro_cost[hydro_only]
+        energy_left = HYDRO_MAX_ENERGY - energy[hydro_only].sum()
+        savings = np.where(served & ~hydro_only, unlimited_cost - hydro_cost, 0)
+        hydro_energy = np.where(served & ~hydro_only, np.minimum(demand, HYDRO_MAX_POWER) * timestep_hours, 0)
+        order = np.argsort(-savings)
+        savings = savings[order]
+        hydro_energy = hydro_energy[order]
+        hydro_energy = np.clip(np.minimum(hydro_energy, energy_left - (np.cumsum(hydro_energy) - hydro_energy)), 0, None)
+        energy_lower_bound -= savings[savings > 0] @ hydro_energy[savings > 0]
+
+    #Capacity bound: in every hour, demand above the hydro power limit and the existing capacity of legacy resources (free in the model) needs capacity, bought at the cheapest cost per MW delivered in that hour.
+    legacy = disp.loc[disp['legacy'] == 'y']
+    legacy_mw = sum(legacy.loc[resource, 'existing_mw'] * capacity_factor_scale[resource] for resource in legacy.index)
+    residual_demand = np.maximum(demand - (HYDRO_MAX_POWER if hydro_cost is not None else 0) - legacy_mw, 0)
+    capacity_cost_per_mw = np.min(capacity_costs, axis = 0)
+    capacity_lower_bound = np.max(np.where(residual_demand > 0, residual_demand * capacity_cost_per_mw, 0))
+
+    return ScreeningResult('ok', '', max(energy_lower_bound, capacity_lower_bound))
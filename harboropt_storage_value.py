@@ -0,0 +1,132 @@
+import collections
+import os
+
+import numpy as np # numerical library
+import pandas as pd
+
+from ortools.graph.python import min_cost_flow
+
+import harboropt_lp_storage_buildyear_emissions
+
+#Price-taker valuation of storage.
+#
+#Given hourly prices (ex. the marginal energy cost of a solved LinearProgram, see model_prices, the duals of the demand constraints of a gridsim model, or the monetized emissions of the grid, see grid_emissions_prices),
+#optimal_dispatch() finds the charge and discharge schedule of one storage resource that earns the most, without solving a capacity expansion model:
+# - Storage charges from the grid at charge_prices (default prices) plus its variable cost, and every MWh discharged delivers efficiency MWh at prices, as in LinearProgram.
+# - The state of charge changes by charge less discharge every hour, stays within the energy capacity (power times duration) and ends where it started.
+#That LP is a min cost flow: energy flows from the grid into the hour it is charged, is carried from hour to hour up to the energy capacity, and leaves in the hour it is discharged.
+#It is solved exactly with the network solver of OR-Tools on integer flows of 1 kW per MW of power, in milliseconds for a year, so dozens of storage durations and efficiencies can be screened at once (see screen_storage).
+#Storage does not change the prices (it is a price taker), so the value is an upper bound on what the storage would earn in a model where it moves them.
+#LinearProgram charges storage from the whole grid, paying only its variable cost and the monetized emissions of the grid, so to value storage as the model does use charge_prices = grid_emissions_prices(lp).
+#
+#   lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(carbon_cost_per_ton = 50)
+#   lp.solve()
+#   values = harboropt_storage_value.storage_values(harboropt_storage_value.model_prices(lp), charge_prices = harboropt_storage_value.grid_emissions_prices(lp))
+
+#Flow units per MW of power and cost units per $/MWh of the min cost flow.
+POWER_UNITS = 1000
+COST_UNITS = 10000
+
+#Schedule of optimal_dispatch: value ($ over the prices), and arrays of the hourly charge and discharge (MW) and state of charge at the end of every hour (MWh).
+StorageDispatch = collections.namedtuple('StorageDispatch', ['value', 'charge', 'discharge', 'state_of_charge'])
+
+
+def optimal_dispatch(prices, duration, efficiency = 1., power = 1., charge_prices = None, variable_cost = 0., initial_state_of_charge = 0.):
+
+    #Most valuable dispatch of storage of power (MW) and duration (hours of energy at full power) at hourly prices ($/MWh), a StorageDispatch.
+    #Charging costs charge_prices (default prices) plus variable_cost ($/MWh). The state of charge starts from and ends at initial_state_of_charge (MWh).
+    #Power and energy are rounded to POWER_UNITS per MW, and prices to 1 / COST_UNITS $/MWh to choose the schedule. The value is computed from the exact prices.
+    prices = np.asarray(prices, dtype = float)
+    charge_prices = prices if charge_prices is None else np.asarray(charge_prices, dtype = float)
+    hours = len(prices)
+    if hours == 0 or len(charge_prices) != hours or not (np.isfinite(prices).all() and np.isfinite(charge_prices).all()):
+        raise ValueError('prices and charge_prices must be finite and of the same length, got %d and %d hours.' % (hours, len(charge_prices)))
+    capacity = int(round(power * POWER_UNITS))
+    energy = int(round(power * duration * POWER_UNITS))
+    initial = int(round(initial_state_of_charge * POWER_UNITS))
+    if capacity < 0 or energy < 0 or not 0 <= initial <= energy:
+        raise ValueError('power and duration must be >= 0 and initial_state_of_charge within the energy capacity, got power %s, duration %s and initial_state_of_charge %s.' % (power, duration, initial_state_of_charge))
+
+    #Nodes are the hours, the grid (source) and the load (sink). Arcs: charge (grid to hour), state of charge (hour to next hour), discharge (hour to load), and a free arc from grid to load for the energy storage does not move.
+    hour = np.arange(hours)
+    source = hours
+    sink = hours + 1
+    tails = np.concatenate([np.full(hours, source), hour[:-1], hour, [source]])
+    heads = np.concatenate([hour, hour[1:], np.full(hours, sink), [sink]])
+    capacities = np.concatenate([np.full(hours, capacity), np.full(hours - 1, energy), np.full(hours, capacity), [hours * capacity]])
+    costs = np.concatenate([charge_prices + variable_cost, np.zeros(hours - 1), -efficiency * prices, [0]])
+
+    flow = min_cost_flow.SimpleMinCostFlow()
+    flow.add_arcs_with_capacity_and_unit_cost(tails.astype(np.int32), heads.astype(np.int32), capacities.astype(np.int64), np.round(costs * COST_UNITS).astype(np.int64))
+    supplies = np.zeros(hours + 2, dtype = np.int64)
+    supplies[source] = hours * capacity
+    supplies[sink] = -hours * capacity
+    supplies[0] += initial
+    supplies[hours - 1] -= initial
+    flow.set_nodes_supplies(np.arange(hours + 2, dtype = np.int32), supplies)
+    status = flow.solve()
+    if status != flow.OPTIMAL:
+        raise ValueError('The storage dispatch could not be solved (min cost flow status %s).' % status)
+
+    flows = flow.flows(np.arange(flow.num_arcs(), dtype = np.int32)) / POWER_UNITS
+    charge = flows[:hours]
+    discharge = flows[2 * hours - 1:3 * hours - 1]
+    state_of_charge = np.append(flows[hours:2 * hours - 1], initial / POWER_UNITS)
+    value = efficiency * prices @ discharge - (charge_prices + variable_cost) @ charge
+
+    return StorageDispatch(value, charge, discharge, state_of_charge)
+
+
+def _dispatch_summary(dispatch, duration, efficiency):
+
+    #Value and use per MW of power of a StorageDispatch of 1 MW.
+    return {'value_per_mw': dispatch.value, 'value_per_mwh': dispatch.value / duration if duration > 0 else np.nan,
+            'charged_mwh': dispatch.charge.sum(), 'delivered_mwh': efficiency * dispatch.discharge.sum(), 'cycles': dispatch.discharge.sum() / duration if duration > 0 else np.nan}
+
+
+def storage_values(prices, storage = None, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, charge_prices = None, initial_state_of_charge = 0.):
+
+    #Value of 1 MW of every storage resource of storage (a table like storage.csv indexed by resource, default storage.csv in data_dir) at hourly prices (see optimal_dispatch), with its efficiency, duration and variable cost.
+    #Returns a DataFrame indexed by resource with 'value_per_mw' ($ per MW of power over the prices), 'value_per_mwh' ($ per MWh of energy capacity), 'charged_mwh' and 'delivered_mwh' (per MW) and 'cycles' (full discharges).
+    #Values depend on power only through this scale, so the value of P MW is P times value_per_mw.
+    if storage is None:
+        storage = pd.read_csv(os.path.join(data_dir, 'storage.csv')).set_index('resource')
+    rows = {}
+    for resource in storage.index:
+        duration = float(storage.loc[resource, 'storage_duration (hrs)'])
+        efficiency = float(storage.loc[resource, 'efficiency'])
+        dispatch = optimal_dispatch(prices, duration, efficiency, 1., charge_prices, float(storage.loc[resource, 'variable ($/MWh)']), initial_state_of_charge)
+        rows[resource] = _dispatch_summary(dispatch, duration, efficiency)
+
+    return pd.DataFrame.from_dict(rows, orient = 'index').rename_axis('resource')
+
+
+def screen_storage(prices, durations, efficiencies, charge_prices = None, variable_cost = 0.):
+
+    #Value of 1 MW of storage for every combination of durations (hours) and efficiencies at hourly prices (see optimal_dispatch).
+    #Returns a DataFrame indexed by duration and efficiency with the columns of storage_values.
+    rows = {}
+    for duration in durations:
+        for efficiency in efficiencies:
+            dispatch = optimal_dispatch(prices, duration, efficiency, 1., charge_prices, variable_cost)
+            rows[(duration, efficiency)] = _dispatch_summary(dispatch, duration, efficiency)
+
+    table = pd.DataFrame.from_dict(rows, orient = 'index')
+    table.index.names = ['duration', 'efficiency']
+    return table
+
+
+def model_prices(lp, build_year = -1):
+
+    #Hourly marginal energy cost ($/MWh, undiscounted) of a solved LinearProgram in build_year: the shadow price of its fulfill demand constraints (see sensitivity_results).
+    #With timesteps, every hour gets the price of its timestep.
+    prices = lp.sensitivity_results()['marginal_energy_cost'].iloc[:, build_year].values
+    return np.repeat(prices, lp.timestep_hours.astype(int))
+
+
+def grid_emissions_prices(lp, build_year = -1):
+
+    #Hourly monetized emissions of the whole grid ($/MWh) at the emissions prices of a LinearProgram (carbon_cost_per_ton, ...) in build_year, what storage pays for the emissions of the energy it charges.
+    #With timesteps, every hour gets the emissions of its timestep.
+    prices = lp._monetized_emissions(lp.wholegrid_emissions) * lp.grid_emissions_scale[build_year]
+    return np.repeat(np.asarray(prices, dtype = float), lp.timestep_hours.astype(int))
@@ -0,0 +1,358 @@
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+
+from ortools.linear_solver import pywraplp
+
+import harboropt_lp_storage_buildyear_emissions
+import harboropt_results
+import harboropt_screening
+
+#Headless batch runs of harboropt LinearPrograms from a scenario file, ex.
+#
+#   python harboropt_sweep.py scenarios/carbon_sweep.json --workers 4 --output-dir results/carbon_sweep
+#
+#A scenario file (JSON, TOML or YAML) holds:
+# parameters: base keyword arguments of LinearProgram shared by every scenario.
+# sweep: parameter name -> list of values. One scenario is run for every combination of the values.
+# data_dir, solver, workers, executor, output_dir, hourly, screen, max_cost, time_limit, iteration_limit, scaling, template: optional run settings (see main() for their defaults). Relative paths are relative to the scenario file.
+#Before a scenario is built it is screened (see harboropt_screening.screen). Scenarios that are provably infeasible or unbounded, or whose cost lower bound exceeds max_cost, are recorded with their reason instead of being solved.
+#time_limit (seconds) and iteration_limit stop a scenario's solve early (see LinearProgram.solve), so one pathological scenario cannot hold a worker for hours. Its best feasible solution is written with the reason it stopped.
+#Every scenario is written to a harboropt_results.ResultsStore in output_dir under a key built from its swept values (ex. 'carbon_cost_per_ton=50,gas_fuel_cost=8').
+#
+#Sweeps are resumable: output_dir also holds a manifest of the sweep's scenarios and settings, and re-running the same sweep skips every scenario that already has results.
+#A scenario that was being solved when the sweep stopped is solved again from the start, since the solvers cannot save and reload a partial solve.
+#
+#With template, a sweep that only changes prices (see harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS) builds the model once in the parent process.
+#Workers are forked from it and share its memory copy-on-write (or load it from its pickled model proto where processes cannot be forked).
+#Every scenario then only updates the objective coefficients and demand bounds of the worker's copy and re-solves it from the basis of the worker's previous scenario.
+#
+#With executor 'thread', scenarios run in a pool of threads of one process instead of worker processes. The solvers release the GIL while they solve, so threads solve in parallel without copying the Python process into every worker.
+#Every scenario still builds its own LinearProgram (or, with template, every thread loads its own copy of the template), since a solver can only run one solve at a time.
+
+MANIFEST = 'sweep_manifest.json'
+
+SETTINGS = ['parameters', 'sweep', 'data_dir', 'solver', 'workers', 'output_dir', 'hourly', 'screen', 'max_cost', 'time_limit', 'iteration_limit', 'scaling', 'template', 'executor']
+
+STATUS_NAMES = {pywraplp.Solver.OPTIMAL: 'OPTIMAL', pywraplp.Solver.FEASIBLE: 'FEASIBLE', pywraplp.Solver.INFEASIBLE: 'INFEASIBLE',
+                pywraplp.Solver.UNBOUNDED: 'UNBOUNDED', pywraplp.Solver.ABNORMAL: 'ABNORMAL', pywraplp.Solver.NOT_SOLVED: 'NOT_SOLVED'}
+
+
+def load_scenario_file(path):
+
+    #Read a scenario file into a dictionary, choosing the format from the file extension.
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as f:
+            config = json.load(f)
+    elif extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            #Python < 3.11.
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    elif extension in ['.yaml', '.yml']:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('Reading YAML scenario files requires PyYAML (pip install pyyaml).')
+        with open(path) as f:
+            config = yaml.safe_load(f)
+    else:
+        raise ValueError('Scenario file must be .json, .toml, .yaml or .yml, got %r.' % path)
+
+    unknown = set(config) - set(SETTINGS)
+    if unknown:
+        raise ValueError('Unknown scenario file settings: %s. Expected some of %s.' % (sorted(unknown), SETTINGS))
+
+    #Resolve paths in the file relative to the file itself.
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for setting in ['data_dir', 'output_dir']:
+        if setting in config:
+            config[setting] = os.path.join(base_dir, config[setting])
+
+    return config
+
+
+def scenario_key(swept_parameters):
+
+    #Results key of a scenario, built from its swept parameter values in sweep order.
+    #Keys are file names (see harboropt_results.KEY_PATTERN): a list of numbers is joined with '_' (ex. demand_scale=1_1.02_1.04), and any other value that is not safe in a file name is replaced by a short hash of it.
+    if not swept_parameters:
+        return 'base'
+    return ','.join('%s=%s' % (name, _key_value(value)) for name, value in swept_parameters.items())
+
+
+def _key_value(value):
+
+    if isinstance(value, (list, tuple)) and all(isinstance(item, (int, float)) for item in value):
+        text = '_'.join(str(item) for item in value)
+    else:
+        text = str(value)
+    if harboropt_results.KEY_PATTERN.match(text) and ',' not in text and '=' not in text:
+        return text
+    return hashlib.sha1(json.dumps(value, sort_keys = True, default = str).encode()).hexdigest()[:12]
+
+
+def sweep_scenarios(parameters = None, sweep = None):
+
+    #List of (key, LinearProgram keyword arguments) for every combination of the sweep values, on top of the base parameters.
+    parameters = dict(parameters or {})
+    sweep = dict(sweep or {})
+
+    scenarios = []
+    for values in itertools.product(*sweep.values()):
+        swept_parameters = dict(zip(sweep.keys(), values))
+        scenario_parameters = dict(parameters)
+        scenario_parameters.update(swept_parameters)
+        scenarios.append((scenario_key(swept_parameters), scenario_parameters))
+
+    return scenarios
+
+
+def write_manifest(output_dir, scenarios, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP'):
+
+    #Record the scenarios and settings of a sweep in output_dir. If a manifest already exists, check that the sweep matches it, so results of different models never mix in one store.
+    #Adding scenarios to an existing sweep is allowed (ex. a new value on a sweep axis).
+    path = os.path.join(output_dir, MANIFEST)
+    settings = {'data_dir': os.path.abspath(data_dir), 'solver_backend': solver_backend}
+    manifest = {'settings': settings, 'scenarios': {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest['settings'] != settings:
+            raise ValueError('Sweep settings %s do not match the settings %s of the sweep already in %s.' % (settings, manifest['settings'], output_dir))
+
+    #Compare parameters as they would be read back from the manifest.
+    scenarios = json.loads(json.dumps(dict(scenarios)))
+    conflicting = [key for key in scenarios if key in manifest['scenarios'] and manifest['scenarios'][key] != scenarios[key]]
+    if conflicting:
+        raise ValueError('Parameters of scenarios %s do not match the sweep already in %s.' % (conflicting, output_dir))
+    manifest['scenarios'].update(scenarios)
+
+    os.makedirs(output_dir, exist_ok = True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    os.replace(temp_path, path)
+
+    return manifest
+
+
+def sweep_progress(output_dir):
+
+    #Finished and remaining scenario keys of the sweep recorded in output_dir.
+    with open(os.path.join(output_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    store = harboropt_results.ResultsStore(output_dir)
+    finished = [key for key in manifest['scenarios'] if key in store]
+    remaining = [key for key in manifest['scenarios'] if key not in store]
+
+    return finished, remaining
+
+
+SCREENED_STATUS = {'infeasible': pywraplp.Solver.INFEASIBLE, 'unbounded': pywraplp.Solver.UNBOUNDED}
+
+EXECUTORS = ['process', 'thread']
+
+#Model built once by the parent of a template sweep, set in every worker process or thread by _set_template. Every thread of a thread pool holds its own copy.
+_template = threading.local()
+
+
+def _set_template(template):
+
+    _template.model = template
+
+
+def _load_template(pickled_template):
+
+    #Thread pool initializer: give the thread its own copy of the pickled template.
+    _set_template(pickle.loads(pickled_template))
+
+
+def build_template(scenarios, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP'):
+
+    #Build the LinearProgram shared by (key, parameters) scenarios that differ only in harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS, with the parameters of the first scenario.
+    #prune_dominated_resources is not applied to the template, so it keeps every resource.
+    parameters = scenarios[0][1]
+    for key, scenario_parameters in scenarios:
+        differing = sorted(name for name in set(parameters) | set(scenario_parameters)
+                           if name not in scenario_parameters or name not in parameters or scenario_parameters[name] != parameters[name])
+        fixed = [name for name in differing if name not in harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS or name not in scenario_parameters or name not in parameters]
+        if fixed:
+            raise ValueError('A template sweep can only change %s between scenarios, but %s changes %s.' % (harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS, key, fixed))
+
+    #Which resources are dominated depends on the prices, so a pruned model cannot be updated (see update_parameters). Pruning leaves the optimum unchanged, so build the template without it.
+    if parameters.get('prune_dominated_resources'):
+        print('Building the template without prune_dominated_resources, since a pruned model cannot be updated to the prices of other scenarios. The optimal cost of every scenario is unchanged.')
+        parameters = dict(parameters, prune_dominated_resources = False)
+
+    start = time.time()
+    template = harboropt_lp_storage_buildyear_emissions.LinearProgram(data_dir = data_dir, solver_backend = solver_backend, **parameters)
+    print('Built the template model in %.1f s' % (time.time() - start))
+
+    return template
+
+
+def run_scenario(key, parameters, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP', output_dir = 'results', hourly = False, screen = True, max_cost = None, time_limit = None, iteration_limit = None, scaling = False, template = False):
+
+    #Build, solve and write one scenario, then release its solver. Returns (key, status, objective, seconds).
+    #With template, the model built by build_template (see _set_template) is updated to the scenario's parameters and solved instead, and is kept for the next scenario.
+    #If the scenario has already been written to output_dir, its stored status and objective are returned without solving again.
+    #If screen is True, scenarios rejected by harboropt_screening.screen are written with write_screened and not built. Scenarios whose cost lower bound exceeds max_cost are written as NOT_SOLVED.
+    #Scenarios whose model is refused for its memory_budget_mb are written with write_screened as NOT_SOLVED too.
+    #Kept at module level so it can be sent to process pool workers.
+    start = time.time()
+    store = harboropt_results.ResultsStore(output_dir)
+    if key in store:
+        record = store.load(key)
+        return key, int(record['status']), float(record['objective']), 0.0
+
+    if screen:
+        screening = harboropt_screening.screen(data_dir = data_dir, **parameters)
+        status = SCREENED_STATUS.get(screening.status)
+        reason = screening.reason
+        if status is None and max_cost is not None and screening.cost_lower_bound > max_cost:
+            status = pywraplp.Solver.NOT_SOLVED
+            reason = 'cost lower bound %.6g exceeds max_cost %.6g.' % (screening.cost_lower_bound, max_cost)
+        if status is not None:
+            build_years = parameters.get('build_years', harboropt_screening._linear_program_defaults()['build_years'])
+            store.write_screened(key, status, 'screened: ' + reason, parameters, build_years)
+            return key, status, float('nan'), time.time() - start
+
+    if template:
+        lp = _template.model
+        lp.update_parameters(**{name: value for name, value in parameters.items() if name in harboropt_lp_storage_buildyear_emissions.UPDATABLE_PARAMETERS})
+    else:
+        try:
+            lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(data_dir = data_dir, solver_backend = solver_backend, **parameters)
+        except MemoryError as error:
+            #Refused by the memory_budget_mb of its parameters (see LinearProgram memory_policy), or the build ran out of memory: record it and go on with the sweep.
+            build_years = parameters.get('build_years', harboropt_screening._linear_program_defaults()['build_years'])
+            store.write_screened(key, pywraplp.Solver.NOT_SOLVED, 'refused: %s' % error, parameters, build_years)
+            return key, pywraplp.Solver.NOT_SOLVED, float('nan'), time.time() - start
+    status = lp.solve(time_limit = time_limit, iteration_limit = iteration_limit, scaling = scaling)
+    store.write(key, lp, parameters, hourly = hourly, release = not template)
+    objective = float(store.load(key)['objective'])
+
+    return key, status, objective, time.time() - start
+
+
+def run_sweep(scenarios, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP', output_dir = 'results', workers = 1, hourly = False, screen = True, max_cost = None, time_limit = None, iteration_limit = None, scaling = False, template = False, executor = 'process'):
+
+    #Run (key, parameters) scenarios, in parallel processes if workers > 1, and return their (key, status, objective, seconds) in the order they finish.
+    #Scenarios that already have results in output_dir are skipped. Progress is printed as each scenario finishes.
+    #With template, the model is built once by build_template and every worker updates its own copy for each scenario.
+    #executor is 'process' (worker processes) or 'thread' (threads of this process) when workers > 1.
+    if executor not in EXECUTORS:
+        raise ValueError('executor must be one of %s, got %r.' % (EXECUTORS, executor))
+    write_manifest(output_dir, scenarios, data_dir, solver_backend)
+    store = harboropt_results.ResultsStore(output_dir)
+    remaining = [(key, parameters) for key, parameters in scenarios if key not in store]
+    if len(remaining) < len(scenarios):
+        print('Resuming sweep: %d of %d scenarios already finished' % (len(scenarios) - len(remaining), len(scenarios)))
+    scenarios = remaining
+
+    model = None
+    if template and scenarios:
+        model = build_template(scenarios, data_dir, solver_backend)
+    template = model is not None
+
+    results = []
+    if workers > 1:
+        #Forked workers share the template's memory until they change it. Elsewhere it is pickled to every worker once.
+        #Threads share this process, so each one loads its own copy of the template.
+        executor_options = {}
+        pool = concurrent.futures.ProcessPoolExecutor
+        if executor == 'thread':
+            pool = concurrent.futures.ThreadPoolExecutor
+            if template:
+                executor_options = {'initializer': _load_template, 'initargs': (pickle.dumps(model),)}
+        elif template:
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            executor_options = {'mp_context': context, 'initializer': _set_template, 'initargs': (model,)}
+        with pool(max_workers = workers, **executor_options) as executor:
+            futures = [executor.submit(run_scenario, key, parameters, data_dir, solver_backend, output_dir, hourly, screen, max_cost, time_limit, iteration_limit, scaling, template) for key, parameters in scenarios]
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+                _print_progress(results[-1], len(results), len(scenarios))
+    else:
+        _set_template(model)
+        for key, parameters in scenarios:
+            results.append(run_scenario(key, parameters, data_dir, solver_backend, output_dir, hourly, screen, max_cost, time_limit, iteration_limit, scaling, template))
+            _print_progress(results[-1], len(results), len(scenarios))
+        _set_template(None)
+
+    return results
+
+
+def _print_progress(result, done, total):
+
+    key, status, objective, seconds = result
+    print('[%d/%d] %s: %s, objective %.6g, %.1f s' % (done, total, key, STATUS_NAMES.get(status, status), objective, seconds))
+    sys.stdout.flush()
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Run a sweep of harboropt LinearPrograms from a JSON, TOML or YAML scenario file.')
+    parser.add_argument('scenario_file')
+    parser.add_argument('--output-dir', help = 'directory for results (default: output_dir in the scenario file, else results)')
+    parser.add_argument('--data-dir', help = 'directory of input csv files (default: data_dir in the scenario file, else the data directory next to this script)')
+    parser.add_argument('--solver', choices = sorted(harboropt_lp_storage_buildyear_emissions.SOLVER_BACKENDS), help = 'LP solver backend (default: solver in the scenario file, else GLOP)')
+    parser.add_argument('--workers', type = int, help = 'number of parallel worker processes or threads (default: workers in the scenario file, else 1)')
+    parser.add_argument('--executor', choices = EXECUTORS, help = 'run workers as processes or as threads of one process (default: executor in the scenario file, else process)')
+    parser.add_argument('--hourly', action = 'store_true', default = None, help = 'also write hourly dispatch arrays')
+    parser.add_argument('--no-screen', action = 'store_true', help = 'build and solve every scenario without screening it first')
+    parser.add_argument('--max-cost', type = float, help = 'skip scenarios whose cost lower bound exceeds this objective value (default: max_cost in the scenario file, else none)')
+    parser.add_argument('--time-limit', type = float, help = 'seconds after which a scenario\'s solve is stopped and its best feasible solution written (default: time_limit in the scenario file, else none)')
+    parser.add_argument('--iteration-limit', type = int, help = 'simplex iterations after which a scenario\'s solve is stopped, GLOP only (default: iteration_limit in the scenario file, else none)')
+    parser.add_argument('--scaling', action = 'store_true', default = None, help = 'solve an equilibrated copy of every model (default: scaling in the scenario file, else off)')
+    parser.add_argument('--template', action = 'store_true', default = None, help = 'build the model once and only update its prices for every scenario; the sweep may only change prices (default: template in the scenario file, else off)')
+    parser.add_argument('--status', action = 'store_true', help = 'print how many scenarios of the sweep are finished instead of running it')
+    args = parser.parse_args(argv)
+
+    config = load_scenario_file(args.scenario_file)
+    scenarios = sweep_scenarios(config.get('parameters'), config.get('sweep'))
+
+    data_dir = args.data_dir or config.get('data_dir', harboropt_lp_storage_buildyear_emissions.DATA_DIR)
+    solver_backend = args.solver or config.get('solver', 'GLOP')
+    output_dir = args.output_dir or config.get('output_dir', 'results')
+    workers = args.workers or config.get('workers', 1)
+    hourly = args.hourly if args.hourly is not None else config.get('hourly', False)
+    screen = not args.no_screen and config.get('screen', True)
+    max_cost = args.max_cost if args.max_cost is not None else config.get('max_cost')
+    time_limit = args.time_limit if args.time_limit is not None else config.get('time_limit')
+    iteration_limit = args.iteration_limit if args.iteration_limit is not None else config.get('iteration_limit')
+    scaling = args.scaling if args.scaling is not None else config.get('scaling', False)
+    template = args.template if args.template is not None else config.get('template', False)
+    executor = args.executor or config.get('executor', 'process')
+
+    if args.status:
+        if not os.path.exists(os.path.join(output_dir, MANIFEST)):
+            print('No sweep has been started in %s' % output_dir)
+            return
+        finished, remaining = sweep_progress(output_dir)
+        print('%d of %d scenarios finished in %s' % (len(finished), len(finished) + len(remaining), output_dir))
+        for key in remaining:
+            print('remaining: %s' % key)
+        return
+
+    print('Running %d scenarios with %d %s workers, writing results to %s' % (len(scenarios), workers, executor, output_dir))
+    start = time.time()
+    results = run_sweep(scenarios, data_dir, solver_backend, output_dir, workers, hourly, screen, max_cost, time_limit, iteration_limit, scaling, template, executor)
+    print('Finished %d scenarios in %.1f s' % (len(results), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+import multiprocessing
+import pickle
+import time
+import traceback
+
+import numpy as np # numerical library
+
+from ortools.linear_solver import pywraplp
+
+import harboropt_lp_storage_buildyear_emissions
+
+#Capacity sizing against several weighted weather or demand years without building one model of all of them.
+#
+#LinearProgram(weather_years = {...}) stacks the hourly dispatch blocks of every weather year into one model, so its size grows with the number of years times 8760 hours.
+#solve_weather_years() instead solves the same problem by Benders decomposition:
+# - A small master LP holds only the capacity variables and one cost estimate per weather year, bounded below by cuts.
+# - Each weather year is a separate single-year LinearProgram (the dispatch subproblem), built once in a worker process and re-solved with the capacities proposed by the master.
+#   Its optimal cost and the reduced costs of its capacity variables give a cut: a linear lower bound on that year's cost as a function of capacity.
+#Only one weather year's hourly model is held per subproblem, and the subproblems are built and solved in parallel worker processes.
+#
+#Subproblems must have a solution for any proposed capacity, so each one can build capacity beyond the master's proposal at shortfall_cost_per_mw on top of its regular cost.
+#With a shortfall cost well above any capacity cost the master learns to propose enough capacity, and the result matches the stacked model.
+#The first proposal is no capacity at all. Its subproblems size every weather year on its own, and the second proposal is the largest of those capacities, which gives a good first upper bound.
+#
+#   result = harboropt_weather.solve_weather_years({'profiles_2018.csv': 1, 'profiles_2019.csv': 1, 'profiles_2020.csv': 1}, parameters = {'carbon_cost_per_ton': 50}, workers = 3)
+
+
+def _capacity_variables(lp):
+
+    #(name, variable) of every capacity variable of a LinearProgram, in a fixed order.
+    variables = []
+    for capacity_vars in [lp.capacity_vars, lp.storage_capacity_vars]:
+        for resource, capacity_by_build_year in capacity_vars.items():
+            for year, var in enumerate(capacity_by_build_year):
+                variables.append(('%s_%d' % (resource, year), var))
+
+    return variables
+
+
+def _subproblem_worker(connection, weather_files, parameters, data_dir, solver_backend):
+
+    #Run _serve_subproblems, and send any exception it raises back on connection so that solve_weather_years re-raises it.
+    #Kept at module level so it can be the target of a worker process.
+    try:
+        _serve_subproblems(connection, weather_files, parameters, data_dir, solver_backend)
+    except Exception as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(traceback.format_exc())
+        try:
+            connection.send(error)
+        except OSError:
+            pass
+    finally:
+        connection.close()
+
+
+def _serve_subproblems(connection, weather_files, parameters, data_dir, solver_backend):
+
+    #Build the single-year subproblems of weather_files and send back the capacity variable names and the largest capacity cost coefficient.
+    #Then receive the shortfall cost, and solve the subproblems for every capacity array received on connection until None is received.
+    subproblems = {}
+    for weather_file in weather_files:
+        lp = harboropt_lp_storage_buildyear_emissions.LinearProgram(data_dir = data_dir, solver_backend = solver_backend, weather_years = {weather_file: 1}, **parameters)
+        variables = _capacity_variables(lp)
+        capacity_cost = np.array([lp.objective.GetCoefficient(var) for name, var in variables])
+        subproblems[weather_file] = (lp, variables, capacity_cost)
+
+    connection.send(([name for name, var in variables], max(np.abs(capacity_cost).max() for lp, variables, capacity_cost in subproblems.values())))
+    shortfall_cost_per_mw = connection.recv()
+
+    #Capacity is paid for by the master. Capacity beyond its proposal costs its regular cost plus the shortfall cost.
+    for lp, variables, capacity_cost in subproblems.values():
+        for (name, var), cost in zip(variables, capacity_cost):
+            lp.objective.SetCoefficient(var, cost + shortfall_cost_per_mw)
+
+    while True:
+        capacity = connection.recv()
+        if capacity is None:
+            break
+
+        results = {}
+        for weather_file, (lp, variables, capacity_cost) in subproblems.items():
+            for (name, var), value in zip(variables, capacity):
+                var.SetLb(value)
+            status = lp.solve()
+            if status != pywraplp.Solver.OPTIMAL:
+                results[weather_file] = (status, np.nan, None, None)
+                continue
+
+            #Cost of the weather year at the proposed capacity, with capacity above the proposal at its regular cost plus the shortfall cost.
+            built = np.array([var.solution_value() for name, var in variables])
+            value = lp.objective.Value() - shortfall_cost_per_mw * np.sum(capacity)
+            #Derivative of that cost with respect to the proposed capacity.
+            slope = np.array([var.reduced_cost() for name, var in variables]) - shortfall_cost_per_mw
+            results[weather_file] = (status, value, slope, built - capacity)
+
+        connection.send(results)
+
+
+def _receive(connection):
+
+    #Next message of a worker, re-raising the exception the worker failed with.
+    try:
+        message = connection.recv()
+    except EOFError:
+        raise RuntimeError('A weather year worker exited without sending its results.')
+    if isinstance(message, Exception):
+        raise message
+    return message
+
+
+def _add_cut(master, capacity_vars, cost_vars, weather_file, constant, slope):
+
+    #Cut: cost of the weather year >= constant + slope @ capacity.
+    cut = master.Constraint(constant, master.infinity())
+    cut.SetCoefficient(cost_vars[weather_file], 1)
+    for var, coefficient in zip(capacity_vars, slope):
+        cut.SetCoefficient(var, -coefficient)
+
+
+def _master(names, weights, max_capacity, cuts):
+
+    #Master LP: capacity variables, one cost estimate per weather year, and the cuts found so far. Minimizes the weighted cost estimates.
+    master = pywraplp.Solver('HarborOptimizationMaster', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+    capacity_vars = [master.NumVar(0, max_capacity, name) for name in names]
+    cost_vars = {weather_file: master.NumVar(-master.infinity(), master.infinity(), 'cost_' + weather_file) for weather_file in weights}
+    objective = master.Objective()
+    for weather_file, var in cost_vars.items():
+        objective.SetCoefficient(var, weights[weather_file])
+    objective.SetMinimization()
+    for cut in cuts:
+        _add_cut(master, capacity_vars, cost_vars, *cut)
+
+    return master, capacity_vars, cost_vars
+
+
+def solve_weather_years(weather_years, parameters = None, data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR, solver_backend = 'GLOP', workers = 1,
+                        tolerance = 1e-4, max_iterations = 200, shortfall_cost_per_mw = None, max_capacity = None):
+
+    #Size capacity against weather_years ({profile csv in data_dir: weight}) with per-year dispatch subproblems in up to workers processes.
+    #parameters are the other keyword arguments of LinearProgram. Stops when the gap between the best cost found and the master's lower bound is below tolerance (relative).
+    #shortfall_cost_per_mw defaults to 10 times the largest capacity cost coefficient.
+    #max_capacity bounds every capacity variable (MW) so that early master solves are bounded, by default 5 times the highest hourly demand of any weather year.
+    #Returns a dictionary with:
+    # 'status': pywraplp status of the decomposition: OPTIMAL if it converged, FEASIBLE if it stopped at max_iterations, or the status of a failing subproblem or master solve.
+    # 'objective' and 'lower_bound': best weighted cost found and the master's lower bound ($).
+    # 'capacity': {capacity variable name ('<resource>_<build year>'): MW} of the best capacities found.
+    # 'shortfall': largest capacity any weather year had to build beyond the best capacities (MW), 0 once the master has learned every year's needs.
+    # 'iterations', 'seconds'.
+    start = time.time()
+    if parameters is None:
+        parameters = {}
+    #Pruning depends on the profiles, so the subproblems of different weather years could keep different capacity variables, which are matched up by position. Pruning leaves the optimum unchanged, so build them without it.
+    if parameters.get('prune_dominated_resources'):
+        print('Building the weather year subproblems without prune_dominated_resources, since every weather year must have the same capacity variables. The optimal cost is unchanged.')
+        parameters = dict(parameters, prune_dominated_resources = False)
+    total_weight = float(sum(weather_years.values()))
+    weights = {weather_file: weight / total_weight for weather_file, weight in weather_years.items()}
+
+    if max_capacity is None:
+        profiles, hour_weights, starts = harboropt_lp_storage_buildyear_emissions.read_weather_profiles(data_dir, weather_years)
+        max_capacity = 5 * profiles['DEMAND'].max()
+
+    #Start the workers, each holding the subproblems of some of the weather years.
+    weather_files = list(weather_years)
+    workers = max(1, min(workers, len(weather_files)))
+    connections = []
+    processes = []
+    try:
+        for w in range(workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target = _subproblem_worker, args = (worker_connection, weather_files[w::workers], parameters, data_dir, solver_backend))
+            process.start()
+            #Close this process's copy of the worker's end, so that recv() raises EOFError instead of waiting forever if the worker dies.
+            worker_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        started = [_receive(connection) for connection in connections]
+        names = started[0][0]
+        if shortfall_cost_per_mw is None:
+            shortfall_cost_per_mw = 10 * max(largest_cost for variable_names, largest_cost in started)
+        for connection in connections:
+            connection.send(shortfall_cost_per_mw)
+
+        cuts = []
+        master, capacity_vars, cost_vars = _master(names, weights, max_capacity, cuts)
+
+        capacity = np.zeros(len(names))
+        best = {'objective': np.inf, 'capacity': capacity, 'shortfall': np.nan}
+        lower_bound = -np.inf
+        status = pywraplp.Solver.FEASIBLE
+        for iteration in range(1, max_iterations + 1):
+            for connection in connections:
+                connection.send(capacity)
+            results = {}
+            for connection in connections:
+                results.update(_receive(connection))
+
+            failed = [result[0] for result in results.values() if result[0] != pywraplp.Solver.OPTIMAL]
+            if failed:
+                status = failed[0]
+                break
+
+            objective = sum(weights[weather_file] * result[1] for weather_file, result in results.items())
+            if objective < best['objective']:
+                shortfall = max(result[3].max() for result in results.values())
+                best = {'objective': objective, 'capacity': capacity, 'shortfall': max(shortfall, 0)}
+
+            #Cut: cost of each weather year >= its cost at the proposed capacity plus its slope times the change in capacity.
+            for weather_file, (result_status, value, slope, extra) in results.items():
+                cuts.append((weather_file, value - slope @ capacity, slope))
+                _add_cut(master, capacity_vars, cost_vars, *cuts[-1])
+
+            if iteration == 1:
+                #Start the master from the largest capacity any weather year builds on its own.
+                capacity = np.max([result[3] for result in results.values()], axis = 0)
+                continue
+
+            master_status = master.Solve()
+            if master_status == pywraplp.Solver.ABNORMAL:
+                #Re-solving from the previous basis can run into numerical trouble. Solve a fresh copy of the master instead.
+                master, capacity_vars, cost_vars = _master(names, weights, max_capacity, cuts)
+                master_status = master.Solve()
+            if master_status != pywraplp.Solver.OPTIMAL:
+                status = master_status
+                break
+            lower_bound = master.Objective().Value()
+
+            print('Iteration %d: best cost %.8g, lower bound %.8g' % (iteration, best['objective'], lower_bound))
+            if best['objective'] - lower_bound <= tolerance * abs(best['objective']):
+                status = pywraplp.Solver.OPTIMAL
+                break
+            capacity = np.array([var.solution_value() for var in capacity_vars])
+
+    finally:
+        #Stop the workers. A worker that has failed or is still solving is terminated.
+        for connection in connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in processes:
+            process.join(timeout = 10)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    if (best['capacity'] >= max_capacity * (1 - 1e-9)).any():
+        print('Some capacities are at max_capacity (%.6g MW). Increase max_capacity.' % max_capacity)
+
+    return {'status': status,
+            'objective': best['objective'],
+            'lower_bound': lower_bound,
+            'capacity': dict(zip(names, best['capacity'])),
+            'shortfall': best['shortfall'],
+            'iterations': iteration,
+            'seconds': time.time() - start}
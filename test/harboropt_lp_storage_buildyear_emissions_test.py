@@ -0,0 +1,346 @@
+"""Tests for harboropt_lp_storage_buildyear_emissions on a week of data."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+import unittest
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+
+import numpy.testing as npt
+import pandas as pd
+
+from ortools.linear_solver import linear_solver_pb2
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+PROFILES = 'doscoe_profiles.csv'
+FIRST_WEEK = 'first_week.csv'
+SECOND_WEEK = 'second_week.csv'
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+def build(**parameters):
+    """LinearProgram of the week of data with the test prices."""
+
+    return LinearProgram(data_dir = DATA_DIR, **dict(week_data.PARAMETERS, **parameters))
+
+
+def solve(**parameters):
+    """Objective of a cold solve of the week of data."""
+
+    lp = build(**parameters)
+    assert lp.solve() == pywraplp.Solver.OPTIMAL
+    return lp.solver.Objective().Value()
+
+
+def nonzeros(lp):
+    """Matrix coefficients of the built model."""
+
+    model = linear_solver_pb2.MPModelProto()
+    lp.solver.ExportModelToProto(model)
+    return sum(len(row.var_index) for row in model.constraint)
+
+
+class InstalledCapacityTest(unittest.TestCase):
+    """Installed capacity variables only change how the model is written down."""
+
+    def testSameOptimum(self):
+        """Installed capacity variables give the same optimum over several build years."""
+
+        parameters = dict(carbon_cost_per_ton = 80, build_years = 3, demand_scale = [1, 1.1, 1.2])
+        lp = build(installed_capacity_vars = True, **parameters)
+        lp.solve()
+        self.assertAlmostEqual(lp.solver.Objective().Value() / solve(**parameters), 1, places = 6)
+
+    def testFewerNonzeros(self):
+        """Hourly rows reference one installed capacity column instead of every earlier build year."""
+
+        self.assertLess(nonzeros(build(build_years = 3, installed_capacity_vars = True)), nonzeros(build(build_years = 3)))
+
+
+class SolveTest(unittest.TestCase):
+    """Solve options must not change the optimum."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.objective = solve(carbon_cost_per_ton = 80)
+
+    def assertSameObjective(self, lp):
+        self.assertEqual(lp.status, pywraplp.Solver.OPTIMAL)
+        self.assertAlmostEqual(lp.solver.Objective().Value() / self.objective, 1, places = 6)
+
+    def testWarmStartMatchesColdSolve(self):
+        """A warm start from a neighboring price finds the cold solve's optimum."""
+
+        previous = build(carbon_cost_per_ton = 50)
+        previous.solve()
+        lp = build(carbon_cost_per_ton = 80)
+        lp.solve(warm_start = previous)
+        self.assertSameObjective(lp)
+
+        # The warm solver has been handed over.
+        with self.assertRaises(ValueError):
+            build(carbon_cost_per_ton = 80).solve(warm_start = previous)
+
+    def testUpdateParametersMatchesRebuild(self):
+        """Updating the prices of a solved model gives the optimum of a rebuilt one."""
+
+        lp = build(carbon_cost_per_ton = 50)
+        lp.solve()
+        lp.update_parameters(carbon_cost_per_ton = 80)
+        lp.solve()
+        self.assertSameObjective(lp)
+
+        with self.assertRaises(ValueError):
+            lp.update_parameters(build_years = 2)
+
+    def testScaling(self):
+        """Solving the scaled model and unscaling its solution gives the same optimum and solution."""
+
+        lp = build(carbon_cost_per_ton = 80)
+        lp.solve(scaling = True)
+        self.assertSameObjective(lp)
+        unscaled = build(carbon_cost_per_ton = 80)
+        unscaled.solve()
+        npt.assert_allclose(lp.solution_values()[lp.disp_gen_index].sum(), unscaled.solution_values()[unscaled.disp_gen_index].sum(), rtol = 1e-6)
+
+    def testPruningPreservesObjective(self):
+        """Pruned resources are never needed at the optimum."""
+
+        lp = build(carbon_cost_per_ton = 80, prune_dominated_resources = True)
+        lp.solve()
+        self.assertSameObjective(lp)
+        self.assertTrue(lp.dominated_resources)
+        for resource in lp.dominated_resources:
+            self.assertNotIn(resource, lp.resources.index)
+            self.assertNotIn(resource, lp.storage.index)
+
+
+class LimitsTest(unittest.TestCase):
+    """Stopped solves report why they stopped."""
+
+    def testIterationLimit(self):
+        lp = build()
+        status = lp.solve(iteration_limit = 1)
+        self.assertIn(status, [pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED])
+        self.assertEqual(lp.stop_reason, 'iteration limit')
+
+    def testTimeLimit(self):
+        lp = build()
+        status = lp.solve(time_limit = 0)
+        self.assertIn(status, [pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED])
+        self.assertEqual(lp.stop_reason, 'time limit')
+
+    def testCancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        lp = build()
+        status = lp.solve(cancel = cancel)
+        self.assertIn(status, [pywraplp.Solver.FEASIBLE, pywraplp.Solver.NOT_SOLVED])
+        self.assertEqual(lp.stop_reason, 'cancelled')
+
+    def testNoLimitReached(self):
+        lp = build()
+        self.assertEqual(lp.solve(time_limit = 600, iteration_limit = 10**7), pywraplp.Solver.OPTIMAL)
+        self.assertIsNone(lp.stop_reason)
+
+
+class WeatherYearsTest(unittest.TestCase):
+    """Stacked weather years and timesteps."""
+
+    def testStackingTheSameYear(self):
+        """Two equal weather years of half weight each have the optimum of the single year."""
+
+        stacked = solve(weather_years = {PROFILES: 0.5, FIRST_WEEK: 0.5})
+        self.assertAlmostEqual(stacked / solve(), 1, places = 6)
+
+    def testHourlyTimesteps(self):
+        """Timesteps of one hour are the hourly model."""
+
+        self.assertAlmostEqual(solve(timesteps = [1] * week_data.HOURS) / solve(), 1, places = 6)
+
+    def testTimestepsKeepAnnualSums(self):
+        lp = build(weather_years = {PROFILES: 0.5, SECOND_WEEK: 0.5}, timesteps = [24] * 14)
+        self.assertEqual(len(lp.profiles), 14)
+        self.assertEqual(lp.weather_year_starts, [0, 7])
+        npt.assert_allclose(lp.timestep_hours, 24)
+        npt.assert_allclose(lp.hour_weights.sum(), week_data.HOURS)
+
+    def testTimestepsMustCoverTheYears(self):
+        with self.assertRaises(ValueError):
+            build(timesteps = [24] * 6)
+
+
+class YearScaleTest(unittest.TestCase):
+    """Per build year scales are applied as the model is built."""
+
+    def testDemandScale(self):
+        """Scaling demand in the last build year is the same as scaling the demand profile."""
+
+        profiles = pd.read_csv(os.path.join(DATA_DIR, 'doscoe_profiles.csv'))
+        profiles['DEMAND'] *= 1.1
+        profiles.to_csv(os.path.join(DATA_DIR, 'scaled_demand.csv'), index = False)
+        scaled = solve(weather_years = {'scaled_demand.csv': 1})
+        self.assertAlmostEqual(solve(demand_scale = [1.1]) / scaled, 1, places = 6)
+
+    def testScalesNeedOneValuePerBuildYear(self):
+        with self.assertRaises(ValueError):
+            build(build_years = 2, demand_scale = [1, 1.1, 1.2])
+        with self.assertRaises(ValueError):
+            build(capacity_factor_scale = {'TIDAL': [1]})
+
+
+class SensitivityTest(unittest.TestCase):
+    """Shadow prices are in $/MWh of every hour's own build year and weather year."""
+
+    def testSingleYear(self):
+        lp = build(build_years = 2, demand_scale = [1, 1.1])
+        lp.solve()
+        results = lp.sensitivity_results()
+        self.assertEqual(results['marginal_energy_cost'].shape, (week_data.HOURS, 2))
+        self.assertGreater(results['marginal_energy_cost'].values[:, -1].min(), 0)
+
+        # Unbuilt resources have a nonnegative reduced cost, and stay unbuilt at any higher cost.
+        capacity = results['capacity']
+        unbuilt = capacity[capacity['capacity'] <= 1e-7]
+        self.assertTrue((unbuilt['reduced_cost'] >= -1e-6).all())
+        npt.assert_allclose(unbuilt['cost_lower'], unbuilt['cost'] - unbuilt['reduced_cost'].clip(lower = 0))
+
+    def testStackedWeatherYears(self):
+        """Stacking the same year twice gives the shadow prices of the single year."""
+
+        parameters = dict(build_years = 2, demand_scale = [1, 1.1])
+        single = build(**parameters)
+        single.solve()
+        stacked = build(weather_years = {PROFILES: 0.5, FIRST_WEEK: 0.5}, **parameters)
+        stacked.solve()
+        single_results = single.sensitivity_results()
+        stacked_results = stacked.sensitivity_results()
+
+        energy_cost = single_results['marginal_energy_cost'].values
+        self.assertGreater(energy_cost[:, -1].min(), 0)
+        stacked_energy_cost = stacked_results['marginal_energy_cost'].values
+        self.assertEqual(stacked_energy_cost.shape, (2 * week_data.HOURS, 2))
+        # The capacity cost of the peak hour can be split either way between the two copies, so compare their average.
+        npt.assert_allclose((stacked_energy_cost[:week_data.HOURS] + stacked_energy_cost[week_data.HOURS:]) / 2, energy_cost, rtol = 1e-6, atol = 1e-6)
+
+        hydro_energy = stacked_results['hydro_energy']
+        self.assertEqual(list(hydro_energy.index), [(0, PROFILES), (0, FIRST_WEEK), (1, PROFILES), (1, FIRST_WEEK)])
+        npt.assert_allclose(hydro_energy.groupby(level = 'build_year').mean().values, single_results['hydro_energy'].values, atol = 1e-6)
+
+        npt.assert_allclose(stacked_results['capacity']['capacity'].values, single_results['capacity']['capacity'].values, rtol = 1e-6, atol = 1e-6)
+
+
+class ModelSizeTest(unittest.TestCase):
+    """The size estimate matches the model that is built."""
+
+    def assertEstimateMatches(self, lp):
+        self.assertEqual(lp.memory_estimate['variables'], lp.solver.NumVariables())
+        self.assertEqual(lp.memory_estimate['rows'], lp.solver.NumConstraints())
+        # Zero coefficients of nondispatchable profiles are counted, but dropped by the solver.
+        self.assertGreaterEqual(lp.memory_estimate['nonzeros'], nonzeros(lp))
+
+    def testEstimate(self):
+        self.assertEstimateMatches(build())
+        self.assertEstimateMatches(build(build_years = 2, installed_capacity_vars = True))
+        self.assertEstimateMatches(build(build_years = 3, weather_years = {PROFILES: 0.5, SECOND_WEEK: 0.5}))
+
+    def testRefusePolicy(self):
+        with self.assertRaises(MemoryError):
+            build(memory_budget_mb = 0.001)
+
+    def testWarnPolicy(self):
+        lp = build(memory_budget_mb = 0.001, memory_policy = 'warn')
+        self.assertEqual(len(lp.profiles), week_data.HOURS)
+
+    def testReducePolicy(self):
+        """The reduced model fits the budget on coarser timesteps."""
+
+        budget = build().memory_estimate['memory_mb'] / 2
+        lp = build(memory_budget_mb = budget, memory_policy = 'reduce')
+        self.assertLess(len(lp.profiles), week_data.HOURS)
+        self.assertLessEqual(lp.memory_estimate['memory_mb'], budget)
+        self.assertEqual(lp.timestep_hours.sum(), week_data.HOURS)
+        self.assertEqual(lp.solve(), pywraplp.Solver.OPTIMAL)
+
+    def testUnknownPolicy(self):
+        with self.assertRaises(ValueError):
+            build(memory_policy = 'ignore')
+
+
+class VariablesTest(unittest.TestCase):
+    """Hourly variables are kept as column indices."""
+
+    def testVariableViews(self):
+        """Variable views resolve the columns of the index arrays."""
+
+        lp = build(build_years = 2)
+        for r, resource in enumerate(lp.disp.index):
+            self.assertEqual([variable.index() for variable in lp.disp_gen[resource]], list(lp.disp_gen_index[r].ravel()))
+        for r, resource in enumerate(lp.storage.index):
+            self.assertEqual([variable.index() for variable in lp.storage_state_of_charge_vars[resource]], list(lp.storage_state_of_charge_index[r].ravel()))
+        self.assertIs(lp.disp_gen, lp.disp_gen)
+
+    def testSolutionValues(self):
+        lp = build()
+        lp.solve()
+        values = lp.solution_values()
+        self.assertEqual(len(values), lp.solver.NumVariables())
+        npt.assert_allclose(lp.solution_values(lp.disp_gen_index), values[lp.disp_gen_index])
+        self.assertAlmostEqual(values[lp.disp_gen_index[0, 0, 0]], lp.disp_gen[lp.disp.index[0]][0].solution_value())
+
+    def testResults(self):
+        """Capacity and generation results read the solution of every build year and weather year."""
+
+        lp = build(build_years = 2, demand_scale = [1, 1.1], installed_capacity_vars = True)
+        lp.solve()
+        self.assertAlmostEqual(sum(lp.capacity_results().values()), 1)
+        # Demand only has to be met in the last build year.
+        demand = (lp.profiles['DEMAND'].values @ lp.hour_weights) * lp.demand_scale[-1]
+        self.assertGreaterEqual(lp.gen_results(), demand * (1 - 1e-9))
+
+        single = build()
+        single.solve()
+        stacked = build(weather_years = {PROFILES: 0.5, FIRST_WEEK: 0.5})
+        stacked.solve()
+        self.assertAlmostEqual(stacked.gen_results() / single.gen_results(), 1, places = 6)
+
+    def testRelease(self):
+        """A released model has no solver left."""
+
+        lp = build()
+        lp.solve()
+        lp.release_solver()
+        self.assertIsNone(lp.solver)
+        self.assertEqual(lp.fulfill_demand_constraints, [])
+
+    def testPickle(self):
+        """A pickled model solves to the same optimum."""
+
+        lp = build()
+        lp.solve()
+        copy = pickle.loads(pickle.dumps(lp))
+        self.assertIsNone(copy.status)
+        copy.solve()
+        self.assertAlmostEqual(copy.solver.Objective().Value() / lp.solver.Objective().Value(), 1, places = 6)
+        self.assertEqual([variable.index() for variable in copy.disp_gen['HYDROPOWER']], [variable.index() for variable in lp.disp_gen['HYDROPOWER']])
+
+
+if __name__ == '__main__':
+    unittest.main()
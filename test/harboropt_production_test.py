@@ -0,0 +1,75 @@
+"""Tests for harboropt_production on a week of data."""
+
+import shutil
+import tempfile
+
+import unittest
+
+import harboropt_production
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+
+import numpy.testing as npt
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+class ProductionCostTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.lp = LinearProgram(data_dir = DATA_DIR, **week_data.PARAMETERS)
+        cls.lp.solve()
+
+    def dispatch_cost(self):
+        """Dispatch cost of the last build year of the LinearProgram's own solution."""
+
+        charge_costs, gen_costs = self.lp._dispatch_costs()
+        values = self.lp.solution_values()
+        return (charge_costs[:, -1] * values[self.lp.storage_charge_index[:, -1]]).sum() + (gen_costs[:, -1] * values[self.lp.disp_gen_index[:, -1]]).sum()
+
+    def testMatchesLinearProgram(self):
+        """Dispatching the optimal portfolio in windows costs what the LinearProgram's dispatch costs."""
+
+        expected = self.dispatch_cost()
+        for window_hours, workers in [(week_data.HOURS, 1), (24, 2)]:
+            result = harboropt_production.solve_production_cost(self.lp, window_hours = window_hours, workers = workers, tolerance = 1e-4)
+            self.assertEqual(result.history['status'].iloc[-1], pywraplp.Solver.OPTIMAL)
+            self.assertAlmostEqual(result.cost / expected, 1, places = 4)
+            self.assertEqual(result.generation.shape, (week_data.HOURS, len(self.lp.disp.index)))
+
+            # Storage never runs below empty.
+            npt.assert_array_less(-1e-6, result.state_of_charge.values)
+
+    def testPrices(self):
+        """Dispatching at a higher carbon price costs more and leaves the LinearProgram unchanged."""
+
+        cost = harboropt_production.solve_production_cost(self.lp).cost
+        higher = harboropt_production.solve_production_cost(self.lp, carbon_cost_per_ton = 200).cost
+        self.assertGreater(higher, cost)
+        self.assertEqual(self.lp.carbon_cost_per_ton, 50)
+        self.assertAlmostEqual(self.dispatch_cost() / cost, 1, places = 4)
+
+    def testWeatherYears(self):
+        lp = LinearProgram(data_dir = DATA_DIR, weather_years = {'doscoe_profiles.csv': 0.5, 'second_week.csv': 0.5}, **week_data.PARAMETERS)
+        lp.solve()
+        with self.assertRaises(ValueError):
+            harboropt_production.solve_production_cost(lp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Tests for harboropt_queue on a week of data."""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import unittest
+from unittest import mock
+
+import harboropt_queue
+
+from harboropt_results import ResultsStore
+
+import numpy as np
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+#run_region jobs import the gridsim examples as top level modules.
+GRIDSIM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'doscoe', 'gridsim')
+sys.path.insert(0, GRIDSIM_DIR)
+
+import grid_sim_website_example
+
+
+CARBON_COSTS = [0, 50, 100]
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+def write_region_profiles(directory, hours = 24):
+    """profiles_usa.csv with a day of demand, solar and wind profiles for every region."""
+
+    hour = np.arange(hours)
+    profiles = {}
+    for region in grid_sim_website_example.REGION_HUBS:
+        profiles['%s_DEMAND' % region.upper()] = 1000 + 200 * np.sin(2 * np.pi * (hour - 9) / 24)
+        profiles['%s_SOLAR' % region.upper()] = np.maximum(np.sin(2 * np.pi * (hour - 6) / 24), 0)
+        profiles['%s_WIND' % region.upper()] = 0.5 + 0.3 * np.cos(2 * np.pi * hour / 24)
+    index = pd.date_range('1/1/2011', periods = hours, freq = 'h')
+    pd.DataFrame(profiles, index = index).to_csv(os.path.join(directory, 'profiles_usa.csv'))
+    return directory
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue = harboropt_queue.WorkQueue(os.path.join(self.directory, 'queue'), lease_timeout = 600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testClaimOnce(self):
+        self.assertTrue(self.queue.submit('a', 'module:function'))
+        self.assertFalse(self.queue.submit('a', 'module:function'))
+        self.assertEqual(self.queue.claim()['key'], 'a')
+        self.assertIsNone(self.queue.claim())
+        self.assertEqual(self.queue.state('a'), 'claimed')
+
+    def testExpiredLeaseIsRequeued(self):
+        self.queue.submit('a', 'module:function')
+        self.queue.claim()
+        expired = self.queue.now() - 2 * self.queue.lease_timeout
+        os.utime(os.path.join(self.queue.directory, 'claimed', 'a.json'), (expired, expired))
+        self.assertEqual(self.queue.requeue_expired(), ['a'])
+        self.assertEqual(self.queue.state('a'), 'pending')
+
+    def testLeaseIgnoresTheNodeClock(self):
+        """A worker whose clock is a day ahead does not requeue a running job."""
+
+        self.queue.submit('a', 'module:function')
+        self.queue.claim()
+        with mock.patch('time.time', return_value = time.time() + 86400):
+            self.assertEqual(self.queue.requeue_expired(), [])
+        self.assertEqual(self.queue.state('a'), 'claimed')
+
+    def testRunRegion(self):
+        """A gridsim regional run goes through the queue with the same result as a direct run."""
+
+        profile_directory = write_region_profiles(self.directory)
+        kwargs = {'region': 'california', 'carbon_tax': 50, 'renewable_portfolio_percentage': 20, 'profile_directory': profile_directory}
+        self.queue.submit('california', 'grid_sim_website_example:run_region', kwargs)
+        harboropt_queue.run_worker(self.queue, poll_interval = 0.1)
+
+        self.assertEqual(self.queue.counts(), {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 0})
+        summary = self.queue.results()['california']
+        self.assertTrue(summary['converged'])
+        self.assertAlmostEqual(summary['objective'] / grid_sim_website_example.run_region(**kwargs)['objective'], 1, places = 6)
+
+
+class SubmitScenarioFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.directory, 'results')
+        self.scenario_file = os.path.join(self.directory, 'sweep.json')
+        with open(self.scenario_file, 'w') as f:
+            json.dump({'parameters': week_data.PARAMETERS, 'sweep': {'carbon_cost_per_ton': CARBON_COSTS}, 'data_dir': DATA_DIR}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testScenarioJobs(self):
+        queue = harboropt_queue.WorkQueue(os.path.join(self.directory, 'queue'))
+        self.assertEqual(harboropt_queue.submit_scenario_file(queue, self.scenario_file, self.output_dir), len(CARBON_COSTS))
+        self.assertEqual(queue.claim()['function'], 'harboropt_sweep:run_scenario')
+
+    def testTemplateBatches(self):
+        """Template sweeps are submitted in batches, and resubmitting adds no jobs."""
+
+        queue = harboropt_queue.WorkQueue(os.path.join(self.directory, 'queue'))
+        self.assertEqual(harboropt_queue.submit_scenario_file(queue, self.scenario_file, self.output_dir, template = True, batch_size = 2), 2)
+        self.assertEqual(harboropt_queue.submit_scenario_file(queue, self.scenario_file, self.output_dir, template = True, batch_size = 2), 0)
+        harboropt_queue.run_worker(queue, poll_interval = 0.1)
+
+        self.assertEqual(queue.counts()['done'], 2)
+        for key, result in queue.results().items():
+            self.assertTrue(result)
+        table = ResultsStore(self.output_dir).table()
+        self.assertEqual(len(table), len(CARBON_COSTS))
+        self.assertTrue((table['status'] == pywraplp.Solver.OPTIMAL).all())
+
+    def testUnknownExecutor(self):
+        queue = harboropt_queue.WorkQueue(os.path.join(self.directory, 'queue'))
+        with self.assertRaises(ValueError):
+            harboropt_queue.submit_scenario_file(queue, self.scenario_file, self.output_dir, workers = 2, executor = 'cluster')
+
+
+if __name__ == '__main__':
+    unittest.main()
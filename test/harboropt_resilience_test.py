@@ -0,0 +1,94 @@
+"""Tests for harboropt_resilience on a week of data."""
+
+import shutil
+import tempfile
+
+import unittest
+
+import harboropt_resilience
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+
+import numpy as np
+import numpy.testing as npt
+
+from test import week_data
+
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+def hours_survived_by_loop(load, energy, power, max_hours):
+    """outage_survival one start hour and one hour at a time."""
+
+    hours_survived = np.zeros(len(load), dtype = int)
+    for start in range(len(load)):
+        remaining = energy[start]
+        for hours in range(max_hours):
+            hour_load = load[(start + hours) % len(load)]
+            remaining -= hour_load
+            if hour_load > power or remaining < -1e-9:
+                break
+            hours_survived[start] = hours + 1
+    return hours_survived
+
+
+class OutageSurvivalTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.load = random.uniform(5, 15, 48)
+        self.energy = random.uniform(0, 80, 48)
+
+    def testMatchesLoop(self):
+        for power in [np.inf, 12]:
+            npt.assert_array_equal(harboropt_resilience.outage_survival(self.load, self.energy, power, max_hours = 20),
+                                   hours_survived_by_loop(self.load, self.energy, power, 20))
+
+    def testSurvivalCurve(self):
+        curve = harboropt_resilience.survival_curve([0, 1, 4, 8], [1, 4, 8])
+        npt.assert_allclose(curve.values, [0.75, 0.5, 0.25])
+
+    def testRequiredReserve(self):
+        """The required reserve survives the target share of outages, and less energy does not."""
+
+        for outage_hours, target in [(4, 0.9), (12, 0.5), (24, 1)]:
+            reserve = harboropt_resilience.required_reserve(self.load, outage_hours, target)
+            survived = harboropt_resilience.outage_survival(self.load, reserve, max_hours = outage_hours) >= outage_hours
+            self.assertGreaterEqual(survived.mean(), target)
+            survived = harboropt_resilience.outage_survival(self.load, reserve - 1e-6, max_hours = outage_hours) >= outage_hours
+            self.assertLess(survived.mean(), target)
+
+
+class SimulateOutagesTest(unittest.TestCase):
+
+    def testResilientStorage(self):
+        """Outages of a solved model with resilient storage."""
+
+        lp = LinearProgram(data_dir = DATA_DIR, **dict(week_data.PARAMETERS, storage_resilience_incentive_per_kwh = 300))
+        lp.solve()
+        power, capacity, energy = harboropt_resilience.resilient_storage(lp)
+        self.assertGreater(power, 0)
+        self.assertEqual(len(energy), week_data.HOURS)
+        self.assertTrue((energy >= (1 - lp.resilient_storage_grid_fraction) * capacity - 1e-6).all())
+
+        hours_survived, curve = harboropt_resilience.simulate_outages(lp, data_dir = DATA_DIR)
+        self.assertEqual(len(hours_survived), week_data.HOURS)
+        self.assertTrue((np.diff(curve.values) <= 0).all())
+
+        # A smaller critical load is survived at least as long.
+        smaller, unused_curve = harboropt_resilience.simulate_outages(lp, critical_load_mw = power / 2, data_dir = DATA_DIR)
+        self.assertTrue((smaller >= hours_survived).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Tests for harboropt_results on a week of data."""
+
+import shutil
+import tempfile
+
+import unittest
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+from harboropt_results import ResultsStore
+
+import numpy as np
+import numpy.testing as npt
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+class ResultsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def testRoundTrip(self):
+        """A written record loads back with the solution of the model."""
+
+        parameters = dict(week_data.PARAMETERS, build_years = 2)
+        lp = LinearProgram(data_dir = DATA_DIR, **parameters)
+        lp.solve()
+        objective = lp.solver.Objective().Value()
+        values = lp.solution_values()
+        generation = values[lp.disp_gen_index] @ lp.hour_weights
+        capacity = {resource: [values[variable.index()] for variable in variables] for resource, variables in lp.capacity_vars.items()}
+
+        store = ResultsStore(self.output_dir)
+        store.write('build_years=2', lp, parameters, hourly = True)
+        self.assertIsNone(lp.solver)
+        self.assertIn('build_years=2', store)
+        self.assertEqual(list(store.keys()), ['build_years=2'])
+
+        record = store.load('build_years=2')
+        self.assertEqual(int(record['status']), pywraplp.Solver.OPTIMAL)
+        self.assertEqual(record['parameters'], parameters)
+        self.assertAlmostEqual(float(record['objective']), objective)
+        resources = list(record['resources'])
+        for resource in capacity:
+            npt.assert_allclose(record['capacity'][resources.index(resource)], capacity[resource])
+        dispatchable = list(record['dispatchable_resources'])
+        npt.assert_allclose(record['generation'][[resources.index(resource) for resource in dispatchable]], generation)
+        self.assertEqual(record['hourly_generation'].shape, (len(dispatchable), 2, week_data.HOURS))
+
+        table = store.table()
+        self.assertEqual(list(table.index), ['build_years=2'])
+        self.assertTrue(np.isclose(table['objective'].iloc[0], objective))
+
+    def testUnsafeKey(self):
+        with self.assertRaises(ValueError):
+            ResultsStore(self.output_dir).load('a/b')
+
+
+if __name__ == '__main__':
+    unittest.main()
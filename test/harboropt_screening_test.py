@@ -0,0 +1,79 @@
+"""Tests for harboropt_screening on a week of data."""
+
+import shutil
+import tempfile
+
+import unittest
+
+import harboropt_screening
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+class ScreenTest(unittest.TestCase):
+
+    def assertBoundHolds(self, **parameters):
+        parameters = dict(week_data.PARAMETERS, data_dir = DATA_DIR, **parameters)
+        screening = harboropt_screening.screen(**parameters)
+        self.assertEqual(screening.status, 'ok')
+        lp = LinearProgram(**parameters)
+        self.assertEqual(lp.solve(), pywraplp.Solver.OPTIMAL)
+        self.assertGreater(screening.cost_lower_bound, 0)
+        self.assertLessEqual(screening.cost_lower_bound, lp.solver.Objective().Value())
+
+    def testLowerBound(self):
+        """The cost lower bound never exceeds the optimum."""
+
+        self.assertBoundHolds()
+        self.assertBoundHolds(carbon_cost_per_ton = 200, storage_resilience_incentive_per_kwh = 300)
+        self.assertBoundHolds(build_years = 2)
+
+    def testLowerBoundWithTimesteps(self):
+        """The bound holds for the model on timesteps, whose peaks are averaged away."""
+
+        self.assertBoundHolds(timesteps = [24] * 7)
+        self.assertBoundHolds(timesteps = [168], timespan = 2)
+        self.assertBoundHolds(timesteps = [24] * 7, carbon_cost_per_ton = 0, storage_resilience_incentive_per_kwh = 300)
+
+    def testLowerBoundWithWeatherYears(self):
+        self.assertBoundHolds(weather_years = {'doscoe_profiles.csv': 0.5, 'second_week.csv': 0.5})
+        self.assertBoundHolds(timesteps = [6] * 56, weather_years = {'doscoe_profiles.csv': 0.3, 'second_week.csv': 0.7})
+
+    def testLowerBoundWithYearScales(self):
+        self.assertBoundHolds(build_years = 2, demand_scale = [1, 1.2], grid_emissions_scale = [1, 0.8])
+        self.assertBoundHolds(build_years = 2, capacity_factor_scale = {'SOLAR': [1, 0.9], 'NGCT': [1, 0.95]})
+
+    def testTimestepsMustCoverTheYears(self):
+        with self.assertRaises(ValueError):
+            harboropt_screening.screen(data_dir = DATA_DIR, timesteps = [24] * 6)
+
+    def testUnbounded(self):
+        """A negative capacity cost is rejected without building the model."""
+
+        screening = harboropt_screening.screen(data_dir = DATA_DIR, diesel_genset_fixed_cost_per_mw_year = 10**9)
+        self.assertEqual(screening.status, 'unbounded')
+        self.assertIn('diesel_genset_replacement_storage_4hr', screening.reason)
+
+    def testUnknownParameter(self):
+        with self.assertRaises(TypeError):
+            harboropt_screening.screen(data_dir = DATA_DIR, carbon_price = 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
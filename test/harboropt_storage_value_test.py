@@ -0,0 +1,94 @@
+"""Tests for harboropt_storage_value."""
+
+import unittest
+
+import harboropt_storage_value
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+
+from ortools.linear_solver import pywraplp
+
+
+HOURS = 72
+
+
+def lp_dispatch_value(prices, duration, efficiency, power, charge_prices, variable_cost, initial_state_of_charge):
+    """Value of the storage dispatch LP solved with GLOP."""
+
+    solver = pywraplp.Solver('storage', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+    charge = [solver.NumVar(0, power, '') for hour in range(len(prices))]
+    discharge = [solver.NumVar(0, power, '') for hour in range(len(prices))]
+    state_of_charge = [solver.NumVar(0, power * duration, '') for hour in range(len(prices))]
+    previous = initial_state_of_charge
+    for hour in range(len(prices)):
+        solver.Add(state_of_charge[hour] == previous + charge[hour] - discharge[hour])
+        previous = state_of_charge[hour]
+    solver.Add(state_of_charge[-1] == initial_state_of_charge)
+    solver.Maximize(sum(efficiency * prices[hour] * discharge[hour] - (charge_prices[hour] + variable_cost) * charge[hour] for hour in range(len(prices))))
+    assert solver.Solve() == solver.OPTIMAL
+    return solver.Objective().Value()
+
+
+class OptimalDispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.prices = 30 + 20 * np.sin(np.arange(HOURS) * 2 * np.pi / 24) + random.uniform(0, 10, HOURS)
+        self.charge_prices = self.prices + random.uniform(0, 5, HOURS)
+
+    def testMatchesLinearProgram(self):
+        """The min cost flow finds the value of the storage LP."""
+
+        for duration, efficiency, power, variable_cost, initial in [(4, 0.85, 1, 0, 0), (2, 1, 3, 1.5, 0), (6, 0.9, 2, 0.5, 5.5)]:
+            dispatch = harboropt_storage_value.optimal_dispatch(self.prices, duration, efficiency, power, self.charge_prices, variable_cost, initial)
+            expected = lp_dispatch_value(self.prices, duration, efficiency, power, self.charge_prices, variable_cost, initial)
+            self.assertAlmostEqual(dispatch.value, expected, delta = 1e-3 * abs(expected))
+
+            # The schedule is feasible.
+            self.assertTrue((dispatch.charge <= power + 1e-9).all() and (dispatch.discharge <= power + 1e-9).all())
+            self.assertTrue((dispatch.state_of_charge <= power * duration + 1e-9).all())
+            npt.assert_allclose(np.cumsum(dispatch.charge - dispatch.discharge) + initial, dispatch.state_of_charge, atol = 1e-9)
+            self.assertAlmostEqual(dispatch.state_of_charge[-1], initial)
+
+    def testFlatPricesEarnNothing(self):
+        dispatch = harboropt_storage_value.optimal_dispatch(np.full(HOURS, 40.), 4, 0.9)
+        self.assertEqual(dispatch.value, 0)
+        self.assertEqual(dispatch.discharge.sum(), 0)
+
+    def testValueScalesWithPower(self):
+        one = harboropt_storage_value.optimal_dispatch(self.prices, 4, 0.85)
+        three = harboropt_storage_value.optimal_dispatch(self.prices, 4, 0.85, power = 3)
+        self.assertAlmostEqual(three.value, 3 * one.value, places = 6)
+
+    def testBadInput(self):
+        with self.assertRaises(ValueError):
+            harboropt_storage_value.optimal_dispatch(self.prices, 4, charge_prices = self.prices[1:])
+        with self.assertRaises(ValueError):
+            harboropt_storage_value.optimal_dispatch(np.append(self.prices, np.nan), 4)
+        with self.assertRaises(ValueError):
+            harboropt_storage_value.optimal_dispatch(self.prices, 4, initial_state_of_charge = 5)
+
+
+class ScreenStorageTest(unittest.TestCase):
+
+    def testLongerAndMoreEfficientStorageIsWorthMore(self):
+        prices = 30 + 20 * np.sin(np.arange(HOURS) * 2 * np.pi / 24)
+        table = harboropt_storage_value.screen_storage(prices, [2, 4, 8], [0.8, 0.9])
+        self.assertEqual(len(table), 6)
+        values = table['value_per_mw'].unstack()
+        self.assertTrue((np.diff(values.values, axis = 0) >= -1e-9).all())
+        self.assertTrue((np.diff(values.values, axis = 1) >= -1e-9).all())
+
+    def testStorageValues(self):
+        prices = 30 + 20 * np.sin(np.arange(HOURS) * 2 * np.pi / 24)
+        storage = pd.DataFrame({'storage_duration (hrs)': [4], 'efficiency': [0.85], 'variable ($/MWh)': [1.]}, index = pd.Index(['battery'], name = 'resource'))
+        table = harboropt_storage_value.storage_values(prices, storage)
+        expected = harboropt_storage_value.optimal_dispatch(prices, 4, 0.85, variable_cost = 1.)
+        self.assertAlmostEqual(table.loc['battery', 'value_per_mw'], expected.value)
+        self.assertAlmostEqual(table.loc['battery', 'value_per_mwh'], expected.value / 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Tests for harboropt_sweep on a week of data."""
+
+import os
+import shutil
+import tempfile
+
+import unittest
+
+import harboropt_results
+import harboropt_sweep
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+from harboropt_results import ResultsStore
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+CARBON_COSTS = [0, 50, 100]
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+def cold_objectives(scenarios):
+    """{key: objective} of a cold solve of every scenario."""
+
+    objectives = {}
+    for key, parameters in scenarios:
+        lp = LinearProgram(data_dir = DATA_DIR, **parameters)
+        lp.solve()
+        objectives[key] = lp.solver.Objective().Value()
+    return objectives
+
+
+class ScenarioKeyTest(unittest.TestCase):
+
+    def testKeysAreFileNames(self):
+        """Keys of list and dict values are safe file names, and different values give different keys."""
+
+        scenarios = harboropt_sweep.sweep_scenarios({'build_years': 2}, {
+            'demand_scale': [[1, 1.02], [1, 1.04]],
+            'capacity_factor_scale': [{'SOLAR': [1, 0.99]}, {'SOLAR': [1, 0.98]}],
+            'weather_years': [{'doscoe_profiles.csv': 1}, {'a/b.csv': 0.5, 'c d.csv': 0.5}]})
+        keys = [key for key, parameters in scenarios]
+        self.assertEqual(len(set(keys)), 8)
+        for key in keys:
+            self.assertRegex(key, harboropt_results.KEY_PATTERN)
+        self.assertIn('demand_scale=1_1.02', keys[0])
+
+    def testPlainValues(self):
+        self.assertEqual(harboropt_sweep.scenario_key({'carbon_cost_per_ton': 50, 'gas_fuel_cost': 8}), 'carbon_cost_per_ton=50,gas_fuel_cost=8')
+
+
+class SweepTest(unittest.TestCase):
+    """Every way of running a sweep finds the optimum of a cold solve of every scenario."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.scenarios = harboropt_sweep.sweep_scenarios(week_data.PARAMETERS, {'carbon_cost_per_ton': CARBON_COSTS})
+        cls.objectives = cold_objectives(cls.scenarios)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def run_sweep(self, **options):
+        return harboropt_sweep.run_sweep(self.scenarios, DATA_DIR, output_dir = self.output_dir, **options)
+
+    def assertObjectives(self, results):
+        self.assertEqual(sorted(key for key, status, objective, seconds in results), sorted(self.objectives))
+        for key, status, objective, seconds in results:
+            self.assertEqual(status, pywraplp.Solver.OPTIMAL)
+            self.assertAlmostEqual(objective / self.objectives[key], 1, places = 6)
+        table = ResultsStore(self.output_dir).table()
+        self.assertEqual(len(table), len(self.objectives))
+
+    def testSerial(self):
+        self.assertObjectives(self.run_sweep())
+
+    def testTemplate(self):
+        self.assertObjectives(self.run_sweep(template = True))
+
+    def testThreadTemplate(self):
+        self.assertObjectives(self.run_sweep(workers = 2, executor = 'thread', template = True))
+
+    def testProcesses(self):
+        self.assertObjectives(self.run_sweep(workers = 2))
+
+    def testResume(self):
+        """A finished scenario is not solved again."""
+
+        harboropt_sweep.run_sweep(self.scenarios[:1], DATA_DIR, output_dir = self.output_dir)
+        results = self.run_sweep()
+        self.assertEqual([key for key, status, objective, seconds in results], [key for key, parameters in self.scenarios[1:]])
+        finished, remaining = harboropt_sweep.sweep_progress(self.output_dir)
+        self.assertEqual(len(finished), len(self.scenarios))
+        self.assertEqual(remaining, [])
+
+    def testTemplateRejectsStructuralChanges(self):
+        scenarios = harboropt_sweep.sweep_scenarios(week_data.PARAMETERS, {'build_years': [1, 2]})
+        with self.assertRaises(ValueError):
+            harboropt_sweep.build_template(scenarios, DATA_DIR)
+
+    def testUnknownExecutor(self):
+        with self.assertRaises(ValueError):
+            self.run_sweep(workers = 2, executor = 'cluster')
+
+
+class ScenarioFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def testCarbonSweepTemplate(self):
+        """The shipped scenario file, which prunes dominated resources, runs as a template sweep."""
+
+        scenario_file = os.path.join(os.path.dirname(os.path.abspath(harboropt_sweep.__file__)), 'scenarios', 'carbon_sweep.json')
+        config = harboropt_sweep.load_scenario_file(scenario_file)
+        self.assertTrue(config['parameters']['prune_dominated_resources'])
+        harboropt_sweep.main([scenario_file, '--template', '--data-dir', DATA_DIR, '--output-dir', self.output_dir])
+
+        scenarios = harboropt_sweep.sweep_scenarios(config['parameters'], config['sweep'])
+        objectives = cold_objectives(scenarios)
+        table = ResultsStore(self.output_dir).table()
+        self.assertEqual(sorted(table.index), sorted(objectives))
+        for key, objective in objectives.items():
+            self.assertEqual(table.loc[key, 'status'], pywraplp.Solver.OPTIMAL)
+            self.assertAlmostEqual(table.loc[key, 'objective'] / objective, 1, places = 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests for harboropt_weather on a week of data."""
+
+import shutil
+import tempfile
+
+import unittest
+
+import harboropt_weather
+
+from harboropt_lp_storage_buildyear_emissions import LinearProgram
+
+from ortools.linear_solver import pywraplp
+
+from test import week_data
+
+
+WEATHER_YEARS = {'doscoe_profiles.csv': 0.5, 'second_week.csv': 0.5}
+
+DATA_DIR = None
+
+
+def setUpModule():
+    global DATA_DIR
+    DATA_DIR = week_data.write_week_data(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(DATA_DIR)
+
+
+class SolveWeatherYearsTest(unittest.TestCase):
+
+    def testMatchesStackedModel(self):
+        """The decomposition converges to the optimum of the model with both weather years stacked."""
+
+        lp = LinearProgram(data_dir = DATA_DIR, weather_years = WEATHER_YEARS, **week_data.PARAMETERS)
+        lp.solve()
+        objective = lp.solver.Objective().Value()
+
+        for workers in [1, 2]:
+            result = harboropt_weather.solve_weather_years(WEATHER_YEARS, week_data.PARAMETERS, DATA_DIR, workers = workers)
+            self.assertEqual(result['status'], pywraplp.Solver.OPTIMAL)
+            self.assertAlmostEqual(result['objective'] / objective, 1, places = 3)
+            self.assertLessEqual(result['lower_bound'], result['objective'] * (1 + 1e-9))
+            self.assertEqual(result['shortfall'], 0)
+            self.assertEqual(len(result['capacity']), len(lp.capacity_vars) + len(lp.storage_capacity_vars))
+
+    def testWorkerErrorIsRaised(self):
+        """An exception in a worker is raised by solve_weather_years instead of leaving it waiting."""
+
+        for workers in [1, 2]:
+            with self.assertRaises(TypeError):
+                harboropt_weather.solve_weather_years(WEATHER_YEARS, {'bogus_parameter': 1}, DATA_DIR, workers = workers)
+
+    def testPruningIsNotApplied(self):
+        """Every weather year keeps the same capacity variables when pruning is asked for."""
+
+        parameters = dict(week_data.PARAMETERS, carbon_cost_per_ton = 80)
+        result = harboropt_weather.solve_weather_years(WEATHER_YEARS, dict(parameters, prune_dominated_resources = True), DATA_DIR, max_iterations = 1)
+        lp = LinearProgram(data_dir = DATA_DIR, weather_years = WEATHER_YEARS, **parameters)
+        self.assertEqual(len(result['capacity']), len(lp.capacity_vars) + len(lp.storage_capacity_vars))
+
+
+if __name__ == '__main__':
+    unittest.main()
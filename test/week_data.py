@@ -0,0 +1,31 @@
+"""Truncated input data for the harboropt tests."""
+
+import os
+import shutil
+
+import pandas as pd
+
+import harboropt_lp_storage_buildyear_emissions
+
+#Hours of the truncated year, and the hourly input files that are truncated to it.
+HOURS = 168
+HOURLY_FILES = ['doscoe_profiles.csv', 'gen_profiles.csv', 'whole_grid_emissions.csv', 'outofbasin_emissions.csv', 'REopt_dispatch.csv']
+
+#Prices that keep the week's optimum bounded and its storage portfolio small (see harboropt_screening).
+PARAMETERS = {'pm25_cost_per_ton': 1, 'nox_cost_per_ton': 1, 'so2_cost_per_ton': 1, 'pm10_cost_per_ton': 1, 'storage_resilience_incentive_per_kwh': 0}
+
+
+def write_week_data(directory):
+
+    #Copy data/ to directory with the hourly files truncated to the first week of the year.
+    #Add two more weather years: 'second_week.csv', the profiles of the second week, and 'first_week.csv', a copy of the first week's profiles (stacking it with doscoe_profiles.csv repeats the same year).
+    data_dir = harboropt_lp_storage_buildyear_emissions.DATA_DIR
+    for name in os.listdir(data_dir):
+        if name.endswith('.csv') and name not in HOURLY_FILES:
+            shutil.copy(os.path.join(data_dir, name), directory)
+    for name in HOURLY_FILES:
+        pd.read_csv(os.path.join(data_dir, name)).iloc[:HOURS].to_csv(os.path.join(directory, name), index = False)
+    profiles = pd.read_csv(os.path.join(data_dir, 'doscoe_profiles.csv'))
+    profiles.iloc[:HOURS].to_csv(os.path.join(directory, 'first_week.csv'), index = False)
+    profiles.iloc[HOURS:2 * HOURS].to_csv(os.path.join(directory, 'second_week.csv'), index = False)
+    return directory